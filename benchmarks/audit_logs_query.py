@@ -0,0 +1,75 @@
+"""
+/admin/audit-logs so'rovi: ro'yxatga nusxa + filter + sort (eski) va AuditStore indekslari.
+
+Ishga tushirish (loyiha ildizidan):
+    python -m benchmarks.audit_logs_query --entries 10000 --repeat 200
+"""
+import argparse
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from src.services.audit_store import AuditStore
+
+
+def legacy_query(memory, user_id=None, action=None, start=None, end=None, limit=100, offset=0):
+    logs = list(memory)
+    if user_id:
+        logs = [e for e in logs if e.get("user_id") == user_id]
+    if action:
+        logs = [e for e in logs if e.get("action") == action]
+    if start:
+        logs = [e for e in logs if e.get("timestamp", "") >= start]
+    if end:
+        logs = [e for e in logs if e.get("timestamp", "") <= end]
+    logs.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
+    return len(logs), logs[offset:offset + limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    base = datetime(2026, 1, 1)
+    actions = ["login", "logout", "create", "update", "delete", "file_upload"]
+    memory: deque = deque(maxlen=args.entries)
+    store = AuditStore(maxlen=args.entries)
+    for i in range(args.entries):
+        entry = {
+            "timestamp": (base + timedelta(seconds=i)).isoformat() + "Z",
+            "user_id": f"user-{rnd.randrange(args.users)}",
+            "action": rnd.choice(actions),
+        }
+        memory.append(entry)
+        store.append(entry)
+
+    mid = (base + timedelta(seconds=args.entries // 2)).isoformat() + "Z"
+    queries = {
+        "latest page": {},
+        "page 10": {"offset": 1000},
+        "by user": {"user_id": "user-7"},
+        "by action": {"action": "login"},
+        "user + action": {"user_id": "user-7", "action": "login"},
+        "date range": {"start": mid, "end": (base + timedelta(seconds=args.entries // 2 + 600)).isoformat() + "Z"},
+    }
+    print(f"{'query':<16} {'legacy_ms':>10} {'store_ms':>10} {'speedup':>8}")
+    for name, q in queries.items():
+        assert legacy_query(memory, **q) == store.query(**q), name
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy_query(memory, **q)
+        legacy = (time.perf_counter() - started) * 1000 / args.repeat
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            store.query(**q)
+        indexed = (time.perf_counter() - started) * 1000 / args.repeat
+        print(f"{name:<16} {legacy:>10.3f} {indexed:>10.3f} {legacy / indexed:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
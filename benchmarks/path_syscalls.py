@@ -0,0 +1,96 @@
+"""
+get_chat_messages sahifasi uchun fayl yo'llarini hisoblashdagi syscalllar soni.
+
+Ishga tushirish (loyiha ildizidan):
+    python -m benchmarks.path_syscalls --page 100
+
+Har bir xabar uchun avatar va thumbnail yo'li hamda "yuklab olinganmi?" tekshiruvi
+hisoblanadi. "legacy" - har chaqiruvda mkdir qiladigan helperlar va os.listdir skaneri.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from src.services import telegram_service
+from src.services.downloads_index import DownloadsIndex
+
+
+class SyscallCounter:
+    def __init__(self):
+        self.calls = {"mkdir": 0, "listdir": 0, "scandir": 0}
+        self._mkdir = os.mkdir
+        self._listdir = os.listdir
+        self._scandir = os.scandir
+
+    def mkdir(self, *args, **kwargs):
+        self.calls["mkdir"] += 1
+        return self._mkdir(*args, **kwargs)
+
+    def listdir(self, *args, **kwargs):
+        self.calls["listdir"] += 1
+        return self._listdir(*args, **kwargs)
+
+    def scandir(self, *args, **kwargs):
+        self.calls["scandir"] += 1
+        return self._scandir(*args, **kwargs)
+
+    def patch(self):
+        return patch.multiple(os, mkdir=self.mkdir, listdir=self.listdir, scandir=self.scandir)
+
+
+def legacy_page(root: Path, user_id: str, acc: int, page: int):
+    for message_id in range(1, page + 1):
+        d = root / "avatars" / user_id / str(acc)
+        d.mkdir(parents=True, exist_ok=True)
+        d = root / "thumbs" / user_id / str(acc)
+        d.mkdir(parents=True, exist_ok=True)
+        downloads_dir = root / "downloads" / user_id / str(acc)
+        if downloads_dir.exists():
+            for filename in os.listdir(str(downloads_dir)):
+                if filename.startswith(f"fid{message_id}."):
+                    break
+
+
+def indexed_page(root: Path, user_id: str, acc: int, page: int, index: DownloadsIndex):
+    for message_id in range(1, page + 1):
+        telegram_service._avatar_file(user_id, acc, message_id)
+        telegram_service._thumb_file(user_id, acc, message_id)
+        index.lookup(user_id, acc, f"fid{message_id}")
+
+
+def measure(name, counter, fn):
+    before = dict(counter.calls)
+    started = time.perf_counter()
+    with counter.patch():
+        fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    calls = {k: counter.calls[k] - before[k] for k in counter.calls}
+    print(f"{name:<22} mkdir={calls['mkdir']:<5} listdir={calls['listdir']:<5} scandir={calls['scandir']:<5} elapsed_ms={elapsed:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--downloads", type=int, default=500, help="akkauntdagi yuklangan fayllar soni")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        downloads = root / "downloads" / "bench" / "1"
+        downloads.mkdir(parents=True)
+        for i in range(args.downloads):
+            (downloads / f"other{i}.bin").touch()
+
+        counter = SyscallCounter()
+        index = DownloadsIndex(root / "downloads")
+        with patch.multiple(telegram_service, MEDIA_ROOT=root, AVATAR_DIR=root / "avatars"):
+            measure("legacy", counter, lambda: legacy_page(root, "bench", 1, args.page))
+            measure("indexed (cold)", counter, lambda: indexed_page(root, "bench", 1, args.page, index))
+            measure("indexed (warm)", counter, lambda: indexed_page(root, "bench", 1, args.page, index))
+
+
+if __name__ == "__main__":
+    main()
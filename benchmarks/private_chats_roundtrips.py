@@ -0,0 +1,98 @@
+"""
+list_private_chats_minimal uchun sahifa boshiga Telegram round-triplar soni.
+
+Ishga tushirish (loyiha ildizidan):
+    python -m benchmarks.private_chats_roundtrips --page 100 --rtt-ms 20
+
+Haqiqiy Telegram o'rniga har bir so'rovda ``rtt`` kutadigan soxta client ishlatiladi.
+"legacy" - har bir dialog uchun get_chat + get_users qiladigan eski algoritm.
+"""
+import argparse
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from pyrogram.enums import ChatType, UserStatus
+
+from src.services import telegram_service
+
+DIALOGS_PER_REQUEST = 100  # messages.GetDialogs bitta so'rovda qaytaradigan maksimal dialoglar
+
+
+class CountingClient:
+    def __init__(self, size: int, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.dialogs = [
+            SimpleNamespace(chat=SimpleNamespace(
+                id=i, type=ChatType.PRIVATE, first_name=f"User {i}", last_name=None,
+                username=f"user{i}", photo=None,
+            ))
+            for i in range(1, size + 1)
+        ]
+
+    async def _call(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    async def get_dialogs(self, limit=0):
+        for n, d in enumerate(self.dialogs[:limit]):
+            if n % DIALOGS_PER_REQUEST == 0:
+                await self._call()
+            yield d
+
+    async def get_chat(self, chat_id):
+        await self._call()
+        return next(d.chat for d in self.dialogs if d.chat.id == chat_id)
+
+    async def get_users(self, ids):
+        await self._call()
+        many = isinstance(ids, list)
+        users = [SimpleNamespace(id=i, status=UserStatus.RECENTLY, is_premium=False, emoji_status=None)
+                 for i in (ids if many else [ids])]
+        return users if many else users[0]
+
+
+async def legacy_listing(client, limit):
+    out = []
+    async for dialog in client.get_dialogs(limit=limit):
+        chat = await client.get_chat(dialog.chat.id)
+        if chat.type != ChatType.PRIVATE:
+            continue
+        user_obj = await client.get_users(chat.id)
+        out.append((chat.id, user_obj.status))
+    return out
+
+
+def measure(name, client, coro_factory):
+    started = time.perf_counter()
+    before = client.round_trips
+    asyncio.run(coro_factory())
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{name:<22} round_trips={client.round_trips - before:<5} elapsed_ms={elapsed:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    client = CountingClient(args.page, args.rtt_ms / 1000)
+
+    @asynccontextmanager
+    async def session(user_id, account_index, op):
+        yield client
+
+    measure("legacy", client, lambda: legacy_listing(client, args.page))
+    with patch.object(telegram_service, "telegram_session", session):
+        telegram_service.peer_cache.clear()
+        listing = lambda: telegram_service.list_private_chats_minimal("bench", 1, limit=args.page)
+        measure("batched (cold cache)", client, listing)
+        measure("batched (warm cache)", client, listing)
+
+
+if __name__ == "__main__":
+    main()
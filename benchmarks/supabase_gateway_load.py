@@ -0,0 +1,69 @@
+"""
+Sinxron Supabase chaqiruvlari event loopni qanchalik to'xtatishi (yuklama testi).
+
+Ishga tushirish (loyiha ildizidan):
+    python -m benchmarks.supabase_gateway_load --requests 50 --auth-ms 50 --tg-ms 20
+
+Har bir "so'rov" avval tokenni Supabase'da tekshiradi (bloklovchi ``auth.get_user``,
+``auth-ms``), keyin Telegram operatsiyasini kutadi (``asyncio.sleep``, ``tg-ms``).
+"direct" - eski yo'l (event loop ichida sinxron chaqiruv), "gateway" - supabase_gateway.
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from src import config
+from src.services.supabase_gateway import SupabaseGateway
+
+
+async def loop_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        samples.append(time.perf_counter() - started - 0.005)
+
+
+async def run(mode: str, n: int, tg: float, workers: int):
+    gateway = SupabaseGateway(max_workers=workers)
+
+    async def request(i):
+        if mode == "direct":
+            config.supabase.auth.get_user(f"tok{i}")
+        else:
+            await gateway.get_user(f"tok{i}")
+        await asyncio.sleep(tg)
+
+    stop = asyncio.Event()
+    samples: list = []
+    lag_task = asyncio.create_task(loop_lag(stop, samples))
+    started = time.perf_counter()
+    await asyncio.gather(*[request(i) for i in range(n)])
+    elapsed = (time.perf_counter() - started) * 1000
+    stop.set()
+    await lag_task
+    await gateway.close()
+    max_lag = max(samples) * 1000 if samples else elapsed
+    print(f"{mode:<8} requests={n:<4} total_ms={elapsed:<8.1f} max_loop_lag_ms={max_lag:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--auth-ms", type=float, default=50)
+    parser.add_argument("--tg-ms", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=config.SUPABASE_GATEWAY_WORKERS)
+    args = parser.parse_args()
+
+    def get_user(token):
+        time.sleep(args.auth_ms / 1000)
+        return SimpleNamespace(user=SimpleNamespace(id=token))
+
+    with patch.object(config.supabase.auth, "get_user", side_effect=get_user):
+        for mode in ("direct", "gateway"):
+            asyncio.run(run(mode, args.requests, args.tg_ms / 1000, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Telegram so'rov kechikishi: har so'rovda yangi client (eski yo'l) va client pool.
+
+Ishga tushirish (loyiha ildizidan):
+    python -m benchmarks.telegram_pool_latency --accounts 5 --requests 200 --connect-ms 250 --rpc-ms 40
+
+Haqiqiy Telegram o'rniga soxta client: ``start()`` ulanish + MTProto handshake (``connect-ms``),
+``stop()`` uzish (``connect-ms`` / 5), har bir RPC ``rpc-ms``.
+"oneshot" - eski yo'l: sessiya fayli lock'i ostida client yaratish, start, RPC, stop.
+"pooled" - telegram_session kabi TelegramClientPool.lease orqali bitta jonli client.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Dict
+
+from src.services.client_pool import TelegramClientPool
+
+
+class FakeClient:
+    starts = 0
+
+    def __init__(self, connect: float, rpc: float):
+        self.connect = connect
+        self.rpc = rpc
+        self.is_connected = False
+
+    async def start(self):
+        FakeClient.starts += 1
+        await asyncio.sleep(self.connect)
+        self.is_connected = True
+
+    async def stop(self):
+        await asyncio.sleep(self.connect / 5)
+        self.is_connected = False
+
+    async def get_me(self):
+        await asyncio.sleep(self.rpc)
+
+
+async def run(mode: str, accounts: int, n: int, concurrency: int, connect: float, rpc: float):
+    FakeClient.starts = 0
+    pool = TelegramClientPool(factory=lambda u, a: FakeClient(connect, rpc), max_clients=accounts)
+    session_locks: Dict[int, asyncio.Lock] = {}
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    rnd = random.Random(42)
+    targets = [rnd.randrange(accounts) for _ in range(n)]
+
+    async def request(account: int):
+        async with slots:
+            started = time.perf_counter()
+            if mode == "oneshot":
+                async with session_locks.setdefault(account, asyncio.Lock()):
+                    client = FakeClient(connect, rpc)
+                    await client.start()
+                    try:
+                        await client.get_me()
+                    finally:
+                        await client.stop()
+            else:
+                async with pool.lease("u", account) as client:
+                    await client.get_me()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[request(a) for a in targets])
+    elapsed = (time.perf_counter() - started) * 1000
+    await pool.close()
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{mode:<8} requests={n:<4} starts={FakeClient.starts:<4} "
+          f"p50_ms={p50:<7.1f} p95_ms={p95:<7.1f} total_ms={elapsed:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--connect-ms", type=float, default=250)
+    parser.add_argument("--rpc-ms", type=float, default=40)
+    args = parser.parse_args()
+    for mode in ("oneshot", "pooled"):
+        asyncio.run(run(mode, args.accounts, args.requests, args.concurrency,
+                        args.connect_ms / 1000, args.rpc_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
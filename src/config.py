@@ -53,6 +53,59 @@ SESS_ROOT.mkdir(parents=True, exist_ok=True)
 
 PENDING_FILE = "pending.json"
 
+# Telegram client pool
+TG_POOL_MAX_CLIENTS = int(os.environ.get("TG_POOL_MAX_CLIENTS", "50"))
+TG_POOL_IDLE_SECONDS = int(os.environ.get("TG_POOL_IDLE_SECONDS", "600"))
+TG_POOL_SWEEP_SECONDS = int(os.environ.get("TG_POOL_SWEEP_SECONDS", "60"))
+
+# Akkauntlar ro'yxati keshi (index tekshiruvi uchun)
+ACCOUNT_REGISTRY_TTL_SECONDS = int(os.environ.get("ACCOUNT_REGISTRY_TTL_SECONDS", "60"))
+# Telegram profillarini (get_me) yuklashda barcha foydalanuvchilar bo'yicha umumiy parallel limit
+TG_PROFILE_CONCURRENCY = int(os.environ.get("TG_PROFILE_CONCURRENCY", "8"))
+# Profil snapshotlari: shu yoshdan eski snapshot fonda yangilanadi
+TG_PROFILE_SNAPSHOT_MAX_AGE_SECONDS = float(os.environ.get("TG_PROFILE_SNAPSHOT_MAX_AGE_SECONDS", "21600"))
+TG_PROFILE_REFRESH_SECONDS = float(os.environ.get("TG_PROFILE_REFRESH_SECONDS", "600"))
+
+# Avatar/emoji/thumbnail fon yuklovchisi
+MEDIA_PREFETCH_CONCURRENCY = int(os.environ.get("MEDIA_PREFETCH_CONCURRENCY", "4"))
+MEDIA_PREFETCH_QUEUE = int(os.environ.get("MEDIA_PREFETCH_QUEUE", "1000"))
+
+# Akkaunt bo'yicha user/peer keshi (status va premium ma'lumotlari uchun)
+PEER_CACHE_TTL_SECONDS = int(os.environ.get("PEER_CACHE_TTL_SECONDS", "30"))
+
+# Guruhlar ro'yxati: a'zolar/online soni keshi va parallel so'rovlar soni
+GROUP_STATS_TTL_SECONDS = int(os.environ.get("GROUP_STATS_TTL_SECONDS", "60"))
+GROUP_STATS_CONCURRENCY = int(os.environ.get("GROUP_STATS_CONCURRENCY", "10"))
+
+# Fon eksport joblari: akkaunt bo'yicha parallel joblar va checkpoint oralig'i
+EXPORT_JOBS_PER_ACCOUNT = int(os.environ.get("EXPORT_JOBS_PER_ACCOUNT", "1"))
+EXPORT_CHECKPOINT_MESSAGES = int(os.environ.get("EXPORT_CHECKPOINT_MESSAGES", "500"))
+
+# Umumiy media blob ombori (media/blobs): GC oralig'i va yangi bloblar uchun kutish muddati
+MEDIA_BLOB_GC_SECONDS = int(os.environ.get("MEDIA_BLOB_GC_SECONDS", "3600"))
+MEDIA_BLOB_GC_GRACE_SECONDS = int(os.environ.get("MEDIA_BLOB_GC_GRACE_SECONDS", "3600"))
+# Akkaunt umumiy blobga kira olishi tekshirilgandan keyin shuncha vaqt qayta tekshirilmaydi
+MEDIA_ACCESS_TTL_SECONDS = int(os.environ.get("MEDIA_ACCESS_TTL_SECONDS", "3600"))
+
+# Media kesh byudjeti: umumiy limit ("5GB", "0" - cheklanmagan), kategoriya kvotalari
+# ("downloads=2GB,thumbs=512MB,avatars=256MB,exports=1GB") va sweep oralig'i
+MEDIA_CACHE_MAX_BYTES = os.environ.get("MEDIA_CACHE_MAX_BYTES", "5GB")
+MEDIA_CACHE_QUOTAS = os.environ.get("MEDIA_CACHE_QUOTAS", "")
+MEDIA_CACHE_SWEEP_SECONDS = int(os.environ.get("MEDIA_CACHE_SWEEP_SECONDS", "300"))
+
+# Bearer token keshi (sha256(token) bo'yicha LRU + TTL, muddati token exp dan oshmaydi)
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+
+# Sinxron Supabase chaqiruvlari uchun thread pool hajmi (event loop bloklanmaydi)
+SUPABASE_GATEWAY_WORKERS = int(os.environ.get("SUPABASE_GATEWAY_WORKERS", "16"))
+
+# Audit loglarni public.audit_logs ga paketlab yozish
+AUDIT_PERSIST = os.environ.get("AUDIT_PERSIST", "1").lower() in ("1", "true", "yes")
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_MS = int(os.environ.get("AUDIT_FLUSH_MS", "1000"))
+AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", "10000"))
+
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 supabase_service: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
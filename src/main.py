@@ -5,7 +5,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from src.routers.auth import router as auth_router
 from src.routers.telegram import router as telegram_router
 from src.routers.payment import router as payment_router
-from src.middleware.audit_logging import AuditLoggingMiddleware
+from src.middleware.audit_logging import AuditLoggingMiddleware, audit_sink
+from src.services.telegram_service import client_pool, media_prefetcher, export_jobs, blob_store, media_cache, profile_store
+from src.services.media_cache import TrackedStaticFiles
+from src.services.supabase_gateway import supabase_gateway
+from src.config import TG_POOL_SWEEP_SECONDS, MEDIA_BLOB_GC_SECONDS, MEDIA_CACHE_SWEEP_SECONDS, AUDIT_PERSIST
+from src.config import TG_PROFILE_REFRESH_SECONDS
 from starlette.staticfiles import StaticFiles
 from pathlib import Path
 import uvicorn
@@ -574,7 +579,7 @@ MEDIA_ROOT = Path("media")
 (MEDIA_ROOT / "exports").mkdir(parents=True, exist_ok=True)
 
 # /media/... orqali statik fayllarni berish
-app.mount("/media", StaticFiles(directory=str(MEDIA_ROOT)), name="media")
+app.mount("/media", TrackedStaticFiles(directory=str(MEDIA_ROOT), cache=media_cache), name="media")
 logger.info("Statik fayllar /media ga ulandi")
 
 app.include_router(auth_router)
@@ -586,3 +591,30 @@ logger.info("Telegram router qo'shildi")
 app.include_router(payment_router)
 logger.info("Payment router qo'shildi")
 
+
+@app.on_event("startup")
+async def start_background_tasks():
+    client_pool.start_sweeper(TG_POOL_SWEEP_SECONDS)
+    logger.info("Telegram client pool sweeper ishga tushdi")
+    media_prefetcher.start()
+    logger.info("Media prefetch workerlari ishga tushdi")
+    export_jobs.resume_pending()
+    blob_store.start_gc(MEDIA_BLOB_GC_SECONDS)
+    media_cache.start(MEDIA_CACHE_SWEEP_SECONDS)
+    profile_store.start(TG_PROFILE_REFRESH_SECONDS)
+    if AUDIT_PERSIST:
+        audit_sink.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await export_jobs.close()
+    await blob_store.close()
+    await media_cache.close()
+    await profile_store.close()
+    await media_prefetcher.close()
+    await client_pool.close()
+    await audit_sink.close()
+    await supabase_gateway.close()
+    logger.info("Telegram client pool yopildi")
+
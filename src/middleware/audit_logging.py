@@ -1,45 +1,87 @@
 import json
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from datetime import datetime
-import re
-from collections import deque
+from src.services.supabase_service import peek_user_from_token
+from src.services.supabase_gateway import supabase_gateway
+from src.services.audit_sink import AuditSink, audit_row
+from src.services.audit_store import AuditStore
+from src.middleware.route_classifier import AUDITED_ROUTES, RouteClassifier
+from src import config
 
 logger = logging.getLogger(__name__)
 
 # In-memory audit log storage
-audit_logs_memory: deque = deque(maxlen=10000)  # Keep last 10,000 logs
+audit_logs_memory: AuditStore = AuditStore(maxlen=10000)  # Keep last 10,000 logs (hot tail, indexed)
+
+
+async def write_audit_batch(entries: List[Dict[str, Any]]) -> None:
+    """
+    Paketni ``public.audit_logs`` ga bitta insert bilan yozish (service role, thread poolda).
+    Insert xato bersa sink qatorlarni shu funksiya orqali bittalab qayta yozadi.
+    """
+    rows = [audit_row(e) for e in entries]
+    await supabase_gateway.run(
+        "audit_logs.insert",
+        lambda: config.supabase_service.table("audit_logs").insert(rows).execute(),
+    )
+
+
+# Doimiy saqlash: bazaga paketlab yozish, so'rov yo'lidan tashqarida
+audit_sink = AuditSink(
+    writer=write_audit_batch,
+    batch_size=config.AUDIT_BATCH_SIZE,
+    flush_interval=config.AUDIT_FLUSH_MS / 1000,
+    max_queue=config.AUDIT_QUEUE_MAX,
+)
 
 class AuditLoggingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, rules: Dict[Tuple[str, str], str] = AUDITED_ROUTES):
+        super().__init__(app)
+        self._rules = rules
+        self._classifier: Optional[RouteClassifier] = None
+        # Fonda user aniqlayotgan tasklar (GC yig'ib yubormasligi uchun)
+        self._pending: Set[asyncio.Task] = set()
+
+    async def __call__(self, scope, receive, send):
+        # Audit qilinmaydigan route'lar (xabarlar, media...) BaseHTTPMiddleware'siz to'g'ridan-to'g'ri
+        if scope["type"] == "http":
+            action = self._classifier_for(scope.get("app")).classify(scope["method"], scope["path"])
+            if action is None:
+                await self.app(scope, receive, send)
+                return
+            scope["audit_action"] = action
+        await super().__call__(scope, receive, send)
+
     async def dispatch(self, request: Request, call_next):
-        # Extract request details
         path = request.url.path
         method = request.method
+
+        action = request.scope.get("audit_action") or self._determine_action(path, method)
+        if not action:
+            return await call_next(request)
+
+        # Extract request details
         client_ip = self._get_client_ip(request)
         user_agent = request.headers.get("user-agent", "")
         authorization = request.headers.get("authorization", "")
 
-        # Extract user_id from token if present
+        # user_id: umumiy token keshi yoki lokal JWT tekshiruvi (tarmoqsiz)
         user_id = None
+        needs_remote = False
         if authorization.lower().startswith("bearer "):
-            token = authorization.split(" ", 1)[1].strip()
             try:
-                res = supabase_service.auth.get_user(token)
-                user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
-                if user:
-                    user_id = str(getattr(user, "id", ""))
-            except Exception as e:
+                user = peek_user_from_token(authorization)
+                if user is not None:
+                    user_id = str(getattr(user, "id", "") or "") or None
+                else:
+                    needs_remote = True
+            except ValueError as e:
                 logger.debug(f"Failed to extract user from token: {e}")
 
-        # Determine action based on path and method
-        action = self._determine_action(path, method)
-
-        # Skip logging if no action determined
-        if not action:
-            return await call_next(request)
-
         # Process the request
         response = await call_next(request)
 
@@ -64,27 +106,57 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
             "accept_encoding": request.headers.get("accept-encoding", ""),
         }
 
-        # Log to memory
+        log_entry = {
+            "id": str(datetime.utcnow().timestamp()) + "_" + str(len(audit_logs_memory)),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "user_id": user_id,
+            "action": action,
+            "route": path,
+            "http_method": method,
+            "status": status_code,
+            "ip_address": client_ip,
+            "device_info": device_info,
+            "error_message": error_message,
+            "created_at": datetime.utcnow().isoformat() + "Z"
+        }
+
+        if needs_remote:
+            # Handler tokenni gateway orqali tekshirgan bo'lsa natija umumiy keshda - qayta so'ralmaydi
+            try:
+                user = peek_user_from_token(authorization)
+            except ValueError:
+                user = None
+            if user is not None:
+                log_entry["user_id"] = str(getattr(user, "id", "") or "") or None
+                needs_remote = False
+
+        if needs_remote:
+            # Token na keshda, na lokal tekshiriladi: Supabase so'rovi javobni kutdirmaydi
+            task = asyncio.create_task(self._resolve_and_store(log_entry, authorization))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        else:
+            self._store(log_entry)
+
+        return response
+
+    async def _resolve_and_store(self, log_entry: Dict[str, Any], authorization: str) -> None:
+        try:
+            user = await supabase_gateway.get_user_from_token(authorization)
+            log_entry["user_id"] = str(getattr(user, "id", "") or "") or None
+        except Exception as e:
+            logger.debug(f"Failed to extract user from token: {e}")
+        self._store(log_entry)
+
+    def _store(self, log_entry: Dict[str, Any]) -> None:
+        # Log to memory (tezkor o'qish uchun) va bazaga yozish navbatiga
         try:
-            log_entry = {
-                "id": str(datetime.utcnow().timestamp()) + "_" + str(len(audit_logs_memory)),
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "user_id": user_id,
-                "action": action,
-                "route": path,
-                "http_method": method,
-                "status": status_code,
-                "ip_address": client_ip,
-                "device_info": device_info,
-                "error_message": error_message,
-                "created_at": datetime.utcnow().isoformat() + "Z"
-            }
             audit_logs_memory.append(log_entry)
-            logger.info(f"Audit log: {action} on {path} by user {user_id}")
+            logger.info(f"Audit log: {log_entry['action']} on {log_entry['route']} by user {log_entry['user_id']}")
         except Exception as e:
             logger.error(f"Failed to store audit log in memory: {e}")
-
-        return response
+        if config.AUDIT_PERSIST and not audit_sink.submit(log_entry):
+            logger.warning("Audit sink navbati to'la - log bazaga yozilmaydi")
 
     def _get_client_ip(self, request: Request) -> Optional[str]:
         """Extract client IP address from request headers."""
@@ -105,24 +177,11 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
 
     def _determine_action(self, path: str, method: str) -> Optional[str]:
         """Determine the audit action based on path and method."""
-        # Define action mappings
-        action_mappings = [
-            # Auth actions
-            (r"^/auth/login$", "POST", "login"),
-            (r"^/auth/logout$", "POST", "logout"),  # Assuming logout endpoint exists
-
-            # User CRUD actions
-            (r"^/admin/users$", "POST", "create"),
-            (r"^/admin/users/[^/]+$", "PATCH", "update"),
-            (r"^/admin/users/[^/]+$", "DELETE", "delete"),
-
-            # File upload (assuming telegram endpoints handle file uploads)
-            (r"^/start_login$", "POST", "file_upload"),  # May need adjustment based on actual endpoints
-            (r"^/me/telegrams$", "POST", "file_upload"),  # Assuming file upload for telegram sessions
-        ]
-
-        for pattern, req_method, action in action_mappings:
-            if method == req_method and re.match(pattern, path):
-                return action
-
-        return None
\ No newline at end of file
+        classifier = self._classifier or RouteClassifier.from_routes((), self._rules)
+        return classifier.classify(method, path)
+
+    def _classifier_for(self, app) -> RouteClassifier:
+        # Ilovaning route'laridan birinchi so'rovda bir marta quriladi
+        if self._classifier is None:
+            self._classifier = RouteClassifier.from_routes(getattr(app, "routes", None) or (), self._rules)
+        return self._classifier
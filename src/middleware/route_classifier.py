@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+
+from starlette.routing import compile_path
+
+logger = logging.getLogger(__name__)
+
+# (HTTP method, route path template) -> audit action
+AUDITED_ROUTES: Dict[Tuple[str, str], str] = {
+    # Auth actions
+    ("POST", "/auth/login"): "login",
+    ("POST", "/auth/logout"): "logout",
+    # User CRUD actions
+    ("POST", "/admin/users"): "create",
+    ("PATCH", "/admin/users/{user_id}"): "update",
+    ("DELETE", "/admin/users/{user_id}"): "delete",
+    # Telegram sessiyasini qo'shish
+    ("POST", "/start_login"): "file_upload",
+    ("POST", "/me/telegrams"): "file_upload",
+}
+
+
+class RouteClassifier:
+    """
+    (method, path) -> audit action jadvali, ilova route'laridan bir marta quriladi.
+
+    - parametrsiz route'lar: bitta dict lookup
+    - parametrli route'lar: faqat shu methoddagi audit qilinadigan route'larning
+      oldindan kompilyatsiya qilingan ``path_regex`` lari tekshiriladi
+    - audit qilinadigan route'i yo'q methodlar (GET...) darhol None
+    """
+
+    def __init__(self):
+        self._static: Dict[Tuple[str, str], str] = {}
+        self._dynamic: Dict[str, List[Tuple[Pattern, str]]] = {}
+        self.methods: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_routes(cls, routes: Iterable, rules: Dict[Tuple[str, str], str] = AUDITED_ROUTES) -> "RouteClassifier":
+        classifier = cls()
+        matched = set()
+        for route in routes:
+            path = getattr(route, "path", None)
+            regex = getattr(route, "path_regex", None)
+            for method in getattr(route, "methods", None) or ():
+                action = rules.get((method, path))
+                if action is not None and (method, path) not in matched:
+                    matched.add((method, path))
+                    classifier._add(method, path, regex, action)
+        for (method, path), action in rules.items():
+            if (method, path) not in matched:
+                # Ilovada bunday route yo'q - shablonning o'zidan kompilyatsiya qilamiz
+                logger.debug(f"Audit route ilovada topilmadi: {method} {path}")
+                classifier._add(method, path, None, action)
+        return classifier
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        if method not in self.methods:
+            return None
+        action = self._static.get((method, path))
+        if action is not None:
+            return action
+        for regex, action in self._dynamic.get(method, ()):
+            if regex.match(path):
+                return action
+        return None
+
+    def _add(self, method: str, path: str, regex: Optional[Pattern], action: str) -> None:
+        if "{" in path:
+            self._dynamic.setdefault(method, []).append((regex or compile_path(path)[0], action))
+        else:
+            self._static[(method, path)] = action
+        self.methods = self.methods | {method}
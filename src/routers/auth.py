@@ -1,11 +1,11 @@
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Path, Header
 from typing import Optional
-from src.config import supabase, supabase_service
+from src.services.supabase_gateway import supabase_gateway
 from src.models.user import (
     LoginIn, LoginOut, UserSafe, UserAdmin, UserCreate, UserOut, UserUpdate, SupabaseUserRaw
 )
-from src.services.supabase_service import ensure_default_app_metadata, g
+from src.services.supabase_service import g, token_cache_stats
 
 router = APIRouter()
 
@@ -13,7 +13,7 @@ router = APIRouter()
 async def check_connection():
     try:
         # Test connection by trying to list users (will check if admin access works)
-        _ = supabase_service.auth.admin.list_users()
+        _ = await supabase_gateway.list_users()
         return {"message": "Supabase'ga ulanildi", "status": "success"}
     except Exception as e:
         raise HTTPException(500, f"Ulanish xatosi: {str(e)}")
@@ -21,7 +21,7 @@ async def check_connection():
 @router.get("/users", response_model=list[UserSafe])
 async def get_users():
     try:
-        resp = supabase_service.auth.admin.list_users()
+        resp = await supabase_gateway.list_users()
         users = []
         for user in resp:
             # Map admin user data to UserSafe model
@@ -44,7 +44,7 @@ async def get_users():
 @router.get("/admin/users", response_model=list[UserAdmin])
 async def get_users_admin():
     try:
-        resp = supabase_service.auth.admin.list_users()
+        resp = await supabase_gateway.list_users()
         users = []
         for user in resp:
             # Map full admin user data to UserAdmin model
@@ -97,7 +97,7 @@ async def create_user(payload: UserCreate):
             "password": payload.password,
             "user_metadata": payload.user_metadata or {}
         }
-        res = supabase_service.auth.admin.create_user(req)
+        res = await supabase_gateway.create_user(req)
         user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
         if not user:
             raise HTTPException(500, "User yaratildi, lekin javobni o‘qib bo‘lmadi.")
@@ -122,7 +122,7 @@ async def admin_update_user(user_id: str = Path(...), payload: UserUpdate = ...)
         if payload.phone_confirm is not None: attrs["phone_confirm"] = payload.phone_confirm
         if payload.ban_duration is not None: attrs["ban_duration"] = payload.ban_duration
 
-        res = supabase_service.auth.admin.update_user_by_id(user_id, attrs)
+        res = await supabase_gateway.update_user_by_id(user_id, attrs)
         user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
         if not user:
             raise HTTPException(404, "User topilmadi yoki yangilanmadi.")
@@ -142,7 +142,7 @@ async def set_user_admin(user_id: str = Path(...), is_admin: bool = True):
     """Set or remove admin role for a user"""
     try:
         # Get current user metadata
-        user_res = supabase_service.auth.admin.get_user_by_id(user_id)
+        user_res = await supabase_gateway.get_user_by_id(user_id)
         current_user = user_res.user
         if not current_user:
             raise HTTPException(404, "User topilmadi.")
@@ -152,7 +152,7 @@ async def set_user_admin(user_id: str = Path(...), is_admin: bool = True):
         # Update metadata
         new_meta = {**current_meta, "role": "admin" if is_admin else "user"}
 
-        res = supabase_service.auth.admin.update_user_by_id(user_id, {"app_metadata": new_meta})
+        res = await supabase_gateway.update_user_by_id(user_id, {"app_metadata": new_meta})
         user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
         if not user:
             raise HTTPException(404, "User yangilanmadi.")
@@ -166,7 +166,7 @@ async def set_user_admin(user_id: str = Path(...), is_admin: bool = True):
 @router.delete("/admin/users/{user_id}", status_code=204)
 async def admin_delete_user(user_id: str = Path(...)):
     try:
-        supabase_service.auth.admin.delete_user(user_id)
+        await supabase_gateway.delete_user(user_id)
         return
     except Exception as e:
         msg = str(e).lower()
@@ -177,7 +177,7 @@ async def admin_delete_user(user_id: str = Path(...)):
 @router.post("/auth/login", response_model=LoginOut)
 async def login_email_password(body: LoginIn):
     try:
-        res = supabase.auth.sign_in_with_password({"email": body.email, "password": body.password})
+        res = await supabase_gateway.sign_in_with_password({"email": body.email, "password": body.password})
         session = getattr(res, "session", None)
         user = getattr(res, "user", None)
         if not session or not getattr(session, "access_token", None):
@@ -210,7 +210,7 @@ async def logout(authorization: str = Header(..., alias="Authorization")):
             raise HTTPException(400, "Authorization header 'Bearer <token>' bo‘lishi kerak")
         token = authorization.split(" ", 1)[1].strip()
         # Sign out the user
-        supabase.auth.sign_out()
+        await supabase_gateway.sign_out()
         return {"message": "Logout muvaffaqiyatli"}
     except Exception as e:
         raise HTTPException(400, str(e))
@@ -229,22 +229,11 @@ async def get_audit_logs(
         # Verify admin access
         if not authorization.lower().startswith("bearer "):
             raise HTTPException(400, "Authorization header 'Bearer <token>' bo‘lishi kerak")
-        token = authorization.split(" ", 1)[1].strip()
+        # Rol tokendagi claimlardan emas, Supabase'dagi joriy metadata'dan tekshiriladi
         try:
-            res = supabase.auth.get_user(token)
-            user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
-            if not user:
-                raise HTTPException(401, "Noto‘g‘ri token")
-        except HTTPException:
-            raise
-        except Exception as e:
-            msg = str(e).lower()
-            if "session from session_id claim in jwt does not exist" in msg:
-                raise HTTPException(400, "Token muddati o'tgan yoki sessiya mavjud emas. Qayta login qiling.")
-            elif "invalid jwt" in msg or "jwt" in msg:
-                raise HTTPException(400, "Token noto'g'ri yoki yaroqsiz.")
-            else:
-                raise HTTPException(400, f"Autentifikatsiya xatosi: {str(e)}")
+            user = await supabase_gateway.get_user_from_token(authorization, fresh=True)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
         app_meta = getattr(user, "raw_app_meta_data", None) or getattr(user, "app_metadata", None) or {}
         is_super_admin = getattr(user, "is_super_admin", False)
         is_admin = app_meta.get("role") == "admin" or is_super_admin
@@ -254,25 +243,15 @@ async def get_audit_logs(
         # Read from in-memory storage
         from src.middleware.audit_logging import audit_logs_memory
 
-        # Filter logs
-        filtered_logs = list(audit_logs_memory)
-
-        # Apply filters
-        if user_id:
-            filtered_logs = [log for log in filtered_logs if log.get("user_id") == user_id]
-        if action:
-            filtered_logs = [log for log in filtered_logs if log.get("action") == action]
-        if start_date:
-            filtered_logs = [log for log in filtered_logs if log.get("timestamp", "") >= start_date]
-        if end_date:
-            filtered_logs = [log for log in filtered_logs if log.get("timestamp", "") <= end_date]
-
-        # Sort by timestamp descending
-        filtered_logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-
-        # Apply pagination
-        total = len(filtered_logs)
-        logs = filtered_logs[offset:offset + limit]
+        # Indeks bo'yicha filter va sahifa (nusxa va qayta saralashsiz), eng yangisi birinchi
+        total, logs = audit_logs_memory.query(
+            user_id=user_id,
+            action=action,
+            start=start_date,
+            end=end_date,
+            limit=limit,
+            offset=offset,
+        )
 
         return {
             "logs": logs,
@@ -285,30 +264,34 @@ async def get_audit_logs(
     except Exception as e:
         raise HTTPException(500, str(e))
 
+# --- Admin: auth keshi, Supabase gateway va audit log holati
+@router.get("/admin/auth/stats")
+async def get_auth_stats():
+    from src.middleware.audit_logging import audit_sink, audit_logs_memory
+
+    return {
+        "ok": True,
+        "auth_tokens": token_cache_stats(),
+        "supabase_gateway": supabase_gateway.stats(),
+        "audit_sink": audit_sink.stats(),
+        "audit_logs": audit_logs_memory.stats(),
+    }
+
 @router.get("/auth/me", response_model=SupabaseUserRaw)
 async def get_current_user(authorization: str = Header(..., alias="Authorization")):
     try:
         if not authorization.lower().startswith("bearer "):
             raise HTTPException(400, "Authorization header 'Bearer <token>' bo‘lishi kerak")
-        token = authorization.split(" ", 1)[1].strip()
+        # Tarif/to'lov holati joriy app_metadata'dan o'qiladi (kesh ham yangilanadi)
         try:
-            res = supabase.auth.get_user(token)
-            user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
-            if not user:
-                raise HTTPException(401, "Noto‘g‘ri token yoki user topilmadi.")
-        except Exception as e:
-            msg = str(e).lower()
-            if "session from session_id claim in jwt does not exist" in msg:
-                raise HTTPException(400, "Token muddati o'tgan yoki sessiya mavjud emas. Qayta login qiling.")
-            elif "invalid jwt" in msg or "jwt" in msg:
-                raise HTTPException(400, "Token noto'g'ri yoki yaroqsiz.")
-            else:
-                raise HTTPException(400, f"Autentifikatsiya xatosi: {str(e)}")
+            user = await supabase_gateway.get_user_from_token(authorization, fresh=True)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
         user_id = str(g(user, "id"))
         app_meta = g(user, "raw_app_meta_data") or g(user, "app_metadata") or {}
         if not app_meta.get("plan"):
-            ensure_default_app_metadata(user_id)
-            user = supabase_service.auth.admin.get_user_by_id(user_id).user
+            await supabase_gateway.ensure_default_app_metadata(user_id)
+            user = (await supabase_gateway.get_user_by_id(user_id)).user
             app_meta = g(user, "app_metadata", {})
         cur_end = app_meta.get("current_period_end")
         if cur_end:
@@ -323,8 +306,8 @@ async def get_current_user(authorization: str = Header(..., alias="Authorization
                     expires = None
             if expires and expires < datetime.now(timezone.utc) and app_meta.get("status") != "expired":
                 new_meta = {**app_meta, "status": "expired"}
-                supabase_service.auth.admin.update_user_by_id(user_id, {"app_metadata": new_meta})
-                user = supabase_service.auth.admin.get_user_by_id(user_id).user
+                await supabase_gateway.update_user_by_id(user_id, {"app_metadata": new_meta})
+                user = (await supabase_gateway.get_user_by_id(user_id)).user
         def _g(obj, name, default=None):
             return getattr(obj, name, default) if not isinstance(obj, dict) else obj.get(name, default)
         return SupabaseUserRaw(
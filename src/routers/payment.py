@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Header, Request
 from typing import Optional
 from pydantic import BaseModel
-from src.config import supabase, POLAR_SUCCESS_URL
+from src.config import POLAR_SUCCESS_URL
+from src.services.supabase_gateway import supabase_gateway
 from src.services.polar_service import polar_service
 import logging
 import json
@@ -40,20 +41,10 @@ async def create_checkout(
     # Token tekshirish - auth/me dan nusxa
     if not authorization.lower().startswith("bearer "):
         raise HTTPException(400, "Authorization header 'Bearer <token>' bo'lishi kerak")
-    token = authorization.split(" ", 1)[1].strip()
     try:
-        res = supabase.auth.get_user(token)
-        user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
-        if not user:
-            raise HTTPException(401, "Noto'g'ri token yoki user topilmadi.")
-    except Exception as e:
-        msg = str(e).lower()
-        if "session from session_id claim in jwt does not exist" in msg:
-            raise HTTPException(400, "Token muddati o'tgan yoki sessiya mavjud emas. Qayta login qiling.")
-        elif "invalid jwt" in msg or "jwt" in msg:
-            raise HTTPException(400, "Token noto'g'ri yoki yaroqsiz.")
-        else:
-            raise HTTPException(400, f"Autentifikatsiya xatosi: {str(e)}")
+        user = await supabase_gateway.get_user_from_token(authorization, fresh=True)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     user_id = str(getattr(user, "id", ""))
     email = getattr(user, "email", "")
@@ -158,7 +149,7 @@ async def get_subscription_status(authorization: str = Header(..., alias="Author
         logger.info(f"URL decoded token: {token[:20]}...")
 
         # Supabase user validation
-        res = supabase.auth.get_user(token)
+        res = await supabase_gateway.get_user(token)
         user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
 
         if not user:
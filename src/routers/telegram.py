@@ -1,13 +1,17 @@
 import asyncio
+import logging
 from fastapi import APIRouter, HTTPException, Header, Query, Path
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from pyrogram.errors import SessionPasswordNeeded, PhoneCodeInvalid, PhoneNumberInvalid
 from src.models.user import StartLoginIn, StartLoginInNew, VerifyCodeIn, VerifyCodeInNew, VerifyPasswordIn, VerifyPasswordInNew
 from src.services.telegram_service import (
     login_states, build_client, list_user_telegram_profiles,
-    logout_one, logout_all, ensure_user_avatar_downloaded, list_private_chats_minimal, list_groups_minimal, get_chat_messages, build_client_for, get_client, export_chat_messages
+    logout_one, logout_all, list_private_chats_minimal, list_groups_minimal, get_chat_messages_page, export_chat_messages, stream_chat_export, export_chat_incremental, build_merged_export,
+    download_media_to_file, stream_media_bytes, DEFAULT_AVATAR_URL,
+    client_pool, account_registry, dialog_index, media_prefetcher, peer_cache, group_stats, export_jobs, media_downloads, media_access, blob_store, media_cache, downloads_index, known_dirs, profile_store
 )
-from src.services.supabase_service import get_user_from_token, get_user_by_token
-from src.config import supabase
+from src.services.supabase_gateway import supabase_gateway
+from src.services.media_stream import parse_range, iter_file_range
 from typing import Optional
 from pathlib import Path as PathLib
 
@@ -15,14 +19,26 @@ MEDIA_ROOT = PathLib("media")
 
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+
+async def require_account(user_id: str, session_index: int) -> dict:
+    """Account index mavjudligini keshlangan registry orqali tekshirish."""
+    account = await account_registry.get_account(user_id, session_index)
+    if not account:
+        raise HTTPException(400, "Account index topilmadi")
+    if account.get("invalid"):
+        raise HTTPException(400, "Account faol emas yoki noto'g'ri")
+    return account
+
 # 1) START LOGIN
 @router.post("/start_login")
 async def start_login(body: StartLoginInNew, authorization: str = Header(..., alias="Authorization")):
     # Get user from token
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         msg = str(e).lower()
@@ -86,7 +102,7 @@ async def start_login(body: StartLoginInNew, authorization: str = Header(..., al
 async def verify_code(body: VerifyCodeInNew, authorization: str = Header(..., alias="Authorization")):
     # Get user from token
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         msg = str(e).lower()
@@ -122,6 +138,7 @@ async def verify_code(body: VerifyCodeInNew, authorization: str = Header(..., al
         del login_states[body.phone_number]
         try: await client.disconnect()
         except: pass
+        account_registry.invalidate(user_id)
 
         return {"ok": True, "status": "LOGGED_IN", "session_name": session_name, "account_index": acc_idx}
 
@@ -155,7 +172,7 @@ async def verify_code(body: VerifyCodeInNew, authorization: str = Header(..., al
 async def verify_password(body: VerifyPasswordInNew, authorization: str = Header(..., alias="Authorization")):
     # Get user from token
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         msg = str(e).lower()
@@ -183,6 +200,7 @@ async def verify_password(body: VerifyPasswordInNew, authorization: str = Header
         del login_states[body.phone_number]
         try: await client.disconnect()
         except: pass
+        account_registry.invalidate(user_id)
 
         return {"ok": True, "status": "LOGGED_IN", "message": "2FA orqali login qilindi",
                 "session_name": session_name, "account_index": acc_idx}
@@ -202,12 +220,15 @@ async def verify_password(body: VerifyPasswordInNew, authorization: str = Header
             try: await client.disconnect()
             except: pass
 
-# --- Admin: barcha userlar Telegramlari (profil bilan)
+# --- Admin: barcha userlar Telegramlari (profil bilan), sahifalab
 @router.get("/admin/users-with-telegrams")
-async def get_users_with_telegrams():
-    from src.config import supabase_service
+async def get_users_with_telegrams(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=1000),
+):
     try:
-        resp = supabase_service.auth.admin.list_users()
+        # Supabase tomonda sahifalash; profillar account_registry keshidan
+        resp = await supabase_gateway.list_users(page=page, per_page=per_page)
         users = []
         for user in resp:
             # Map to safe user data
@@ -222,20 +243,65 @@ async def get_users_with_telegrams():
             uid = u.get("id")
             email = u.get("email")
             phone = u.get("phone")
-            telegram_accounts = await list_user_telegram_profiles(uid)
+            # Keshda bo'lmasa yuklanadi; Telegram ulanishlari profile_semaphore bilan cheklangan
+            telegram_accounts = await account_registry.accounts(uid)
             return {"id": uid, "email": email, "phone": phone, "telegram_accounts": telegram_accounts}
 
         rows = await asyncio.gather(*[build_row(u) for u in users])
-        return {"ok": True, "users": rows}
+        return {
+            "ok": True,
+            "users": rows,
+            "page": page,
+            "per_page": per_page,
+            "next_page": page + 1 if len(users) == per_page else None,
+        }
     except Exception as e:
         raise HTTPException(500, str(e))
 
+# --- Admin: Telegram client pool holati
+@router.get("/admin/telegram/pool")
+async def get_client_pool_stats():
+    return {
+        "ok": True,
+        "pool": client_pool.stats(),
+        "account_registry": account_registry.stats(),
+        "dialog_index": dialog_index.stats(),
+        "media_prefetch": media_prefetcher.stats(),
+        "peer_cache": peer_cache.stats(),
+        "group_stats": group_stats.stats(),
+        "export_jobs": export_jobs.stats(),
+        "media_downloads": media_downloads.stats(),
+        "media_access": media_access.stats(),
+        "blob_store": blob_store.stats(),
+        "downloads_index": downloads_index.stats(),
+        "known_dirs": known_dirs.stats(),
+        "profile_snapshots": profile_store.stats(),
+    }
+
+
+@router.get("/admin/media/cache")
+async def get_media_cache_stats():
+    """media/ papkasi: kategoriya bo'yicha foydalanish, kvotalar va eviction statistikasi."""
+    return {"ok": True, "cache": media_cache.stats(), "blob_store": blob_store.stats()}
+
+
+@router.post("/admin/media/cache/sweep")
+async def run_media_cache_sweep():
+    """Foydalanishni qayta hisoblash va limitdan oshgan bo'lsa LRU eviction."""
+    return {"ok": True, "sweep": await media_cache.run_sweep(), "cache": media_cache.stats()}
+
+
+@router.post("/admin/media/blobs/gc")
+async def run_blob_gc():
+    """Hech bir foydalanuvchi yo'li ko'rsatmaydigan media bloblarni darhol tozalash."""
+    return {"ok": True, "gc": await asyncio.to_thread(blob_store.gc)}
+
 # --- User: o‘z Telegram profil(lar)i
 @router.get("/me/telegrams")
 async def get_my_telegrams(authorization: str = Header(..., alias="Authorization")):
     from src.services.supabase_service import g
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         uid = str(g(user, "id"))
         email = g(user, "email")
         telegram_accounts = await list_user_telegram_profiles(uid)
@@ -258,7 +324,7 @@ async def admin_logout_one_telegram(user_id: str, index: str):
 async def me_logout_one_telegram(index: str, authorization: str = Header(..., alias="Authorization")):
     from src.services.supabase_service import g
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         uid = str(g(user, "id"))
         result = await logout_one(uid, index)
         if result["status"] == "not_found":
@@ -272,7 +338,7 @@ async def me_logout_one_telegram(index: str, authorization: str = Header(..., al
 async def me_logout_all_telegrams(authorization: str = Header(..., alias="Authorization")):
     from src.services.supabase_service import g
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         uid = str(g(user, "id"))
         results = await logout_all(uid)
         return {"ok": True, "results": results}
@@ -292,18 +358,13 @@ async def list_private_chats(
     dialog_limit: int = Query(10, ge=1, le=100),
 ):
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         raise HTTPException(401, str(e))
 
     # Validate account_index
-    accounts = await list_user_telegram_profiles(user_id)
-    account = next((acc for acc in accounts if acc.get("index") == str(session_index)), None)
-    if not account:
-        raise HTTPException(400, "Account index topilmadi")
-    if account.get("invalid"):
-        raise HTTPException(400, "Account faol emas yoki noto'g'ri")
+    await require_account(user_id, session_index)
 
     try:
         items = await list_private_chats_minimal(
@@ -325,7 +386,7 @@ async def list_groups(
     dialog_limit: int = Query(10, ge=1, le=100),
 ):
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         raise HTTPException(401, str(e))
@@ -346,43 +407,47 @@ async def get_messages(
     authorization: str = Header(..., alias="Authorization"),
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    before_id: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None, ge=1),
 ):
-    print(f"get_messages called with chat_id={chat_id}, session_index={session_index}, limit={limit}, offset={offset}")
+    if before_id is not None and after_id is not None:
+        raise HTTPException(400, "before_id va after_id birga ishlatilmaydi")
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
-        print(f"User authenticated: {user_id}")
     except ValueError as e:
-        print(f"Authentication error: {e}")
         raise HTTPException(401, str(e))
 
     # Validate account_index
-    accounts = await list_user_telegram_profiles(user_id)
-    account = next((acc for acc in accounts if acc.get("index") == str(session_index)), None)
-    if not account:
-        print(f"Account index {session_index} not found")
-        raise HTTPException(400, "Account index topilmadi")
-    if account.get("invalid"):
-        print(f"Account index {session_index} is invalid")
-        raise HTTPException(400, "Account faol emas yoki noto'g'ri")
+    await require_account(user_id, session_index)
 
     try:
-        messages = await get_chat_messages(
+        messages, has_more = await get_chat_messages_page(
             user_id=user_id,
             account_index=session_index,
             chat_id=chat_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            before_id=before_id,
+            after_id=after_id,
         )
-        print(f"Messages fetched successfully: {len(messages)} messages")
-        return {"ok": True, "count": len(messages), "messages": messages}
+        logger.debug(f"get_messages {user_id}/{session_index} chat={chat_id}: {len(messages)} ta xabar")
+        # Keyingi sahifalar uchun cursor: eskiroq -> before_id, yangiroq -> after_id;
+        # has_more - so'ralgan yo'nalishda (after_id bo'lsa yangiroq, aks holda eskiroq) yana xabar bor
+        ids = [m["id"] for m in messages]
+        cursor = {
+            "before_id": min(ids) if ids else None,
+            "after_id": max(ids) if ids else after_id,
+            "has_more": has_more,
+        }
+        return {"ok": True, "count": len(messages), "messages": messages, "cursor": cursor}
     except ValueError as e:
         # Our custom errors
-        print(f"ValueError in get_messages: {e}")
+        logger.debug(f"get_messages ValueError: {e}")
         raise HTTPException(400, {"ok": False, "error": str(e)})
     except Exception as e:
         msg = str(e).lower()
-        print(f"Exception in get_messages: {e}")
+        logger.warning(f"get_messages xatolik chat={chat_id}: {e}")
         if "peer_id_invalid" in msg or "peer id" in msg:
             raise HTTPException(400, {"ok": False, "error": f"Chat topilmadi yoki mavjud emas. Chat ID noto'g'ri. Xatolik: {str(e)}"})
         else:
@@ -394,27 +459,59 @@ async def get_messages(
 async def export_chat(
     chat_id: int = Path(...),
     session_index: int = Query(..., ge=1),
+    format: str = Query("json", regex=r"^(json|ndjson)$"),
+    stream: bool = Query(False, description="True bo'lsa fayl yozilmaydi, eksport chunked javob sifatida qaytadi"),
+    mode: str = Query("full", regex=r"^(full|incremental)$", description="incremental - faqat oldingi eksportdan keyingi xabarlar"),
     authorization: str = Header(..., alias="Authorization"),
 ):
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         raise HTTPException(401, str(e))
 
     # Validate account_index
-    accounts = await list_user_telegram_profiles(user_id)
-    account = next((acc for acc in accounts if acc.get("index") == str(session_index)), None)
-    if not account:
-        raise HTTPException(400, "Account index topilmadi")
-    if account.get("invalid"):
-        raise HTTPException(400, "Account faol emas yoki noto'g'ri")
+    await require_account(user_id, session_index)
+
+    if mode == "incremental":
+        try:
+            return await export_chat_incremental(user_id, session_index, chat_id)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"Xatolik: {str(e)}")
+
+    if stream:
+        chunks = stream_chat_export(user_id, session_index, chat_id, format)
+        try:
+            # Birinchi chunk chat tekshiruvidan keyin keladi - xatolar javob boshlanishidan oldin
+            head = await chunks.__anext__()
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"Xatolik: {str(e)}")
+
+        async def body():
+            try:
+                yield head
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+        media_type = "application/json" if format == "json" else "application/x-ndjson"
+        return StreamingResponse(
+            body(),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="chat_{chat_id}.{format}"'},
+        )
 
     try:
         export_result = await export_chat_messages(
             user_id=user_id,
             account_index=session_index,
-            chat_id=chat_id
+            chat_id=chat_id,
+            fmt=format,
         )
         return export_result
     except ValueError as e:
@@ -423,16 +520,100 @@ async def export_chat(
         raise HTTPException(500, f"Xatolik: {str(e)}")
 
 
+@router.get("/me/chats/{chat_id}/export/merged")
+async def export_chat_merged(
+    chat_id: int = Path(...),
+    session_index: int = Query(..., ge=1),
+    format: str = Query("json", regex=r"^(json|ndjson)$"),
+    authorization: str = Header(..., alias="Authorization"),
+):
+    """Inkremental eksport segmentlaridan to'liq fayl yig'ish."""
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
+
+    await require_account(user_id, session_index)
+
+    try:
+        return await build_merged_export(user_id, session_index, chat_id, format)
+    except Exception as e:
+        raise HTTPException(500, f"Xatolik: {str(e)}")
+
+
+# ---- export jobs (fon eksport, progress, resume, cancel) ----
+@router.post("/me/chats/{chat_id}/export/jobs")
+async def create_export_job(
+    chat_id: int = Path(...),
+    session_index: int = Query(..., ge=1),
+    format: str = Query("json", regex=r"^(json|ndjson)$"),
+    authorization: str = Header(..., alias="Authorization"),
+):
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
+
+    await require_account(user_id, session_index)
+
+    job = export_jobs.submit(user_id, session_index, chat_id, format)
+    return {"ok": True, "job": job.to_dict()}
+
+
+@router.get("/me/export/jobs")
+async def list_export_jobs(authorization: str = Header(..., alias="Authorization")):
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
+
+    return {"ok": True, "jobs": [job.to_dict() for job in export_jobs.list_jobs(user_id)]}
+
+
+@router.get("/me/export/jobs/{job_id}")
+async def get_export_job(job_id: str = Path(...), authorization: str = Header(..., alias="Authorization")):
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
+
+    job = export_jobs.get(user_id, job_id)
+    if not job:
+        raise HTTPException(404, "Export job topilmadi")
+    return {"ok": True, "job": job.to_dict()}
+
+
+@router.delete("/me/export/jobs/{job_id}")
+async def cancel_export_job(job_id: str = Path(...), authorization: str = Header(..., alias="Authorization")):
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
+
+    job = await export_jobs.cancel(user_id, job_id)
+    if not job:
+        raise HTTPException(404, "Export job topilmadi")
+    return {"ok": True, "job": job.to_dict()}
+
+
 # ---- download media ----
 @router.get("/me/download_media")
 async def download_media(
     account_index: int = Query(..., ge=1),
     file_id: str = Query(...),
     media_type: str = Query(..., regex=r"^(photo|video|audio|document|voice|sticker|animation|video_note)$"),
+    stream: bool = Query(False, description="True bo'lsa baytlar to'g'ridan-to'g'ri javobda uzatiladi (Range qo'llab-quvvatlanadi)"),
+    file_size: Optional[int] = Query(None, ge=0, description="Keshlanmagan faylda Range uchun fayl hajmi (bayt)"),
+    range_header: Optional[str] = Header(None, alias="Range"),
     authorization: str = Header(..., alias="Authorization"),
 ):
     try:
-        user = get_user_from_token(authorization)
+        user = await supabase_gateway.get_user_from_token(authorization)
         user_id = str(getattr(user, "id"))
     except ValueError as e:
         raise HTTPException(401, str(e))
@@ -458,22 +639,19 @@ async def download_media(
         ext = "file"
 
     dest = MEDIA_ROOT / "downloads" / user_id / str(account_index) / f"{file_id}.{ext}"
+
+    if stream:
+        return _media_stream_response(user_id, account_index, file_id, dest, range_header, file_size)
+
     if dest.exists():
         size = dest.stat().st_size
         return {"ok": True, "url": f"/media/downloads/{user_id}/{account_index}/{file_id}.{ext}", "size": size}
 
-    # Download
-    client = await get_client(user_id, account_index)
+    # Download (chunklab diskka, butun fayl xotirada turmaydi)
     try:
-        data = await client.download_media(file_id, in_memory=True)
-        if data:
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            with open(dest, 'wb') as f:
-                f.write(data.getvalue())
-            size = dest.stat().st_size
-            return {"ok": True, "url": f"/media/downloads/{user_id}/{account_index}/{file_id}.{ext}", "size": size}
-        else:
-            raise HTTPException(500, "Fayl yuklab olinmadi")
+        await download_media_to_file(user_id, account_index, file_id, dest)
+        size = dest.stat().st_size
+        return {"ok": True, "url": f"/media/downloads/{user_id}/{account_index}/{file_id}.{ext}", "size": size}
     except Exception as e:
         msg = str(e).lower()
         if "file_id_invalid" in msg or "file" in msg:
@@ -484,4 +662,66 @@ async def download_media(
             raise HTTPException(500, f"Fayl yuklab olishda xatolik: {str(e)}")
 
 
+def _media_stream_response(
+    user_id: str,
+    account_index: int,
+    file_id: str,
+    dest: PathLib,
+    range_header: Optional[str],
+    file_size: Optional[int],
+) -> StreamingResponse:
+    """Keshdagi fayl yoki Telegramdan oqim; Range bo'lsa 206 Partial Content."""
+    cached = dest.exists()
+    size = dest.stat().st_size if cached else file_size
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        raise HTTPException(416, "Range noto'g'ri", headers={"Content-Range": f"bytes */{size}"})
+
+    headers = {"Accept-Ranges": "bytes"}
+    status_code = 200
+    start, end = 0, None
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+    elif size is not None:
+        headers["Content-Length"] = str(size)
+
+    if cached:
+        body = iter_file_range(dest, start, size - 1 if end is None else end)
+    else:
+        # To'liq so'rovda oqim bilan birga fayl keshga ham yoziladi
+        body = stream_media_bytes(user_id, account_index, file_id, start, end, cache_to=dest)
+    return StreamingResponse(body, status_code=status_code, headers=headers, media_type="application/octet-stream")
+
+
+# ---- lazy media (listing bergan /media_lazy/... URLlar) ----
+@router.get("/media_lazy/{rel_path:path}")
+async def lazy_media(rel_path: str, authorization: str = Header(..., alias="Authorization")):
+    """
+    Hali yuklanmagan avatar/emoji/thumbnail: fon navbatidagi jobni kutadi yoki darhol bajaradi.
+    Faqat listing ro'yxatga olgan va shu foydalanuvchiga tegishli ({kind}/{user_id}/...) fayllar yuklanadi,
+    boshqalari uchun 404. Avatar yuklanmasa default avatarga yo'naltiriladi.
+    """
+    try:
+        user = await supabase_gateway.get_user_from_token(authorization)
+        user_id = str(getattr(user, "id"))
+    except ValueError as e:
+        raise HTTPException(401, str(e))
 
+    parts = PathLib(rel_path).parts
+    if len(parts) < 3 or parts[1] != user_id:
+        raise HTTPException(404, "Fayl topilmadi")
+    root = MEDIA_ROOT.resolve()
+    dest = (MEDIA_ROOT / rel_path).resolve()
+    if root not in dest.parents:
+        raise HTTPException(404, "Fayl topilmadi")
+    if not dest.exists():
+        await media_prefetcher.fetch_now(rel_path)
+    if not dest.exists():
+        if parts[0] == "avatars" and not dest.name.endswith("_emoji.webp"):
+            return RedirectResponse(DEFAULT_AVATAR_URL)
+        raise HTTPException(404, "Fayl topilmadi")
+    return FileResponse(str(dest))
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ProfileLoader = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+class AccountRegistry:
+    """
+    Foydalanuvchining Telegram akkauntlari uchun qisqa muddatli kesh.
+
+    Index tekshiruvi (``get_account``) kesh bo'lsa lokal lookup bo'ladi;
+    login/logout dan keyin ``invalidate`` chaqiriladi.
+    """
+
+    def __init__(self, loader: ProfileLoader, ttl: float = 60, maxsize: int = 10000):
+        self._loader = loader
+        self._cache: TTLCache[List[Dict[str, Any]]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def accounts(self, user_id: str) -> List[Dict[str, Any]]:
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            # Parallel so'rovlar bitta yuklashni kutadi
+            cached = self._cache.get(user_id, count=False)
+            if cached is not None:
+                return cached
+            profiles = await self._loader(user_id)
+            self.prime(user_id, profiles)
+            return profiles
+
+    async def get_account(self, user_id: str, account_index: int) -> Optional[Dict[str, Any]]:
+        accounts = await self.accounts(user_id)
+        return next((acc for acc in accounts if acc.get("index") == str(account_index)), None)
+
+    def prime(self, user_id: str, profiles: List[Dict[str, Any]]) -> None:
+        self._cache.set(user_id, profiles)
+
+    def invalidate(self, user_id: str) -> None:
+        self._cache.pop(user_id)
+        logger.debug(f"Account registry invalidated for {user_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
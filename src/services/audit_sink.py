@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import uuid
+import asyncio
+import logging
+import ipaddress
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from postgrest.exceptions import APIError
+
+logger = logging.getLogger(__name__)
+
+Writer = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+# Qatorning o'zi rad etilgan (boshqa qatorlar yozilishi mumkin) SQLSTATE sinflari:
+# 22 - noto'g'ri qiymat (uuid/inet...), 23 - FK/CHECK/NOT NULL buzilishi
+_ROW_SQLSTATE_CLASSES = ("22", "23")
+
+
+def is_row_rejection(exc: BaseException) -> bool:
+    """
+    Paketni bazaning o'zi qator sababli rad etdimi (4xx / constraint)? Timeout, ulanish xatosi,
+    5xx va 408/429 - transport/outage: paket bo'linmaydi, butunligicha qayta yuboriladi.
+    """
+    if not isinstance(exc, APIError):
+        return False
+    code = str(exc.code or "")
+    if len(code) == 5 and code[:2] in _ROW_SQLSTATE_CLASSES:
+        return True
+    # PostgREST JSON bo'lmagan javobda code = HTTP status
+    return code.isdigit() and len(code) == 3 and code.startswith("4") and code not in ("408", "429")
+
+
+def audit_row(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Middleware yozuvini ``public.audit_logs`` qatoriga aylantirish (id bazada generatsiya qilinadi)."""
+    return {
+        "timestamp": entry.get("timestamp"),
+        "user_id": _uuid_or_none(entry.get("user_id")),
+        "action": entry.get("action"),
+        "route": entry.get("route"),
+        "http_method": entry.get("http_method"),
+        "status": entry.get("status"),
+        "ip_address": _ip_or_none(entry.get("ip_address")),
+        "device_info": entry.get("device_info"),
+        "error_message": entry.get("error_message"),
+        "created_at": entry.get("created_at"),
+    }
+
+
+class AuditSink:
+    """
+    Audit loglarni bazaga paketlab yozuvchi async sink.
+
+    - ``submit`` so'rov yo'lida faqat buferga qo'shadi (kutmaydi)
+    - fon worker ``batch_size`` ta yig'ilganda yoki har ``flush_interval`` soniyada bitta insert qiladi
+    - bufer ``max_queue`` dan oshsa yangi yozuvlar tashlanadi (``dropped``) - bazaga yozish
+      sekinlashsa ham xotira va javob vaqti o'smaydi
+    - qator sababli rad etilgan paket (``is_row_rejection``: FK/CHECK buzilishi, 4xx) bir marta
+      bittalab yoziladi - bitta yomon qator butun paketni yo'qotmasin
+    - transport xatosi (timeout, 5xx, ulanish) yoki qolgan qatorlar ``max_retries`` marta
+      backoff bilan butunligicha qayta yuboriladi, keyin ``failed`` ga yoziladi
+    """
+
+    def __init__(
+        self,
+        writer: Writer,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        split_on: Callable[[BaseException], bool] = is_row_rejection,
+    ):
+        self.writer = writer
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.split_on = split_on
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.split_batches = 0
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        if len(self._buffer) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._buffer.append(entry)
+        self.submitted += 1
+        if self._wake is not None and len(self._buffer) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+
+    async def close(self) -> None:
+        """Workerni to'xtatish va buferda qolganini bir urinishda yozish."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake = None
+        while self._buffer:
+            await self._write(self._take(), retries=0)
+
+    async def flush(self) -> None:
+        while self._buffer:
+            await self._write(self._take(), retries=self.max_retries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._buffer),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "split_batches": self.split_batches,
+        }
+
+    # ---- internals ----
+    def _take(self) -> List[Dict[str, Any]]:
+        n = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(n)]
+
+    async def _write(self, batch: List[Dict[str, Any]], retries: int) -> None:
+        attempt = 0
+        split = len(batch) > 1
+        while True:
+            try:
+                await self.writer(batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                if split and self.split_on(e):
+                    split = False
+                    batch = await self._write_rows(batch)
+                    if not batch:
+                        return
+                if attempt >= retries:
+                    self.failed += len(batch)
+                    logger.error(f"Audit loglar yozilmadi ({len(batch)} ta): {e}")
+                    return
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+    async def _write_rows(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Paketni bittalab yozish; yozilmagan qatorlar qaytariladi."""
+        self.split_batches += 1
+        rejected = []
+        for i, entry in enumerate(batch):
+            try:
+                await self.writer([entry])
+            except Exception as e:
+                logger.warning(f"Audit log qatori yozilmadi ({entry.get('action')} {entry.get('route')}): {e}")
+                rejected.append(entry)
+                if not self.split_on(e):
+                    # Baza yetib bo'lmas bo'lib qoldi - qolganini bittalab urinib o'tirmaymiz
+                    return rejected + batch[i + 1:]
+            else:
+                self.written += 1
+        return rejected
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Audit sink xatolik: {e}")
+
+
+def _uuid_or_none(value: Any) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(value))) if value else None
+    except ValueError:
+        return None
+
+
+def _ip_or_none(value: Any) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(value)) if value else None
+    except ValueError:
+        return None
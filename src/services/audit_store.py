@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import bisect
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (timestamp, seq): bir xil timestampli yozuvlar qo'shilish tartibida
+Key = Tuple[str, int]
+
+_MAX_SEQ = float("inf")
+
+
+class _SortedKeys:
+    """
+    Tartiblangan kalitlar ro'yxati: oxiriga qo'shish O(1), eng eskisini olib tashlash
+    amortizatsiyalangan O(1) (``head`` siljiydi, vaqti-vaqti bilan ixchamlanadi).
+    """
+
+    __slots__ = ("keys", "head")
+
+    def __init__(self):
+        self.keys: List[Key] = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.keys) - self.head
+
+    def add(self, key: Key) -> None:
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+        else:
+            # Kechikib kelgan yozuv (masalan user fonda aniqlangan) - o'z joyiga
+            bisect.insort(self.keys, key, lo=self.head)
+
+    def pop_oldest(self) -> Key:
+        key = self.keys[self.head]
+        self.head += 1
+        if self.head > 1024 and self.head * 2 > len(self.keys):
+            del self.keys[:self.head]
+            self.head = 0
+        return key
+
+    def bounds(self, start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self.keys, (start, -1), lo=self.head) if start else self.head
+        hi = bisect.bisect_right(self.keys, (end, _MAX_SEQ), lo=lo) if end else len(self.keys)
+        return lo, hi
+
+
+class AuditStore:
+    """
+    Audit loglarning xotiradagi "issiq dumi": timestamp tartibida, ``user_id`` va ``action``
+    bo'yicha ikkilamchi indekslar bilan.
+
+    - ``maxlen`` dan oshsa eng eski yozuv chiqariladi (deque(maxlen) kabi)
+    - ``query`` oraliq va sahifani binary search bilan topadi: nusxa olish va qayta saralash yo'q
+    - ``len``/``iter``/``append`` - avvalgi ``deque`` bilan mos
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self.maxlen = maxlen
+        self._seq = 0
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._order = _SortedKeys()
+        self._by_user: Dict[Any, _SortedKeys] = {}
+        self._by_action: Dict[Any, _SortedKeys] = {}
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Eng eskisidan yangisiga."""
+        keys = self._order.keys
+        for i in range(self._order.head, len(keys)):
+            yield self._entries[keys[i][1]]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._seq += 1
+        key = (entry.get("timestamp") or "", self._seq)
+        self._entries[self._seq] = entry
+        self._order.add(key)
+        self._index(self._by_user, entry.get("user_id")).add(key)
+        self._index(self._by_action, entry.get("action")).add(key)
+        while len(self._order) > self.maxlen:
+            self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._order = _SortedKeys()
+        self._by_user.clear()
+        self._by_action.clear()
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        action: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """(jami mos yozuvlar, eng yangisidan boshlab ``offset``/``limit`` sahifa)."""
+        candidates: List[_SortedKeys] = []
+        if user_id:
+            candidates.append(self._by_user.get(user_id) or _SortedKeys())
+        if action:
+            candidates.append(self._by_action.get(action) or _SortedKeys())
+        if not candidates:
+            candidates.append(self._order)
+        index = min(candidates, key=len)
+        lo, hi = index.bounds(start, end)
+        keys = index.keys
+        limit = max(0, limit)
+        offset = max(0, offset)
+
+        if len(candidates) == 1:
+            # Bitta indeks: jami = oraliq uzunligi, sahifa to'g'ridan-to'g'ri indeks bo'yicha
+            total = hi - lo
+            first = hi - 1 - offset
+            last = max(lo, first - limit + 1)
+            return total, [self._entries[keys[i][1]] for i in range(first, last - 1, -1)]
+
+        # user_id + action: kichikroq indeksdan yurib, ikkinchi shart tekshiriladi
+        total = 0
+        page: List[Dict[str, Any]] = []
+        for i in range(hi - 1, lo - 1, -1):
+            entry = self._entries[keys[i][1]]
+            if entry.get("user_id") != user_id or entry.get("action") != action:
+                continue
+            if offset <= total < offset + limit:
+                page.append(entry)
+            total += 1
+        return total, page
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self),
+            "maxlen": self.maxlen,
+            "users": len(self._by_user),
+            "actions": len(self._by_action),
+        }
+
+    # ---- internals ----
+    @staticmethod
+    def _index(indexes: Dict[Any, _SortedKeys], value: Any) -> _SortedKeys:
+        idx = indexes.get(value)
+        if idx is None:
+            idx = indexes[value] = _SortedKeys()
+        return idx
+
+    def _evict(self) -> None:
+        key = self._order.pop_oldest()
+        entry = self._entries.pop(key[1])
+        for indexes, value in ((self._by_user, entry.get("user_id")), (self._by_action, entry.get("action"))):
+            idx = indexes[value]
+            # Eng eski yozuv har bir indeksda ham eng eski
+            idx.pop_oldest()
+            if not len(idx):
+                del indexes[value]
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pyrogram.file_id import FileId
+
+from .paths import KnownDirs
+from .single_flight import file_unique_key
+
+logger = logging.getLogger(__name__)
+
+
+def blob_key(file_id: str) -> str:
+    """
+    Blob kaliti: file_unique_id + o'lcham varianti (thumbnail/chat photo small/big).
+    Bir xil rasmning turli o'lchamlari Telegramda bitta file_unique_id ga ega bo'lishi mumkin.
+    """
+    key = file_unique_key(file_id)
+    try:
+        decoded = FileId.decode(file_id)
+    except Exception:
+        return key
+    if decoded.thumbnail_source is not None:
+        key += f":{decoded.thumbnail_source.name}:{decoded.thumbnail_size}"
+    return key
+
+
+class BlobStore:
+    """
+    Foydalanuvchi/akkauntlar o'rtasida umumiy content-addressed media ombori.
+
+    - blob ``{root}/{h[:2]}/{h[2:4]}/{h}`` da saqlanadi, ``h = sha256(blob_key)``
+    - foydalanuvchi yo'llari (media/downloads, avatars, thumbs) blobga hardlink -
+      statik /media o'zgarishsiz ishlaydi, disk joyi bir marta sarflanadi
+    - faqat omborning o'zi ko'rsatadigan blob (``st_nlink == 1``) ``gc`` da o'chiriladi
+    """
+
+    def __init__(self, root: Path, gc_grace_seconds: float = 3600, dirs: Optional[KnownDirs] = None):
+        self.root = Path(root)
+        self.gc_grace_seconds = gc_grace_seconds
+        self.dirs = dirs or KnownDirs()
+        self._gc_task: Optional[asyncio.Task] = None
+        self._gc_now: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.adopted = 0
+        self.copies = 0
+        self.gc_runs = 0
+        self.gc_removed = 0
+        self.gc_bytes = 0
+        self.last_gc: Dict[str, Any] = {}
+
+    def path_for(self, file_id: str) -> Path:
+        h = hashlib.sha256(blob_key(file_id).encode("utf-8")).hexdigest()
+        return self.root / h[:2] / h[2:4] / h
+
+    def link_if_present(self, file_id: str, dest: Path) -> bool:
+        """Blob bo'lsa dest ga reference qilish (Telegramga murojaatsiz)."""
+        blob = self.path_for(file_id)
+        try:
+            self.link(blob, dest)
+        except FileNotFoundError:
+            # Blob yo'q (yoki shu payt GC o'chirdi)
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def link(self, blob: Path, dest: Path) -> None:
+        """dest ni blobga atomik hardlink qilish; boshqa diskda bo'lsa nusxa."""
+        if _same_file(blob, dest):
+            return
+        self.dirs.ensure_parent(dest)
+        tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{time.monotonic_ns()}.link")
+        try:
+            try:
+                os.link(blob, tmp)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(blob, tmp)
+                self.copies += 1
+            tmp.replace(dest)
+        finally:
+            # rename() bir xil inode'lar orasida hech narsa qilmaydi - tmp qolib ketmasin
+            tmp.unlink(missing_ok=True)
+
+    def adopt(self, file_id: str, src: Path) -> Path:
+        """Yuklab bo'lingan faylni blob sifatida ro'yxatga olish (src o'zi reference bo'lib qoladi)."""
+        blob = self.path_for(file_id)
+        if blob.exists():
+            if not _same_file(blob, src):
+                self.link(blob, src)
+            return blob
+        self.dirs.ensure_parent(blob)
+        try:
+            os.link(src, blob)
+        except FileExistsError:
+            self.link(blob, src)
+        except OSError:
+            shutil.copyfile(src, blob)
+            self.copies += 1
+        self.adopted += 1
+        return blob
+
+    def gc(self) -> Dict[str, Any]:
+        """Hech bir foydalanuvchi yo'li ko'rsatmaydigan (nlink == 1) eski bloblarni o'chirish."""
+        now = time.time()
+        removed = 0
+        freed = 0
+        kept = 0
+        kept_bytes = 0
+        if self.root.exists():
+            for blob in self.root.glob("*/*/*"):
+                try:
+                    st = blob.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_nlink <= 1 and now - st.st_mtime >= self.gc_grace_seconds:
+                    blob.unlink(missing_ok=True)
+                    removed += 1
+                    freed += st.st_size
+                else:
+                    kept += 1
+                    kept_bytes += st.st_size
+        self.gc_runs += 1
+        self.gc_removed += removed
+        self.gc_bytes += freed
+        self.last_gc = {"at": now, "removed": removed, "freed_bytes": freed, "blobs": kept, "bytes": kept_bytes}
+        if removed:
+            logger.info(f"Blob GC: {removed} ta blob o'chirildi ({freed} bayt)")
+        return self.last_gc
+
+    def request_gc(self) -> None:
+        """Navbatdan tashqari GC (masalan, media cache eviction'dan keyin) - threadda, bittadan ortiq emas."""
+        if self._gc_now and not self._gc_now.done():
+            return
+        self._gc_now = asyncio.create_task(asyncio.to_thread(self.gc))
+        self._gc_now.add_done_callback(_log_gc_error)
+
+    def start_gc(self, interval: float = 3600) -> None:
+        if self._gc_task and not self._gc_task.done():
+            return
+        self._gc_task = asyncio.create_task(self._gc_forever(interval))
+
+    async def close(self) -> None:
+        if self._gc_task:
+            self._gc_task.cancel()
+            self._gc_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "adopted": self.adopted,
+            "copies": self.copies,
+            "gc_runs": self.gc_runs,
+            "gc_removed": self.gc_removed,
+            "gc_bytes": self.gc_bytes,
+            "last_gc": self.last_gc,
+        }
+
+    async def _gc_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.gc)
+            except Exception as e:
+                logger.error(f"Blob GC xatolik: {e}")
+
+
+def _log_gc_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Blob GC xatolik: {task.exception()}")
+
+
+def _same_file(a: Path, b: Path) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
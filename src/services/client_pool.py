@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, int]
+StartHook = Callable[[Client, str, int], Awaitable[None]]
+StopHook = Callable[[str, int], Awaitable[None]]
+
+
+@dataclass
+class PooledClient:
+    client: Client
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    leases: int = 0
+
+    def touch(self) -> None:
+        self.last_used = time.time()
+
+
+class TelegramClientPool:
+    """
+    Jonli Pyrogram clientlar uchun LRU pool.
+
+    - ``max_clients`` dan ortiq client ochilmaydi: joy kerak bo'lsa eng uzoq
+      ishlatilmagan bo'sh client ``stop()`` qilinadi
+    - ``idle_seconds`` davomida ishlatilmagan clientlar sweeper tomonidan yopiladi
+    - ``lease()`` ichidagi clientlar hech qachon evict qilinmaydi
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, int], Client],
+        max_clients: int = 50,
+        idle_seconds: float = 600,
+    ):
+        self._factory = factory
+        self.max_clients = max(1, max_clients)
+        self.idle_seconds = idle_seconds
+
+        self._entries: "OrderedDict[PoolKey, PooledClient]" = OrderedDict()
+        self._start_locks: Dict[PoolKey, asyncio.Lock] = {}
+        self._starting = 0
+        self._released = asyncio.Condition()
+        self._start_hooks: List[StartHook] = []
+        self._stop_hooks: List[StopHook] = []
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.start_failures = 0
+        self._op_latency: Dict[str, Dict[str, float]] = {}
+
+    # ---- public API ----
+    def add_start_hook(self, hook: StartHook) -> None:
+        """Client start bo'lgandan keyin chaqiriladigan hook (masalan, update handlerlar)."""
+        self._start_hooks.append(hook)
+
+    def add_stop_hook(self, hook: StopHook) -> None:
+        """Client pooldan chiqarilganda chaqiriladigan hook (keshlarni tozalash uchun)."""
+        self._stop_hooks.append(hook)
+
+    def peek(self, user_id: str, account_index: int) -> Optional[Client]:
+        entry = self._entries.get((user_id, account_index))
+        return entry.client if entry else None
+
+    async def get(self, user_id: str, account_index: int) -> Client:
+        """Pooldan clientni olish, kerak bo'lsa ishga tushirish."""
+        return (await self._acquire(user_id, account_index)).client
+
+    @asynccontextmanager
+    async def lease(self, user_id: str, account_index: int):
+        """Client ishlatilayotgan vaqtda evict qilinmasligini kafolatlaydi."""
+        entry = await self._acquire(user_id, account_index)
+        entry.leases += 1
+        try:
+            yield entry.client
+        finally:
+            entry.leases -= 1
+            entry.touch()
+            async with self._released:
+                self._released.notify_all()
+
+    async def discard(self, user_id: str, account_index: int, stop: bool = True) -> bool:
+        """Clientni pooldan olib tashlash (logout va h.k.)."""
+        entry = self._entries.pop((user_id, account_index), None)
+        self._start_locks.pop((user_id, account_index), None)
+        if entry is None:
+            return False
+        await self._retire((user_id, account_index), entry, stop=stop)
+        async with self._released:
+            self._released.notify_all()
+        return True
+
+    async def evict_idle(self) -> int:
+        """``idle_seconds`` dan beri ishlatilmagan clientlarni yopish."""
+        now = time.time()
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry.leases == 0 and now - entry.last_used >= self.idle_seconds
+        ]
+        for key in stale:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                continue
+            self.idle_evictions += 1
+            logger.info(f"Idle client evicted: {key[0]} {key[1]}")
+            await self._retire(key, entry)
+        return len(stale)
+
+    def start_sweeper(self, interval: float = 60) -> None:
+        if self._sweeper and not self._sweeper.done():
+            return
+        self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+
+    async def close(self) -> None:
+        """Sweeperni to'xtatish va barcha clientlarni yopish."""
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        entries = list(self._entries.items())
+        self._entries.clear()
+        self._start_locks.clear()
+        for key, entry in entries:
+            await self._retire(key, entry)
+
+    def record_latency(self, op: str, seconds: float) -> None:
+        """Operatsiya davomiyligini statistikaga qo'shish."""
+        st = self._op_latency.setdefault(op, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+        st["count"] += 1
+        st["total"] += seconds
+        st["max"] = max(st["max"], seconds)
+        st["last"] = seconds
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        now = time.time()
+        return {
+            "size": len(self._entries),
+            "starting": self._starting,
+            "max_clients": self.max_clients,
+            "occupancy": round(len(self._entries) / self.max_clients, 3),
+            "idle_seconds": self.idle_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+            "start_failures": self.start_failures,
+            "clients": [
+                {
+                    "user_id": key[0],
+                    "account_index": key[1],
+                    "leases": entry.leases,
+                    "idle_for": round(now - entry.last_used, 1),
+                    "age": round(now - entry.created_at, 1),
+                }
+                for key, entry in self._entries.items()
+            ],
+            "operations": {
+                op: {
+                    "count": int(st["count"]),
+                    "avg_ms": round(st["total"] / st["count"] * 1000, 1),
+                    "max_ms": round(st["max"] * 1000, 1),
+                    "last_ms": round(st["last"] * 1000, 1),
+                }
+                for op, st in self._op_latency.items()
+            },
+        }
+
+    # ---- internal ----
+    async def _acquire(self, user_id: str, account_index: int) -> PooledClient:
+        key = (user_id, account_index)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry.touch()
+            self._entries.move_to_end(key)
+            return entry
+
+        lock = self._start_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Boshqa so'rov shu orada ishga tushirgan bo'lishi mumkin
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry.touch()
+                self._entries.move_to_end(key)
+                return entry
+
+            self.misses += 1
+            await self._make_room()
+            self._starting += 1
+            try:
+                client = self._factory(user_id, account_index)
+                try:
+                    await client.start()
+                except Exception as e:
+                    self.start_failures += 1
+                    logger.error(f"Failed to start client for {user_id} {account_index}: {e}")
+                    raise
+                for hook in self._start_hooks:
+                    try:
+                        await hook(client, user_id, account_index)
+                    except Exception as e:
+                        logger.warning(f"Client start hook failed for {user_id} {account_index}: {e}")
+                entry = PooledClient(client=client)
+                self._entries[key] = entry
+                return entry
+            finally:
+                self._starting -= 1
+
+    async def _make_room(self) -> None:
+        while len(self._entries) + self._starting >= self.max_clients:
+            victim = next((k for k, e in self._entries.items() if e.leases == 0), None)
+            if victim is not None:
+                entry = self._entries.pop(victim)
+                self.evictions += 1
+                logger.info(f"Client evicted (pool to'lgan): {victim[0]} {victim[1]}")
+                await self._retire(victim, entry)
+                continue
+            # Hamma clientlar band - biror lease bo'shashini kutamiz
+            async with self._released:
+                await self._released.wait()
+
+    async def _retire(self, key: PoolKey, entry: PooledClient, stop: bool = True) -> None:
+        if stop:
+            await self._stop_client(entry.client)
+        for hook in self._stop_hooks:
+            try:
+                await hook(*key)
+            except Exception as e:
+                logger.warning(f"Client stop hook failed for {key[0]} {key[1]}: {e}")
+
+    async def _stop_client(self, client: Client) -> None:
+        try:
+            if client.is_connected:
+                await client.stop()
+        except Exception as e:
+            logger.debug(f"Client stop failed: {e}")
+
+    async def _sweep_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Client pool sweeper xatolik: {e}")
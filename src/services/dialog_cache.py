@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from pyrogram import Client, raw, types, utils
+from pyrogram.errors import PeerIdInvalid
+from pyrogram.handlers import RawUpdateHandler
+
+logger = logging.getLogger(__name__)
+
+AccountKey = Tuple[str, int]
+
+
+def _chat_title(chat) -> Optional[str]:
+    if getattr(chat, "title", None):
+        return chat.title
+    return " ".join(filter(None, [getattr(chat, "first_name", None), getattr(chat, "last_name", None)])) or None
+
+
+class DialogIndex:
+    """
+    Har bir akkaunt uchun chat_id -> dialog metadata (read markerlar, turi, nomi).
+
+    - miss bo'lganda bitta chat uchun ``messages.GetPeerDialogs`` so'rovi yuboriladi
+    - read markerlar Pyrogram raw update handlerlari orqali yangilanib turadi
+    - client pooldan chiqarilganda (update kelmay qoladi) akkaunt indeksi tozalanadi
+    """
+
+    def __init__(self):
+        self._accounts: Dict[AccountKey, Dict[int, Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+
+    # ---- lookup ----
+    def get(self, user_id: str, account_index: int, chat_id: int) -> Optional[Dict[str, Any]]:
+        return self._accounts.get((user_id, account_index), {}).get(chat_id)
+
+    async def lookup(self, client: Client, user_id: str, account_index: int, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Keshdan olish, bo'lmasa bitta chat uchun targeted so'rov."""
+        meta = self.get(user_id, account_index, chat_id)
+        if meta is not None:
+            self.hits += 1
+            return meta
+        self.misses += 1
+        return await self.refresh(client, user_id, account_index, chat_id)
+
+    async def refresh(self, client: Client, user_id: str, account_index: int, chat_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            peer = await client.resolve_peer(chat_id)
+        except (PeerIdInvalid, KeyError, ValueError):
+            # Peer sessiya keshida yo'q - dialoglarni bir marta aylanib chiqib peerlarni saqlaymiz
+            found = False
+            async for d in client.get_dialogs():
+                if d.chat.id == chat_id:
+                    found = True
+                    break
+            if not found:
+                return None
+            peer = await client.resolve_peer(chat_id)
+
+        r = await client.invoke(
+            raw.functions.messages.GetPeerDialogs(peers=[raw.types.InputDialogPeer(peer=peer)])
+        )
+        users = {u.id: u for u in r.users}
+        chats = {c.id: c for c in r.chats}
+        meta = None
+        for d in r.dialogs:
+            if not isinstance(d, raw.types.Dialog):
+                continue
+            chat = types.Chat._parse_dialog(client, d.peer, users, chats)
+            meta = self._store(user_id, account_index, chat.id, {
+                "chat_id": chat.id,
+                "type": chat.type.value if hasattr(chat.type, "value") else str(chat.type),
+                "title": _chat_title(chat),
+                "read_inbox_max_id": d.read_inbox_max_id,
+                "read_outbox_max_id": d.read_outbox_max_id,
+                "unread_count": d.unread_count,
+                "top_message_id": d.top_message,
+            })
+        return meta
+
+    # ---- updates ----
+    def update_read(
+        self,
+        user_id: str,
+        account_index: int,
+        chat_id: int,
+        inbox_max_id: Optional[int] = None,
+        outbox_max_id: Optional[int] = None,
+        unread_count: Optional[int] = None,
+    ) -> None:
+        meta = self.get(user_id, account_index, chat_id)
+        if meta is None:
+            return
+        if inbox_max_id is not None:
+            meta["read_inbox_max_id"] = max(meta["read_inbox_max_id"], inbox_max_id)
+        if outbox_max_id is not None:
+            meta["read_outbox_max_id"] = max(meta["read_outbox_max_id"], outbox_max_id)
+        if unread_count is not None:
+            meta["unread_count"] = unread_count
+        meta["updated_at"] = time.time()
+        self.updates += 1
+
+    async def attach(self, client: Client, user_id: str, account_index: int) -> None:
+        """Client pool start hooki: read update'larni indeksga ulash."""
+
+        async def on_raw_update(_, update, __, ___):
+            if isinstance(update, raw.types.UpdateReadHistoryInbox):
+                self.update_read(user_id, account_index, utils.get_peer_id(update.peer),
+                                 inbox_max_id=update.max_id, unread_count=update.still_unread_count)
+            elif isinstance(update, raw.types.UpdateReadHistoryOutbox):
+                self.update_read(user_id, account_index, utils.get_peer_id(update.peer),
+                                 outbox_max_id=update.max_id)
+            elif isinstance(update, raw.types.UpdateReadChannelInbox):
+                self.update_read(user_id, account_index, utils.get_channel_id(update.channel_id),
+                                 inbox_max_id=update.max_id, unread_count=update.still_unread_count)
+            elif isinstance(update, raw.types.UpdateReadChannelOutbox):
+                self.update_read(user_id, account_index, utils.get_channel_id(update.channel_id),
+                                 outbox_max_id=update.max_id)
+
+        client.add_handler(RawUpdateHandler(on_raw_update), group=-1)
+
+    async def detach(self, user_id: str, account_index: int) -> None:
+        """Client pool stop hooki: update kelmaydigan akkaunt indeksini tashlash."""
+        self._accounts.pop((user_id, account_index), None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "accounts": len(self._accounts),
+            "dialogs": sum(len(d) for d in self._accounts.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "updates": self.updates,
+        }
+
+    def _store(self, user_id: str, account_index: int, chat_id: int, meta: Dict[str, Any]) -> Dict[str, Any]:
+        meta["updated_at"] = time.time()
+        self._accounts.setdefault((user_id, account_index), {})[chat_id] = meta
+        return meta
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AccountKey = Tuple[str, int]
+
+# Yozilayotgan vaqtinchalik fayllar indeksga kirmaydi
+_TEMP_SUFFIXES = (".part", ".link", ".tmp")
+
+
+class DownloadsIndex:
+    """
+    ``media/downloads/{user_id}/{account_index}/`` dagi fayllar indeksi: file_id -> fayl nomi.
+
+    - akkaunt uchun birinchi so'rovda papka bir marta skanerlanadi
+    - yuklash tugaganda ``note_path``, kesh eviction'da ``note_removed`` bilan yangilanadi
+    - "yuklab olinganmi?" tekshiruvi dict lookup bo'ladi (os.listdir o'rniga)
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._accounts: Dict[AccountKey, Dict[str, str]] = {}
+        self.scans = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, user_id: str, account_index: int, file_id: str) -> Optional[str]:
+        name = self._account(user_id, account_index).get(file_id)
+        if name is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return name
+
+    def add(self, user_id: str, account_index: int, filename: str) -> None:
+        if filename.endswith(_TEMP_SUFFIXES):
+            return
+        self._account(user_id, account_index)[_file_id(filename)] = filename
+
+    def discard(self, user_id: str, account_index: int, filename: str) -> None:
+        files = self._accounts.get((user_id, account_index))
+        if files is not None and files.get(_file_id(filename)) == filename:
+            files.pop(_file_id(filename), None)
+
+    def forget(self, user_id: str, account_index: Optional[int] = None) -> None:
+        """Akkaunt (yoki foydalanuvchining barcha akkauntlari) indeksini tashlash."""
+        for key in [k for k in self._accounts if k[0] == user_id and (account_index is None or k[1] == account_index)]:
+            self._accounts.pop(key, None)
+
+    def note_path(self, path: Path) -> None:
+        key = self._key_for(path)
+        if key is not None:
+            self.add(key[0], key[1], path.name)
+
+    def note_removed(self, path: Path) -> None:
+        key = self._key_for(path)
+        if key is not None:
+            self.discard(key[0], key[1], path.name)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "accounts": len(self._accounts),
+            "files": sum(len(f) for f in self._accounts.values()),
+            "scans": self.scans,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _account(self, user_id: str, account_index: int) -> Dict[str, str]:
+        key = (user_id, account_index)
+        files = self._accounts.get(key)
+        if files is None:
+            files = self._scan(user_id, account_index)
+            self._accounts[key] = files
+        return files
+
+    def _scan(self, user_id: str, account_index: int) -> Dict[str, str]:
+        self.scans += 1
+        files: Dict[str, str] = {}
+        d = self.root / user_id / str(account_index)
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(_TEMP_SUFFIXES):
+                        files[_file_id(entry.name)] = entry.name
+        except FileNotFoundError:
+            pass
+        return files
+
+    def _key_for(self, path: Path) -> Optional[AccountKey]:
+        try:
+            rel = Path(path).relative_to(self.root)
+        except ValueError:
+            return None
+        if len(rel.parts) != 3:
+            return None
+        user_id, account_index, _ = rel.parts
+        try:
+            return user_id, int(account_index)
+        except ValueError:
+            return None
+
+
+def _file_id(filename: str) -> str:
+    # Fayl nomi: {file_id}.{ext} (file_id base64url - nuqta bo'lmaydi)
+    return filename.split(".", 1)[0]
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .paths import KnownDirs
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+@dataclass
+class ExportJob:
+    job_id: str
+    user_id: str
+    account_index: int
+    chat_id: int
+    format: str
+    filename: str
+    status: str = "queued"
+    processed: int = 0
+    # Checkpoint: shu xabargacha (processed/bytes_written holatida) fayl diskda to'liq
+    last_message_id: Optional[int] = None
+    checkpoint_processed: int = 0
+    bytes_written: int = 0
+    file_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    updated_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    resumed: int = 0
+    # Joriy ishga tushishdagi boshlang'ich holat (throughput uchun, saqlanmaydi)
+    _run_started: Optional[float] = field(default=None, repr=False, compare=False)
+    _run_processed: int = field(default=0, repr=False, compare=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {k: v for k, v in asdict(self).items() if not k.startswith("_")}
+        rate = 0.0
+        if self.status == "running" and self._run_started:
+            elapsed = time.time() - self._run_started
+            if elapsed > 0:
+                rate = (self.processed - self._run_processed) / elapsed
+        elif self.finished_at and self.started_at and self.finished_at > self.started_at:
+            rate = self.processed / (self.finished_at - self.started_at)
+        data["messages_per_second"] = round(rate, 1)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExportJob":
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__ and not k.startswith("_")}
+        return cls(**known)
+
+
+Worker = Callable[[ExportJob, Callable[[], Awaitable[None]]], Awaitable[None]]
+
+
+class ExportJobRunner:
+    """
+    Chat eksportlari uchun jarayon ichidagi fon job runner.
+
+    - har bir (user_id, account_index) uchun bir vaqtda ko'pi bilan ``per_account`` ta eksport
+    - job holati ``{root}/{user_id}/{account_index}/jobs/{job_id}.json`` da saqlanadi
+    - worker ``save()`` orqali checkpoint qiladi (last_message_id); restartdan keyin
+      ``resume_pending`` tugallanmagan joblarni checkpointdan davom ettiradi
+    - ``cancel`` jobni to'xtatadi; ``close`` (shutdown) esa holatni o'zgartirmaydi
+    """
+
+    def __init__(self, root: Path, worker: Worker, per_account: int = 1, dirs: Optional[KnownDirs] = None):
+        self.root = Path(root)
+        self.dirs = dirs or KnownDirs()
+        self._worker = worker
+        self.per_account = max(1, per_account)
+        self._jobs: Dict[str, ExportJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphores: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.resumed = 0
+
+    # ---- public API ----
+    def submit(self, user_id: str, account_index: int, chat_id: int, fmt: str = "json") -> ExportJob:
+        """Yangi eksport jobi. Shu chat uchun faol job bo'lsa o'sha qaytariladi."""
+        for job in self._jobs.values():
+            if (job.user_id, job.account_index, job.chat_id, job.format) == (user_id, account_index, chat_id, fmt) \
+                    and job.status in ACTIVE_STATUSES:
+                return job
+
+        job = ExportJob(
+            job_id=uuid.uuid4().hex,
+            user_id=user_id,
+            account_index=account_index,
+            chat_id=chat_id,
+            format=fmt,
+            filename=f"chat_{chat_id}_{int(time.time())}.{fmt}",
+        )
+        self._jobs[job.job_id] = job
+        self._save(job)
+        self._spawn(job)
+        return job
+
+    def get(self, user_id: str, job_id: str) -> Optional[ExportJob]:
+        if not job_id.isalnum():
+            return None
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load_user_job(user_id, job_id)
+            if job is not None:
+                self._jobs[job_id] = job
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def list_jobs(self, user_id: str) -> List[ExportJob]:
+        return sorted((j for j in self._jobs.values() if j.user_id == user_id), key=lambda j: j.created_at, reverse=True)
+
+    async def cancel(self, user_id: str, job_id: str) -> Optional[ExportJob]:
+        job = self.get(user_id, job_id)
+        if job is None:
+            return None
+        if job.status not in ACTIVE_STATUSES:
+            return job
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        self._save(job)
+        self.cancelled += 1
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        return job
+
+    def resume_pending(self) -> int:
+        """Startupda: diskdagi tugallanmagan joblarni checkpointdan davom ettirish."""
+        count = 0
+        for path in self.root.glob("*/*/jobs/*.json"):
+            try:
+                job = ExportJob.from_dict(json.loads(path.read_text(encoding="utf-8")))
+            except Exception as e:
+                logger.warning(f"Export job faylini o'qib bo'lmadi {path}: {e}")
+                continue
+            if job.status not in ACTIVE_STATUSES or job.job_id in self._tasks:
+                continue
+            job.status = "queued"
+            job.resumed += 1
+            self._jobs[job.job_id] = job
+            self._save(job)
+            self._spawn(job)
+            count += 1
+        self.resumed += count
+        if count:
+            logger.info(f"{count} ta export job davom ettirildi")
+        return count
+
+    async def close(self) -> None:
+        """Shutdown: tasklarni to'xtatish, holat diskda qoladi (keyingi startda davom etadi)."""
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "per_account": self.per_account,
+            "jobs": statuses,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "resumed": self.resumed,
+        }
+
+    # ---- internals ----
+    def job_dir(self, user_id: str, account_index: int) -> Path:
+        return self.root / user_id / str(account_index) / "jobs"
+
+    def _spawn(self, job: ExportJob) -> None:
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _t, job_id=job.job_id: self._tasks.pop(job_id, None))
+
+    async def _run(self, job: ExportJob) -> None:
+        semaphore = self._semaphores.setdefault((job.user_id, job.account_index), asyncio.Semaphore(self.per_account))
+        async with semaphore:
+            if job.status != "queued":
+                return
+            job.status = "running"
+            job.started_at = job.started_at or time.time()
+            job._run_started = time.time()
+            job._run_processed = job.processed
+            self._save(job)
+
+            async def save() -> None:
+                self._save(job)
+
+            try:
+                await self._worker(job, save)
+                job.status = "completed"
+                job.finished_at = time.time()
+                self.completed += 1
+            except asyncio.CancelledError:
+                # cancel() holatni "cancelled" qiladi; shutdownda "running" qoladi va keyin davom etadi
+                self._save(job)
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = time.time()
+                self.failed += 1
+                logger.error(f"Export job {job.job_id} failed: {e}")
+            self._save(job)
+
+    def _save(self, job: ExportJob) -> None:
+        job.updated_at = time.time()
+        d = self.dirs.ensure(self.job_dir(job.user_id, job.account_index))
+        path = d / f"{job.job_id}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(job.to_dict(), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    def _load_user_job(self, user_id: str, job_id: str) -> Optional[ExportJob]:
+        for path in (self.root / user_id).glob(f"*/jobs/{job_id}.json"):
+            try:
+                return ExportJob.from_dict(json.loads(path.read_text(encoding="utf-8")))
+            except Exception:
+                return None
+        return None
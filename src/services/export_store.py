@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .paths import KnownDirs
+
+logger = logging.getLogger(__name__)
+
+ChatKey = Tuple[str, int, int]
+
+
+class IncrementalExportStore:
+    """
+    Chat eksportlari uchun segmentli ombor.
+
+    ``{root}/{user_id}/{account_index}/incremental/{chat_id}/`` ichida:
+    - ``manifest.json`` - high_water (eksport qilingan eng katta message id) va segmentlar ro'yxati
+    - ``seg_{max_id}.ndjson`` - har bir inkremental eksportda kelgan yangi xabarlar (yangisi birinchi)
+    - ``merged.{json,ndjson}`` - so'rov bo'yicha yig'iladigan to'liq ko'rinish
+
+    Segmentlar faqat qo'shiladi; tahrirlangan/o'chirilgan eski xabarlar qayta yozilmaydi.
+    """
+
+    def __init__(self, root: Path, dirs: Optional[KnownDirs] = None):
+        self.root = Path(root)
+        self.dirs = dirs or KnownDirs()
+        self._locks: Dict[ChatKey, asyncio.Lock] = {}
+
+    def chat_dir(self, user_id: str, account_index: int, chat_id: int) -> Path:
+        return self.root / user_id / str(account_index) / "incremental" / str(chat_id)
+
+    def url_for(self, path: Path, media_root: Path) -> str:
+        return f"/media/{path.relative_to(media_root).as_posix()}"
+
+    def lock(self, user_id: str, account_index: int, chat_id: int) -> asyncio.Lock:
+        """Bitta chat uchun bir vaqtda faqat bitta inkremental eksport."""
+        return self._locks.setdefault((user_id, account_index, chat_id), asyncio.Lock())
+
+    # ---- manifest ----
+    def manifest(self, user_id: str, account_index: int, chat_id: int) -> Dict[str, Any]:
+        path = self.chat_dir(user_id, account_index, chat_id) / "manifest.json"
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        return {"chat_id": chat_id, "high_water": 0, "total_messages": 0, "segments": [], "merged": {}}
+
+    def _save_manifest(self, user_id: str, account_index: int, chat_id: int, manifest: Dict[str, Any]) -> None:
+        d = self.dirs.ensure(self.chat_dir(user_id, account_index, chat_id))
+        tmp = d / "manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(d / "manifest.json")
+
+    # ---- segments ----
+    def segment_part(self, user_id: str, account_index: int, chat_id: int) -> Path:
+        d = self.dirs.ensure(self.chat_dir(user_id, account_index, chat_id))
+        return d / "segment.ndjson.part"
+
+    def commit_segment(
+        self,
+        user_id: str,
+        account_index: int,
+        chat_id: int,
+        part: Path,
+        count: int,
+        min_id: Optional[int],
+        max_id: Optional[int],
+    ) -> Dict[str, Any]:
+        """Yozib bo'lingan .part segmentni manifestga qo'shish. Yangi xabar bo'lmasa segment yaratilmaydi."""
+        manifest = self.manifest(user_id, account_index, chat_id)
+        if count == 0 or max_id is None:
+            part.unlink(missing_ok=True)
+            return manifest
+        name = f"seg_{max_id}.ndjson"
+        part.replace(part.with_name(name))
+        manifest["segments"].append({
+            "file": name,
+            "min_id": min_id,
+            "max_id": max_id,
+            "count": count,
+            "created_at": time.time(),
+        })
+        manifest["high_water"] = max(manifest["high_water"], max_id)
+        manifest["total_messages"] += count
+        self._save_manifest(user_id, account_index, chat_id, manifest)
+        return manifest
+
+    # ---- merged view ----
+    def iter_merged_lines(self, user_id: str, account_index: int, chat_id: int) -> Iterator[str]:
+        """Barcha segmentlardagi NDJSON qatorlar, eng yangi xabar birinchi."""
+        d = self.chat_dir(user_id, account_index, chat_id)
+        manifest = self.manifest(user_id, account_index, chat_id)
+        for seg in sorted(manifest["segments"], key=lambda s: s["max_id"], reverse=True):
+            with open(d / seg["file"], "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield line.rstrip("\n")
+
+    def build_merged(self, user_id: str, account_index: int, chat_id: int, fmt: str = "json") -> Tuple[Path, Dict[str, Any]]:
+        """
+        Segmentlarni bitta faylga yig'ish. Oxirgi yig'ishdan beri yangi segment bo'lmasa
+        mavjud fayl qaytariladi.
+        """
+        d = self.dirs.ensure(self.chat_dir(user_id, account_index, chat_id))
+        manifest = self.manifest(user_id, account_index, chat_id)
+        path = d / f"merged.{fmt}"
+        if path.exists() and manifest.get("merged", {}).get(fmt) == manifest["high_water"]:
+            return path, manifest
+
+        tmp = path.with_name(path.name + ".part")
+        count = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            if fmt == "json":
+                f.write("[")
+            for line in self.iter_merged_lines(user_id, account_index, chat_id):
+                if fmt == "json":
+                    f.write(("\n  " if count == 0 else ",\n  ") + line)
+                else:
+                    f.write(line + "\n")
+                count += 1
+            if fmt == "json":
+                f.write("\n]\n" if count else "]\n")
+        tmp.replace(path)
+
+        manifest.setdefault("merged", {})[fmt] = manifest["high_water"]
+        self._save_manifest(user_id, account_index, chat_id, manifest)
+        return path, manifest
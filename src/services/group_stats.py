@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pyrogram import Client, raw
+from pyrogram.enums import UserStatus
+from pyrogram.errors import RPCError
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# GetOnlines ishlamasa a'zolarni ko'rib chiqish chegarasi (eski usul)
+FALLBACK_MEMBER_SCAN = 50
+
+
+class GroupStatsCache:
+    """
+    Guruhlar uchun a'zolar va online a'zolar soni.
+
+    - online soni ``messages.GetOnlines`` bilan bitta so'rovda olinadi
+    - natija (user_id, account_index, chat_id) bo'yicha TTL bilan keshlanadi; xatolik natijasi
+      (0/0) faqat qisqa ``failure_ttl`` ga - butun TTL davomida 0 a'zo ko'rinmasligi uchun
+    - ``get_many`` sahifadagi guruhlarni semafor ostida parallel hisoblaydi
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: int = 10000, concurrency: int = 10, failure_ttl: float = 5):
+        self.concurrency = max(1, concurrency)
+        self.failure_ttl = min(failure_ttl, ttl)
+        self._cache: TTLCache[Dict[str, int]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.fallbacks = 0
+        self.failures = 0
+
+    async def get(self, client: Client, user_id: str, account_index: int, chat) -> Dict[str, int]:
+        key = (user_id, account_index, chat.id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self._compute(client, chat)
+        if result is None:
+            self.failures += 1
+            result = {"member_count": 0, "online_count": 0}
+            self._cache.set(key, result, ttl=self.failure_ttl)
+            return result
+        self._cache.set(key, result)
+        return result
+
+    async def get_many(self, client: Client, user_id: str, account_index: int, chats: Iterable[Any]) -> Dict[int, Dict[str, int]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(chat) -> Tuple[int, Dict[str, int]]:
+            async with semaphore:
+                return chat.id, await self.get(client, user_id, account_index, chat)
+
+        return dict(await asyncio.gather(*(one(chat) for chat in chats)))
+
+    def invalidate(self, user_id: str, account_index: int, chat_id: int) -> None:
+        self._cache.pop((user_id, account_index, chat_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._cache.stats(),
+            "concurrency": self.concurrency,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "failure_ttl": self.failure_ttl,
+        }
+
+    async def _compute(self, client: Client, chat) -> Optional[Dict[str, int]]:
+        try:
+            # Dialogdagi basic group obyektida a'zolar soni bor, supergrouplar uchun alohida so'rov
+            member_count = getattr(chat, "members_count", None) or await client.get_chat_members_count(chat.id)
+            online_count = await self._online_count(client, chat.id)
+        except Exception as e:
+            logger.debug(f"Group stats failed for {chat.id}: {e}")
+            return None
+        return {"member_count": member_count, "online_count": online_count}
+
+    async def _online_count(self, client: Client, chat_id: int) -> int:
+        try:
+            r = await client.invoke(raw.functions.messages.GetOnlines(peer=await client.resolve_peer(chat_id)))
+            return r.onlines
+        except RPCError as e:
+            logger.debug(f"GetOnlines failed for {chat_id}, scanning members: {e}")
+        self.fallbacks += 1
+        online_count = 0
+        count = 0
+        async for member in client.get_chat_members(chat_id):
+            if member.user and member.user.status == UserStatus.ONLINE:
+                online_count += 1
+            count += 1
+            if count >= FALLBACK_MEMBER_SCAN:
+                break
+        return online_count
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+# Kesh boshqaradigan papkalar (media/<category>/...)
+CATEGORIES = ("downloads", "thumbs", "avatars", "exports", "messages")
+
+# Hech qachon o'chirilmaydigan fayllar: yozilayotganlar, eksport job holati va inkremental segmentlar
+_PROTECTED_SUFFIXES = (".part", ".link", ".tmp")
+_PROTECTED_DIRS = ("jobs", "incremental")
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """'512MB', '2G', '1048576' -> bayt."""
+    m = _SIZE_RE.match(str(value))
+    if not m:
+        raise ValueError(f"Noto'g'ri hajm: {value}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def parse_quotas(value: str) -> Dict[str, int]:
+    """'downloads=2GB,thumbs=512MB' -> {"downloads": ..., "thumbs": ...}."""
+    quotas: Dict[str, int] = {}
+    for part in filter(None, (p.strip() for p in (value or "").split(","))):
+        name, _, size = part.partition("=")
+        name = name.strip()
+        if name not in CATEGORIES:
+            raise ValueError(f"Noma'lum media kategoriya: {name}")
+        quotas[name] = parse_size(size)
+    return quotas
+
+
+class MediaCacheManager:
+    """
+    MEDIA_ROOT uchun disk byudjeti va LRU eviction.
+
+    - umumiy ``max_bytes`` va kategoriya bo'yicha ``quotas`` (downloads, thumbs, avatars, exports)
+    - hajm inode bo'yicha hisoblanadi: blobga hardlink qilingan bir xil media bir marta sanaladi,
+      hech bir yo'l ko'rsatmaydigan bloblar (``blobs`` papkasi, GC kutayotganlar) umumiy hajmga qo'shiladi
+    - oxirgi murojaat vaqti ``touch`` orqali xotirada kuzatiladi (volume'larda atime ishonchsiz),
+      kuzatilmagan fayl uchun max(atime, mtime)
+    - fon sweep limitdan oshsa eng uzoq ishlatilmagan media (inode'ning barcha yo'llari) ni
+      ``low_watermark`` gacha o'chiradi; callbacklar event loopda chaqiriladi
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 0,
+        quotas: Optional[Dict[str, int]] = None,
+        low_watermark: float = 0.9,
+        protected: Tuple[str, ...] = (),
+        on_evicted: Optional[Callable[[], Any]] = None,
+        on_removed: Optional[Callable[[Path], Any]] = None,
+        blobs_dir: Optional[str] = "blobs",
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.quotas = dict(quotas or {})
+        self.low_watermark = low_watermark
+        self.protected = set(protected)
+        self.blobs_dir = blobs_dir
+        self._on_evicted = on_evicted
+        self._on_removed = on_removed
+        self._access: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.usage: Dict[str, Dict[str, int]] = {}
+        self.total_bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.evictions_by_category: Dict[str, int] = {}
+        self.last_sweep: Dict[str, Any] = {}
+
+    # ---- access tracking ----
+    def touch(self, rel_path: str) -> None:
+        self._access[rel_path.lstrip("/")] = time.time()
+
+    def touch_path(self, path: Path) -> None:
+        try:
+            self.touch(path.relative_to(self.root).as_posix())
+        except ValueError:
+            pass
+
+    # ---- sweep ----
+    def sweep(
+        self,
+        access: Optional[Dict[str, float]] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Dict[str, Any]:
+        """
+        Diskni skanerlash, foydalanishni hisoblash va limitdan oshganini LRU bo'yicha o'chirish.
+        ``loop`` berilsa (sweep threadda ishlaganda) callbacklar shu loopga qaytariladi.
+        """
+        started = time.time()
+        access = dict(self._access) if access is None else access
+        # (st_dev, st_ino) -> {"size", "links": [(last, path, rel, category)]}
+        inodes: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for category in CATEGORIES:
+            base = self.root / category
+            if not base.exists():
+                continue
+            for dirpath, dirnames, filenames in os.walk(base):
+                dirnames[:] = [d for d in dirnames if d not in _PROTECTED_DIRS]
+                for name in filenames:
+                    if name.endswith(_PROTECTED_SUFFIXES):
+                        continue
+                    path = Path(dirpath) / name
+                    rel = path.relative_to(self.root).as_posix()
+                    if rel in self.protected:
+                        continue
+                    try:
+                        st = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    last = access.get(rel) or max(st.st_atime, st.st_mtime)
+                    node = inodes.setdefault((st.st_dev, st.st_ino), {"size": st.st_size, "links": []})
+                    node["links"].append((last, path, rel, category))
+
+        usage = {c: {"bytes": 0, "files": 0} for c in CATEGORIES}
+        members: Dict[str, set] = {c: set() for c in CATEGORIES}
+        for key, node in inodes.items():
+            for category in {link[3] for link in node["links"]}:
+                members[category].add(key)
+                usage[category]["bytes"] += node["size"]
+                usage[category]["files"] += 1
+        usage["blobs"] = self._orphan_blobs(inodes)
+        total = sum(n["size"] for n in inodes.values()) + usage["blobs"]["bytes"]
+        evicted: List[Tuple[str, int]] = []
+        removed: List[Path] = []
+
+        def evict(key, categories) -> bool:
+            """Inode'ning shu kategoriyalardagi barcha yo'llarini o'chirish."""
+            nonlocal total
+            node = inodes[key]
+            links = [l for l in node["links"] if l[3] in categories]
+            gone = [l for l in links if self._remove(l[1])]
+            if not gone:
+                return False
+            removed.extend(l[1] for l in gone)
+            node["links"] = [l for l in node["links"] if l not in gone]
+            for category in {l[3] for l in gone} - {l[3] for l in node["links"]}:
+                members[category].discard(key)
+                usage[category]["bytes"] -= node["size"]
+                usage[category]["files"] -= 1
+                evicted.append((category, node["size"]))
+            if not node["links"]:
+                # Oxirgi yo'l ketdi - blob GC joyni bo'shatadi
+                total -= node["size"]
+            return True
+
+        # 1) kategoriya kvotalari
+        for category, quota in self.quotas.items():
+            if quota and usage[category]["bytes"] > quota:
+                target = int(quota * self.low_watermark)
+                ordered = sorted(
+                    members[category],
+                    key=lambda k: max(l[0] for l in inodes[k]["links"] if l[3] == category),
+                )
+                for key in ordered:
+                    if usage[category]["bytes"] <= target:
+                        break
+                    evict(key, (category,))
+
+        # 2) umumiy byudjet: barcha kategoriyalardan eng eskisi birinchi
+        if self.max_bytes and total > self.max_bytes:
+            target = int(self.max_bytes * self.low_watermark)
+            live = [k for k, n in inodes.items() if n["links"]]
+            for key in sorted(live, key=lambda k: max(l[0] for l in inodes[k]["links"])):
+                if total <= target:
+                    break
+                evict(key, CATEGORIES)
+
+        # Diskda yo'q fayllarning access yozuvlarini tashlash
+        seen = {l[2] for n in inodes.values() for l in n["links"]}
+        for rel in list(self._access):
+            if rel not in seen:
+                self._access.pop(rel, None)
+
+        for category, size in evicted:
+            self.evictions += 1
+            self.evicted_bytes += size
+            self.evictions_by_category[category] = self.evictions_by_category.get(category, 0) + 1
+
+        self.usage = usage
+        self.total_bytes = total
+        self.last_sweep = {
+            "at": started,
+            "duration_ms": round((time.time() - started) * 1000, 1),
+            "evicted": len(evicted),
+            "evicted_bytes": sum(size for _, size in evicted),
+        }
+        if self._on_removed:
+            for path in removed:
+                self._notify(loop, self._on_removed, path)
+        if evicted:
+            logger.info(f"Media cache: {len(evicted)} ta fayl o'chirildi ({self.last_sweep['evicted_bytes']} bayt)")
+            if self._on_evicted:
+                self._notify(loop, self._on_evicted)
+        return self.last_sweep
+
+    async def run_sweep(self) -> Dict[str, Any]:
+        """Sweepni threadda bajarish; callbacklar (indeks, blob GC) shu loopda chaqiriladi."""
+        return await asyncio.to_thread(self.sweep, dict(self._access), asyncio.get_running_loop())
+
+    def start(self, interval: float = 300) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._sweep_forever(interval))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": self.max_bytes,
+            "quotas": self.quotas,
+            "total_bytes": self.total_bytes,
+            "usage": self.usage,
+            "tracked_files": len(self._access),
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "evictions_by_category": self.evictions_by_category,
+            "last_sweep": self.last_sweep,
+        }
+
+    # ---- internals ----
+    def _orphan_blobs(self, inodes: Dict[Tuple[int, int], Dict[str, Any]]) -> Dict[str, int]:
+        """Kategoriya yo'llari ko'rsatmaydigan bloblar (GC kutayotganlar) hajmi."""
+        usage = {"bytes": 0, "files": 0}
+        if not self.blobs_dir:
+            return usage
+        base = self.root / self.blobs_dir
+        if not base.exists():
+            return usage
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue
+                if (st.st_dev, st.st_ino) not in inodes:
+                    usage["bytes"] += st.st_size
+                    usage["files"] += 1
+        return usage
+
+    def _notify(self, loop: Optional[asyncio.AbstractEventLoop], fn: Callable[..., Any], *args) -> None:
+        if loop is None:
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
+
+    def _remove(self, path: Path) -> bool:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning(f"Media cache: {path} o'chirilmadi: {e}")
+            return False
+        self._access.pop(path.relative_to(self.root).as_posix(), None)
+        return True
+
+    async def _sweep_forever(self, interval: float) -> None:
+        while True:
+            try:
+                await self.run_sweep()
+            except Exception as e:
+                logger.error(f"Media cache sweep xatolik: {e}")
+            await asyncio.sleep(interval)
+
+
+class TrackedStaticFiles(StaticFiles):
+    """/media statik fayllari: har bir muvaffaqiyatli so'rovda kesh menejeriga murojaat vaqtini yozadi."""
+
+    def __init__(self, *args, cache: MediaCacheManager, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            self.cache.touch(path.replace(os.sep, "/"))
+        return response
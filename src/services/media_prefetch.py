@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class MediaPrefetcher:
+    """
+    Avatar, emoji va thumbnaillarni fonda yuklab oluvchi navbat.
+
+    - bir vaqtda ko'pi bilan ``concurrency`` ta yuklash ishlaydi
+    - bir xil ``key`` (odatda dest fayl yo'li) uchun faqat bitta job navbatga tushadi
+    - navbat to'lsa yangi joblar tashlab yuboriladi (``dropped``) - lazy endpoint keyin yuklaydi
+    - ``fetch_now`` navbatdagi/ishlayotgan jobni kutadi yoki ro'yxatdan o'tgan jobni darhol bajaradi;
+      ro'yxatda yo'q key uchun hech narsa yuklanmaydi (lazy endpoint faqat listing bergan URLlarni xizmat qiladi)
+    """
+
+    def __init__(self, concurrency: int = 4, max_queue: int = 1000, job_ttl: float = 3600):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._jobs: TTLCache[Job] = TTLCache(maxsize=max(max_queue * 10, 1000), ttl=job_ttl)
+        self._workers: List[asyncio.Task] = []
+
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.on_demand = 0
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+        self._queue = None
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending
+
+    def enqueue(self, key: str, job: Job) -> bool:
+        """Jobni ro'yxatga olish va fon navbatiga qo'yish. Allaqachon navbatda bo'lsa False."""
+        if key in self._pending:
+            return False
+        self._jobs.set(key, job)
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((key, job, fut))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending[key] = fut
+        self.enqueued += 1
+        return True
+
+    async def fetch_now(self, key: str) -> Any:
+        """Lazy so'rov: navbatdagi jobni kutish yoki ro'yxatdagi jobni darhol bajarish."""
+        fut = self._pending.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        job = self._jobs.get(key, count=False)
+        if job is None:
+            return None
+        self.on_demand += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[key] = fut
+        await self._run(key, job, fut)
+        return fut.result() if fut.done() and not fut.cancelled() else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending": len(self._pending),
+            "registered": len(self._jobs),
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "on_demand": self.on_demand,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            key, job, fut = await self._queue.get()
+            try:
+                await self._run(key, job, fut)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, key: str, job: Job, fut: asyncio.Future) -> None:
+        try:
+            result = await job()
+            self.completed += 1
+            if result is not None:
+                self._jobs.pop(key)
+            if not fut.done():
+                fut.set_result(result)
+        except asyncio.CancelledError:
+            if not fut.done():
+                fut.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Media prefetch failed for {key}: {e}")
+            if not fut.done():
+                fut.set_result(None)
+        finally:
+            self._pending.pop(key, None)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+# Pyrogram stream_media chunk hajmi (1 MiB)
+TG_CHUNK_SIZE = 1024 * 1024
+# Diskdan o'qish bloki
+FILE_READ_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: Optional[int]) -> Optional[Tuple[int, int]]:
+    """
+    ``Range: bytes=start-end`` ni (start, end) ga aylantirish (end inklyuziv).
+
+    Hajm noma'lum bo'lsa yoki header yaroqsiz/ko'p oraliqli bo'lsa None - javob 200 bilan
+    to'liq beriladi (RFC 7233 Range ni e'tiborsiz qoldirishga ruxsat beradi).
+    Oraliq fayldan tashqarida bo'lsa ValueError (416).
+    """
+    if not header or size is None:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # bytes=-N: oxirgi N bayt
+        length = int(last)
+        if length == 0:
+            raise ValueError("Range not satisfiable")
+        start = max(0, size - length)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Diskdagi faylning [start, end] qismini bloklab o'qish (StreamingResponse threadda aylantiradi)."""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            block = f.read(min(FILE_READ_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+async def iter_telegram_range(client, file_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    ``stream_media`` dan faqat [start, end] baytlarini berish: kerakli 1 MiB chunklardan
+    boshlab o'qiladi, chekkalari qirqiladi.
+    """
+    first_chunk = start // TG_CHUNK_SIZE
+    skip = start - first_chunk * TG_CHUNK_SIZE
+    limit = 0
+    if end is not None:
+        limit = end // TG_CHUNK_SIZE - first_chunk + 1
+    remaining = None if end is None else end - start + 1
+
+    async for chunk in client.stream_media(file_id, limit=limit, offset=first_chunk):
+        if skip:
+            chunk = chunk[skip:]
+            skip = 0
+        if remaining is not None:
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+        if chunk:
+            yield chunk
+        if remaining is not None and remaining <= 0:
+            break
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Set
+
+
+class KnownDirs:
+    """
+    Mavjudligi ma'lum papkalar to'plami.
+
+    Yo'l helperlari (``_avatar_file``, ``user_dir`` ...) faqat yo'lni hisoblaydi; papka
+    fayl yozilishidan oldin ``ensure`` / ``ensure_parent`` bilan bir marta yaratiladi,
+    keyingi yozishlar mkdir syscall qilmaydi. Papka o'chirilsa ``forget`` chaqiriladi.
+    """
+
+    def __init__(self):
+        self._known: Set[Path] = set()
+        self.mkdirs = 0
+        self.hits = 0
+
+    def ensure(self, d: Path) -> Path:
+        if d in self._known:
+            self.hits += 1
+            return d
+        d.mkdir(parents=True, exist_ok=True)
+        self.mkdirs += 1
+        # mkdir(parents=True) ota papkalarni ham yaratdi
+        self._known.add(d)
+        self._known.update(d.parents)
+        return d
+
+    def ensure_parent(self, path: Path) -> Path:
+        self.ensure(path.parent)
+        return path
+
+    def forget(self, d: Path) -> None:
+        """``d`` va uning ichidagi papkalarni unutish (rmtree dan keyin)."""
+        self._known = {p for p in self._known if p != d and d not in p.parents}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"known": len(self._known), "mkdirs": self.mkdirs, "hits": self.hits}
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pyrogram import Client, raw
+from pyrogram.handlers import RawUpdateHandler
+
+from .paths import KnownDirs
+
+logger = logging.getLogger(__name__)
+
+AccountKey = Tuple[str, int]
+ProfileLoader = Callable[[str, int], Awaitable[Dict[str, Any]]]
+
+_SUFFIX = ".profile.json"
+
+
+class ProfileSnapshotStore:
+    """
+    Telegram akkaunt profillari (``get_me`` natijasi) uchun diskdagi snapshotlar.
+
+    - snapshot sessiya fayli yonida: ``{root}/{user_id}/{index}.profile.json``
+    - ro'yxat snapshotdan beriladi: ``snapshot_at`` (unix vaqt) va ``stale`` belgisi bilan;
+      Telegramga faqat snapshoti yo'q akkaunt uchun murojaat qilinadi
+    - eskirgan snapshot fonda yangilanadi (akkaunt uchun bir vaqtda bitta yangilash):
+      davriy sweep, ro'yxatda eskirgani ko'rinishi yoki o'z profilimiz haqidagi update
+    - vaqtinchalik xatoda eski snapshot saqlanadi, yaroqsiz sessiyada o'chiriladi
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        loader: ProfileLoader,
+        max_age: float = 21600,
+        dirs: Optional[KnownDirs] = None,
+    ):
+        self.root = Path(root)
+        self.max_age = max_age
+        self.dirs = dirs or KnownDirs()
+        self._loader = loader
+        # (user_id, index) -> snapshot; None - diskda yo'qligi ma'lum
+        self._snapshots: Dict[AccountKey, Optional[Dict[str, Any]]] = {}
+        # Update orqali eskirgani ma'lum, lekin hali yangilanmagan snapshotlar
+        self._dirty: set = set()
+        self._refreshing: Dict[AccountKey, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.refreshes = 0
+        self.updates = 0
+
+    def path_for(self, user_id: str, account_index: int) -> Path:
+        return self.root / user_id / f"{account_index}{_SUFFIX}"
+
+    # ---- o'qish ----
+    def get(self, user_id: str, account_index: int) -> Optional[Dict[str, Any]]:
+        """Snapshot (``stale`` belgisi bilan) yoki None. Telegramga murojaat qilmaydi."""
+        snapshot = self._snapshot(user_id, account_index)
+        if snapshot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._served(user_id, account_index, snapshot)
+
+    async def profiles(self, user_id: str, indexes: List[int]) -> List[Dict[str, Any]]:
+        """
+        Akkauntlar profillari (indexes tartibida): snapshot bo'lsa darhol, eskirgan bo'lsa
+        fonda yangilash navbatiga qo'yiladi; snapshot yo'qlari parallel yuklanadi.
+        """
+
+        async def one(account_index: int) -> Dict[str, Any]:
+            served = self.get(user_id, account_index)
+            if served is None:
+                return await self.load(user_id, account_index)
+            if served["stale"]:
+                self.stale_served += 1
+                self.refresh(user_id, account_index)
+            return served
+
+        return list(await asyncio.gather(*[one(i) for i in indexes]))
+
+    # ---- yozish ----
+    def put(self, user_id: str, account_index: int, profile: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = {k: v for k, v in profile.items() if k not in ("stale", "snapshot_at")}
+        snapshot["snapshot_at"] = time.time()
+        self._write(user_id, account_index, snapshot)
+        return self._served(user_id, account_index, snapshot)
+
+    def delete(self, user_id: str, account_index: int) -> None:
+        key = (user_id, account_index)
+        self._snapshots[key] = None
+        self._dirty.discard(key)
+        try:
+            self.path_for(user_id, account_index).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Profil snapshot o'chirilmadi {user_id}/{account_index}: {e}")
+
+    async def load(self, user_id: str, account_index: int) -> Dict[str, Any]:
+        """Telegramdan yangi profil: muvaffaqiyatda snapshot yoziladi, yaroqsiz sessiyada o'chiriladi."""
+        self.loads += 1
+        profile = await self._loader(user_id, account_index)
+        if profile.get("telegram_id") is not None:
+            return self.put(user_id, account_index, profile)
+        if profile.get("invalid"):
+            self.delete(user_id, account_index)
+            return profile
+        # Vaqtinchalik xatolik: eski snapshot (bo'lsa) qoladi
+        self.load_failures += 1
+        snapshot = self._snapshot(user_id, account_index)
+        return self._served(user_id, account_index, snapshot) if snapshot else profile
+
+    # ---- fon yangilash ----
+    def refresh(self, user_id: str, account_index: int) -> None:
+        """Fonda qayta yuklash; shu akkaunt uchun yangilash ketayotgan bo'lsa hech narsa qilinmaydi."""
+        key = (user_id, account_index)
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self._refresh(user_id, account_index))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda t: self._refresh_done(key, t))
+
+    async def refresh_stale(self) -> int:
+        """
+        Diskdagi barcha eskirgan snapshotlarni yangilash navbatiga qo'yish.
+        Glob va fayl o'qishlar threadda, holat esa faqat event loopda o'zgaradi.
+        """
+        found = await asyncio.to_thread(self._scan, set(self._snapshots))
+        scheduled = 0
+        for user_id, account_index, orphan, snapshot in found:
+            key = (user_id, account_index)
+            if orphan:
+                # Sessiyasiz qolib ketgan snapshot
+                self.delete(user_id, account_index)
+                continue
+            if key not in self._snapshots:
+                self._snapshots[key] = snapshot
+            snapshot = self._snapshots[key]
+            if snapshot and self._served(user_id, account_index, snapshot)["stale"]:
+                self.refresh(user_id, account_index)
+                scheduled += 1
+        return scheduled
+
+    def start(self, interval: float = 600) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._refresh_forever(interval))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        self._refreshing.clear()
+
+    # ---- update'lar ----
+    async def attach(self, client: Client, user_id: str, account_index: int) -> None:
+        """Client pool start hooki: o'z profilimiz o'zgarsa snapshotni yangilash."""
+
+        async def on_raw_update(_, update, __, ___):
+            if isinstance(update, (raw.types.UpdateUserName, raw.types.UpdateUserPhone, raw.types.UpdateUser)):
+                self.apply_update(user_id, account_index, update)
+
+        client.add_handler(RawUpdateHandler(on_raw_update), group=-1)
+
+    def apply_update(self, user_id: str, account_index: int, update) -> None:
+        """
+        Ism/username/telefon update'i snapshotga to'g'ridan-to'g'ri yoziladi;
+        boshqa o'zgarishlar (masalan, rasm) uchun fonda ``get_me`` qilinadi.
+        """
+        snapshot = self._snapshot(user_id, account_index)
+        if not snapshot or snapshot.get("telegram_id") != update.user_id:
+            return
+        self.updates += 1
+        if isinstance(update, raw.types.UpdateUserName):
+            username = next((u.username for u in update.usernames or [] if u.active), None)
+            snapshot.update({
+                "full_name": " ".join(filter(None, [update.first_name, update.last_name])) or None,
+                "username": username,
+                "profile_url": f"https://t.me/{username}" if username else None,
+            })
+            self.put(user_id, account_index, snapshot)
+        elif isinstance(update, raw.types.UpdateUserPhone):
+            snapshot["phone_number"] = update.phone or None
+            self.put(user_id, account_index, snapshot)
+        else:
+            self._dirty.add((user_id, account_index))
+            self.refresh(user_id, account_index)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "snapshots": sum(1 for s in self._snapshots.values() if s is not None),
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stale_served": self.stale_served,
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "refreshes": self.refreshes,
+            "refreshing": len(self._refreshing),
+            "updates": self.updates,
+        }
+
+    # ---- internals ----
+    def _snapshot(self, user_id: str, account_index: int) -> Optional[Dict[str, Any]]:
+        key = (user_id, account_index)
+        if key not in self._snapshots:
+            self._snapshots[key] = self._read(self.path_for(user_id, account_index))
+        return self._snapshots[key]
+
+    def _scan(self, known: set) -> List[Tuple[str, int, bool, Optional[Dict[str, Any]]]]:
+        """(user_id, index, sessiyasizmi, diskdagi snapshot); xotirada bor snapshotlar qayta o'qilmaydi."""
+        found = []
+        if not self.root.exists():
+            return found
+        for path in self.root.glob(f"*/*{_SUFFIX}"):
+            index = path.name[: -len(_SUFFIX)]
+            if not index.isdigit():
+                continue
+            key = (path.parent.name, int(index))
+            orphan = not (path.parent / f"{index}.session").exists()
+            snapshot = None if orphan or key in known else self._read(path)
+            found.append((*key, orphan, snapshot))
+        return found
+
+    def _served(self, user_id: str, account_index: int, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        stale = (
+            (user_id, account_index) in self._dirty
+            or time.time() - snapshot.get("snapshot_at", 0) >= self.max_age
+        )
+        return {**snapshot, "stale": stale}
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Profil snapshot o'qilmadi {path}: {e}")
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _write(self, user_id: str, account_index: int, snapshot: Dict[str, Any]) -> None:
+        key = (user_id, account_index)
+        path = self.path_for(user_id, account_index)
+        self.dirs.ensure_parent(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(snapshot, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+        self._snapshots[key] = snapshot
+        self._dirty.discard(key)
+
+    async def _refresh(self, user_id: str, account_index: int) -> None:
+        try:
+            await self.load(user_id, account_index)
+            self.refreshes += 1
+        except Exception as e:
+            self.load_failures += 1
+            logger.warning(f"Profil snapshot yangilanmadi {user_id}/{account_index}: {e}")
+
+    def _refresh_done(self, key: AccountKey, task: asyncio.Task) -> None:
+        if self._refreshing.get(key) is task:
+            self._refreshing.pop(key)
+
+    async def _refresh_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                scheduled = await self.refresh_stale()
+                if scheduled:
+                    logger.info(f"Profil snapshotlar: {scheduled} ta akkaunt fonda yangilanmoqda")
+            except Exception as e:
+                logger.error(f"Profil snapshot sweep xatolik: {e}")
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from pyrogram.file_id import FileId, FileUniqueId, FileUniqueType
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def file_unique_key(file_id: str) -> str:
+    """
+    file_id dan barqaror kalit: file_reference har safar o'zgaradi, shuning uchun
+    Telegram file_unique_id (media_id yoki volume_id/local_id) ishlatiladi.
+    """
+    try:
+        decoded = FileId.decode(file_id)
+    except Exception:
+        return file_id
+    if decoded.media_id:
+        return FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=decoded.media_id).encode()
+    if decoded.volume_id is not None and decoded.local_id is not None:
+        return FileUniqueId(
+            file_unique_type=FileUniqueType.PHOTO, volume_id=decoded.volume_id, local_id=decoded.local_id
+        ).encode()
+    return file_id
+
+
+class SingleFlight:
+    """
+    Bir xil kalit bo'yicha parallel chaqiruvlarni bitta bajarishga birlashtirish.
+
+    - birinchi chaqiruvchi ishni bajaradi, qolganlari uning natijasini (yoki xatosini) kutadi
+    - bajaruvchi bekor qilinsa kutayotganlardan biri ishni qaytadan boshlaydi
+    - ish tugagach kalit bo'shatiladi (natija keshlanmaydi)
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+        self.failures = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            self.shared += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    # Bajaruvchi bekor qilindi - ishni o'zimiz boshlaymiz
+                    continue
+                raise
+
+        fut = asyncio.get_running_loop().create_future()
+        # Hech kim kutmasa ham "exception was never retrieved" ogohlantirishi chiqmasin
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = fut
+        self.calls += 1
+        try:
+            result = await fn()
+        except Exception as e:
+            self.failures += 1
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            # CancelledError va boshqa BaseException: kutayotganlar qayta urinadi
+            if not fut.done():
+                fut.cancel()
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "shared": self.shared,
+            "failures": self.failures,
+        }
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from src import config
+from src.services import supabase_service
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseGateway:
+    """
+    Sinxron supabase-py clienti uchun async shlyuz.
+
+    - har bir tarmoq chaqiruvi cheklangan thread poolda bajariladi, event loop bloklanmaydi
+    - ``max_workers`` Supabase'ga bir vaqtdagi so'rovlar sonini cheklaydi, qolganlari navbatda kutadi
+    - clientlar (``config.supabase``, ``config.supabase_service``) chaqiruv paytida olinadi
+    """
+
+    def __init__(self, max_workers: int = 16):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.running = 0
+        self.peak_in_flight = 0
+        self._running_lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="supabase")
+        return self._executor
+
+    async def run(self, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """``fn(*args, **kwargs)`` ni thread poolda bajarish va vaqtini o'lchash."""
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, partial(self._call, fn, *args, **kwargs))
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._record(op, time.perf_counter() - started)
+
+    def _call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._running_lock:
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._running_lock:
+                self.running -= 1
+
+    # ---- auth ----
+    async def get_user_from_token(self, authorization: str, fresh: bool = False):
+        """
+        Kesh/lokal JWT bo'lsa darhol, aks holda Supabase so'rovi thread poolda;
+        kesh va metrikalar (thread-safe emas) faqat shu yerda, event loopda yangilanadi.
+        """
+        if not fresh:
+            user = supabase_service.peek_user_from_token(authorization)
+            if user is not None:
+                return user
+        supabase_service.auth_metrics["remote_calls"] += 1
+        try:
+            user, ttl = await self.run("get_user_from_token", supabase_service.fetch_user_from_token, authorization)
+        except ValueError:
+            supabase_service.auth_metrics["remote_failures"] += 1
+            raise
+        supabase_service.remember_user(authorization, user, ttl)
+        return user
+
+    async def get_user(self, token: str):
+        return await self.run("auth.get_user", lambda: config.supabase.auth.get_user(token))
+
+    async def sign_in_with_password(self, credentials: Dict[str, Any]):
+        return await self.run("auth.sign_in_with_password", lambda: config.supabase.auth.sign_in_with_password(credentials))
+
+    async def sign_out(self):
+        return await self.run("auth.sign_out", lambda: config.supabase.auth.sign_out())
+
+    # ---- admin ----
+    async def list_users(self, page: Optional[int] = None, per_page: Optional[int] = None):
+        # Sahifa berilmasa GoTrue o'z default'ini ishlatadi
+        params = {k: v for k, v in (("page", page), ("per_page", per_page)) if v is not None}
+        return await self.run(
+            "admin.list_users",
+            lambda: config.supabase_service.auth.admin.list_users(**params),
+        )
+
+    async def get_user_by_id(self, user_id: str):
+        return await self.run("admin.get_user_by_id", lambda: config.supabase_service.auth.admin.get_user_by_id(user_id))
+
+    async def create_user(self, attributes: Dict[str, Any]):
+        return await self.run("admin.create_user", lambda: config.supabase_service.auth.admin.create_user(attributes))
+
+    async def update_user_by_id(self, user_id: str, attributes: Dict[str, Any]):
+        return await self.run(
+            "admin.update_user_by_id",
+            lambda: config.supabase_service.auth.admin.update_user_by_id(user_id, attributes),
+        )
+
+    async def delete_user(self, user_id: str):
+        return await self.run("admin.delete_user", lambda: config.supabase_service.auth.admin.delete_user(user_id))
+
+    async def ensure_default_app_metadata(self, user_id: str):
+        return await self.run("ensure_default_app_metadata", supabase_service.ensure_default_app_metadata, user_id)
+
+    # ---- lifecycle / metrics ----
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "running": self.running,
+            "queued": max(0, self.in_flight - self.running),
+            "peak_in_flight": self.peak_in_flight,
+            "ops": {
+                op: {
+                    "count": int(v["count"]),
+                    "avg_ms": round(v["total"] / v["count"] * 1000, 1) if v["count"] else 0.0,
+                    "max_ms": round(v["max"] * 1000, 1),
+                }
+                for op, v in self._ops.items()
+            },
+        }
+
+    def _record(self, op: str, seconds: float) -> None:
+        v = self._ops.setdefault(op, {"count": 0, "total": 0.0, "max": 0.0})
+        v["count"] += 1
+        v["total"] += seconds
+        v["max"] = max(v["max"], seconds)
+
+
+supabase_gateway = SupabaseGateway(max_workers=config.SUPABASE_GATEWAY_WORKERS)
@@ -1,10 +1,41 @@
 import jwt
 import time
+import hashlib
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any
-from src.config import supabase, supabase_service, SUPABASE_JWT_SECRET, SUPABASE_ANON_KEY
+from typing import Any, Dict, Optional, Tuple
+from src.config import (
+    supabase, supabase_service, SUPABASE_JWT_SECRET, SUPABASE_ANON_KEY,
+    AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL_SECONDS,
+)
+from src.services.ttl_cache import TTLCache
 
-user_cache = {}
+# sha256(token) -> user; xom token xotirada kalit sifatida saqlanmaydi
+user_cache: TTLCache[Any] = TTLCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttl=AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+auth_metrics = {"local_verified": 0, "remote_calls": 0, "remote_failures": 0, "rejected": 0}
+
+
+@dataclass
+class TokenUser:
+    """JWT claimlaridan tiklangan foydalanuvchi (Supabase so'rovisiz)."""
+    id: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    app_metadata: Dict[str, Any] = field(default_factory=dict)
+    user_metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> "TokenUser":
+        return cls(
+            id=claims["sub"],
+            email=claims.get("email") or None,
+            phone=claims.get("phone") or None,
+            role=claims.get("role"),
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+        )
 
 def g(obj: Any, name: str, default=None):
     return getattr(obj, name, default) if not isinstance(obj, dict) else obj.get(name, default)
@@ -23,40 +54,119 @@ def ensure_default_app_metadata(user_id: str):
     }
     supabase_service.auth.admin.update_user_by_id(user_id, {"app_metadata": {**app_meta, **default_meta}})
 
-def get_user_from_token(authorization: str):
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def verify_token_locally(token: str) -> Optional[Dict[str, Any]]:
+    """
+    HS256 tokenni SUPABASE_JWT_SECRET bilan tekshirish (imzo va ``exp``).
+    Secret sozlanmagan yoki token boshqa algoritmda bo'lsa None - Supabase'dan so'raladi.
+    """
+    if not SUPABASE_JWT_SECRET:
+        return None
+    try:
+        if jwt.get_unverified_header(token).get("alg") != "HS256":
+            return None
+        return jwt.decode(
+            token,
+            SUPABASE_JWT_SECRET,
+            algorithms=["HS256"],
+            options={"require": ["exp", "sub"], "verify_aud": False},
+        )
+    except jwt.ExpiredSignatureError:
+        auth_metrics["rejected"] += 1
+        raise ValueError("Token muddati o'tgan. Qayta login qiling.")
+    except jwt.InvalidTokenError:
+        auth_metrics["rejected"] += 1
+        raise ValueError("Token noto'g'ri yoki yaroqsiz.")
+
+def _cache_ttl(claims: Optional[Dict[str, Any]]) -> float:
+    """Kesh muddati token ``exp`` idan oshmaydi."""
+    ttl = float(AUTH_TOKEN_CACHE_TTL_SECONDS)
+    if claims and claims.get("exp"):
+        ttl = min(ttl, float(claims["exp"]) - time.time())
+    return max(ttl, 0.0)
+
+def _bearer_token(authorization: str) -> str:
     if not authorization.lower().startswith("bearer "):
         raise ValueError("Bearer token kerak")
-    token = authorization.split(" ", 1)[1].strip()
+    return authorization.split(" ", 1)[1].strip()
 
-    if token in user_cache:
-        cached = user_cache[token]
-        if time.time() - cached['time'] < 300:  # 5 min cache
-            return cached['user']
+def _unverified_claims(token: str) -> Optional[Dict[str, Any]]:
+    """Supabase tasdiqlagan token uchun ``exp`` ni o'qish (faqat kesh muddati uchun)."""
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+
+def peek_user_from_token(authorization: str):
+    """
+    Tarmoqsiz yo'l: kesh yoki lokal JWT tekshiruvi.
+    None - Supabase'dan so'rash kerak; yaroqsiz token uchun ValueError.
+    """
+    token = _bearer_token(authorization)
+    key = _token_key(token)
+    cached = user_cache.get(key)
+    if cached is not None:
+        return cached
+    claims = verify_token_locally(token)
+    if claims is None:
+        return None
+    auth_metrics["local_verified"] += 1
+    user = TokenUser.from_claims(claims)
+    user_cache.set(key, user, ttl=_cache_ttl(claims))
+    return user
+
+def get_user_from_token(authorization: str, fresh: bool = False):
+    """
+    Bearer tokendan foydalanuvchi.
+
+    Kesh (sha256(token) bo'yicha LRU + TTL) -> lokal JWT tekshiruvi -> ``supabase.auth.get_user``.
+    ``fresh=True`` keshni va lokal tekshiruvni chetlab, Supabase'dan yangi metadata oladi.
+    Sinxron (tarmoq) - async kod ``supabase_gateway.get_user_from_token`` ni ishlatadi.
+    """
+    if not fresh:
+        user = peek_user_from_token(authorization)
+        if user is not None:
+            return user
+    auth_metrics["remote_calls"] += 1
+    try:
+        user, ttl = fetch_user_from_token(authorization)
+    except ValueError:
+        auth_metrics["remote_failures"] += 1
+        raise
+    remember_user(authorization, user, ttl)
+    return user
+
+def remember_user(authorization: str, user, ttl: float) -> None:
+    """Supabase'dan olingan foydalanuvchini keshlash (event loop / chaqiruvchi threadda)."""
+    user_cache.set(_token_key(_bearer_token(authorization)), user, ttl=ttl)
+
+def fetch_user_from_token(authorization: str) -> Tuple[Any, float]:
+    """
+    Supabase so'rovi: (foydalanuvchi, kesh TTL). Keshga ham, metrikalarga ham yozmaydi -
+    gateway thread poolida ishlaydi, ``user_cache`` esa faqat event loopda o'zgaradi.
+    """
+    token = _bearer_token(authorization)
+    claims = _unverified_claims(token)
 
     try:
         res = supabase.auth.get_user(token)
         user = getattr(res, "user", None) or (getattr(res, "data", {}) or {}).get("user")
         if not user:
             raise ValueError("Token noto‘g‘ri")
-        user_cache[token] = {'user': user, 'time': time.time()}
-        return user
+        return user, _cache_ttl(claims)
     except Exception as e:
         msg = str(e).lower()
         if "session from session_id claim in jwt does not exist" in msg:
             # Try JWT decoding
             try:
                 secret = SUPABASE_JWT_SECRET or SUPABASE_ANON_KEY
-                payload = jwt.decode(token, secret, algorithms=["HS256"])
+                payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
                 user_id = payload.get('sub')
                 if not user_id:
                     raise ValueError("Token noto'g'ri")
-                # Return a simple user object
-                class SimpleUser:
-                    def __init__(self, id):
-                        self.id = id
-                user = SimpleUser(user_id)
-                user_cache[token] = {'user': user, 'time': time.time()}
-                return user
+                return TokenUser.from_claims(payload), _cache_ttl(payload)
             except jwt.ExpiredSignatureError:
                 raise ValueError("Token muddati o'tgan. Qayta login qiling.")
             except jwt.InvalidTokenError:
@@ -68,6 +178,9 @@ def get_user_from_token(authorization: str):
         else:
             raise ValueError(f"Autentifikatsiya xatosi: {str(e)}")
 
+def token_cache_stats() -> Dict[str, Any]:
+    return {**user_cache.stats(), **auth_metrics, "local_verification": bool(SUPABASE_JWT_SECRET)}
+
 
 def get_user_by_token(token: str):
     try:
@@ -3,18 +3,41 @@ from __future__ import annotations
 
 import json
 import asyncio
+import time
+import uuid
 import shutil
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from src.config import API_ID, API_HASH, SESS_ROOT, PENDING_FILE, BASE_URL
-from pyrogram import Client, enums
+from pyrogram import Client, enums, raw, utils
 import inspect
 from pyrogram.enums import ChatType, UserStatus
 from pyrogram.errors import RPCError, PeerIdInvalid, AuthKeyInvalid, SessionRevoked, SessionExpired
-from src.config import API_ID, API_HASH, SESS_ROOT
+from src.config import API_ID, API_HASH, SESS_ROOT, TG_POOL_MAX_CLIENTS, TG_POOL_IDLE_SECONDS, ACCOUNT_REGISTRY_TTL_SECONDS
+from src.config import TG_PROFILE_CONCURRENCY, TG_PROFILE_SNAPSHOT_MAX_AGE_SECONDS
+from src.config import MEDIA_PREFETCH_CONCURRENCY, MEDIA_PREFETCH_QUEUE, PEER_CACHE_TTL_SECONDS
+from src.config import GROUP_STATS_TTL_SECONDS, GROUP_STATS_CONCURRENCY
+from src.config import EXPORT_JOBS_PER_ACCOUNT, EXPORT_CHECKPOINT_MESSAGES
+from src.config import MEDIA_BLOB_GC_GRACE_SECONDS, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_QUOTAS, MEDIA_ACCESS_TTL_SECONDS
 from .json_utils import _to_jsonable
+from .client_pool import TelegramClientPool
+from .account_registry import AccountRegistry
+from .dialog_cache import DialogIndex
+from .media_prefetch import MediaPrefetcher
+from .ttl_cache import TTLCache
+from .group_stats import GroupStatsCache
+from .export_jobs import ExportJob, ExportJobRunner
+from .export_store import IncrementalExportStore
+from .media_stream import iter_telegram_range
+from .single_flight import SingleFlight
+from .blob_store import BlobStore, blob_key
+from .media_cache import MediaCacheManager, parse_size, parse_quotas
+from .downloads_index import DownloadsIndex
+from .paths import KnownDirs
+from .profile_store import ProfileSnapshotStore
 
 logger = logging.getLogger(__name__)
 
@@ -31,20 +54,16 @@ def format_file_size(size_bytes: int) -> str:
 # xotiradagi holat: phone_number -> state
 login_states: dict[str, dict] = {}
 
-# Download locks to prevent concurrent access to same session
-download_locks: dict[str, asyncio.Lock] = {}
+# Yaratilgan papkalar: har bir yozishda mkdir qilinmaydi
+known_dirs = KnownDirs()
 
-# Session locks to prevent concurrent access to same session file
-session_locks: dict[str, asyncio.Lock] = {}
-
-# Client pool for persistent clients
-client_pool: dict[str, dict[int, Client]] = {}
+# Profil yuklash (get_me) uchun umumiy limit: admin ro'yxati minglab ulanish ochmasin
+profile_semaphore = asyncio.Semaphore(TG_PROFILE_CONCURRENCY)
 
 # ---- fayl helperlar ----
 def user_dir(user_id: str) -> Path:
-    d = SESS_ROOT / user_id
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+    # Faqat yo'l; papka yozishdan oldin known_dirs.ensure bilan yaratiladi
+    return SESS_ROOT / user_id
 
 def next_index(user_id: str) -> int:
     d = user_dir(user_id)
@@ -60,7 +79,7 @@ def pending_path(user_id: str) -> Path:
     return user_dir(user_id) / PENDING_FILE
 
 def write_pending(user_id: str, data: dict) -> None:
-    pending_path(user_id).write_text(json.dumps(data, ensure_ascii=False, indent=2))
+    known_dirs.ensure_parent(pending_path(user_id)).write_text(json.dumps(data, ensure_ascii=False, indent=2))
 
 def read_pending(user_id: str) -> dict:
     p = pending_path(user_id)
@@ -78,7 +97,7 @@ def clear_pending(user_id: str) -> None:
 
 # ---- telegram client yaratish ----
 def build_client(user_id: str, account_index: int | None):
-    sess_dir = user_dir(user_id)
+    sess_dir = known_dirs.ensure(user_dir(user_id))
     idx = next_index(user_id) if account_index is None else account_index
     session_name = str(idx)  # .session qo‘shilmaydi
     client = Client(session_name, api_id=API_ID, api_hash=API_HASH, workdir=str(sess_dir))
@@ -91,22 +110,17 @@ def build_client(user_id: str, account_index: int | None):
 async def profile_from_session(user_id: str, account_index: int) -> dict:
     session_name = str(account_index)
     try:
-        client = await get_client(user_id, account_index)
-        me = await client.get_me()
+        async with telegram_session(user_id, account_index, "get_me") as client:
+            me = await client.get_me()
         full_name = " ".join(filter(None, [me.first_name, me.last_name])) or None
 
-        # Get profile picture
+        # Profil rasmi: blob ombori orqali (boshqa akkaunt/foydalanuvchida bo'lsa Telegramsiz)
         photo_url = None
         try:
             if getattr(me, "photo", None):
-                file_id = me.photo.big_file_id
                 dest = _avatar_file(user_id, account_index, me.id)
                 if not dest.exists():
-                    data = await client.download_media(file_id, in_memory=True)
-                    if data:
-                        dest.parent.mkdir(parents=True, exist_ok=True)
-                        with open(dest, 'wb') as f:
-                            f.write(data.getvalue())
+                    await download_media_to_file(user_id, account_index, me.photo.big_file_id, dest, op="download_avatar")
                 if dest.exists():
                     photo_url = f"/media/avatars/{user_id}/{account_index}/{me.id}.jpg"
         except Exception:
@@ -145,38 +159,43 @@ async def profile_from_session(user_id: str, account_index: int) -> dict:
             "profile_url": None,
         }
 
+async def load_profile(user_id: str, account_index: int) -> dict:
+    """Telegramdan profil (umumiy limit ostida); yaroqsiz sessiya fayli o'chiriladi."""
+    async with profile_semaphore:
+        profile = await profile_from_session(user_id, account_index)
+    if profile.get("invalid"):
+        try:
+            sess_file = user_dir(user_id) / f"{account_index}.session"
+            if sess_file.exists():
+                sess_file.unlink()
+                logger.info(f"Deleted invalid session file: {sess_file}")
+        except Exception as e:
+            logger.error(f"Failed to delete invalid session {account_index}: {e}")
+        account_registry.invalidate(user_id)
+    return profile
+
+# Profil snapshotlari sessiya fayllari yonida; ro'yxat odatda Telegramga chiqmaydi
+profile_store = ProfileSnapshotStore(
+    SESS_ROOT, load_profile, max_age=TG_PROFILE_SNAPSHOT_MAX_AGE_SECONDS, dirs=known_dirs
+)
+
 async def list_user_telegram_profiles(user_id: str) -> list[dict]:
     sess_dir = SESS_ROOT / user_id
     if not sess_dir.exists():
         return []
-    session_names = [p.stem for p in sorted(sess_dir.glob("*.session"), key=lambda x: int(x.stem))]
-
-    # Limit concurrent connections to avoid overwhelming Telegram
-    semaphore = asyncio.Semaphore(4)
-
-    async def process_session(name):
-        async with semaphore:
-            return await profile_from_session(user_id, int(name))
-
-    profiles = await asyncio.gather(*[process_session(name) for name in session_names])
-
-    # Delete invalid sessions
-    for profile in profiles:
-        if profile.get("invalid"):
-            index = profile.get("index")
-            if index:
-                try:
-                    sess_file = user_dir(user_id) / f"{index}.session"
-                    if sess_file.exists():
-                        sess_file.unlink()
-                        logger.info(f"Deleted invalid session file: {sess_file}")
-                except Exception as e:
-                    logger.error(f"Failed to delete invalid session {index}: {e}")
+    indexes = sorted(int(p.stem) for p in sess_dir.glob("*.session") if p.stem.isdigit())
+
+    # Snapshot bo'lsa undan (eskirgani fonda yangilanadi), yo'q bo'lsa get_me
+    profiles = await profile_store.profiles(user_id, indexes)
 
     # Filter out invalid or failed profiles from the result
     valid_profiles = [p for p in profiles if p.get("telegram_id") is not None]
+    account_registry.prime(user_id, valid_profiles)
     return valid_profiles
 
+# Index tekshiruvi uchun keshlangan akkauntlar ro'yxati
+account_registry = AccountRegistry(list_user_telegram_profiles, ttl=ACCOUNT_REGISTRY_TTL_SECONDS)
+
 # ---- logout helpers ----
 async def logout_one(user_id: str, session_name: str) -> dict:
     sess_dir = SESS_ROOT / user_id
@@ -184,42 +203,32 @@ async def logout_one(user_id: str, session_name: str) -> dict:
     if not sess_file.exists():
         return {"index": session_name, "status": "not_found"}
 
-    # Stop and remove from pool if exists
-    if user_id in client_pool and int(session_name) in client_pool[user_id]:
-        client = client_pool[user_id][int(session_name)]
-        try:
-            await client.stop()
-        except Exception:
-            pass
-        client_pool[user_id].pop(int(session_name), None)
-
-    client = Client(session_name, api_id=API_ID, api_hash=API_HASH, workdir=str(sess_dir))
+    # Pooldagi (yoki yangi ochilgan) yagona client orqali logout qilamiz;
+    # log_out() clientni o'zi to'xtatadi, keyin uni pooldan olib tashlaymiz
     server_logged_out = False
     try:
-        await client.connect()
-        try:
+        async with telegram_session(user_id, int(session_name), "log_out") as client:
             await client.log_out()
             server_logged_out = True
-        except Exception:
-            server_logged_out = False
-        finally:
-            try:
-                await client.disconnect()
-            except Exception:
-                pass
     except Exception:
-        pass
+        server_logged_out = False
+    finally:
+        await client_pool.discard(user_id, int(session_name))
+        account_registry.invalidate(user_id)
 
     try:
         sess_file.unlink(missing_ok=True)
     except Exception:
         pass
+    profile_store.delete(user_id, int(session_name))
+    downloads_index.forget(user_id, int(session_name))
 
     # Delete associated avatar directory
     avatar_dir = AVATAR_DIR / user_id / session_name
     if avatar_dir.exists():
         try:
             shutil.rmtree(avatar_dir)
+            known_dirs.forget(avatar_dir)
         except Exception:
             pass
 
@@ -290,12 +299,7 @@ async def ensure_user_avatar_downloaded(
     if dest.exists() and not force:
         return f"/media/avatars/{user_id}/{account_index}/{chat_id}.jpg"
 
-    key = f"{user_id}_{account_index}"
-    lock = session_locks.setdefault(key, asyncio.Lock())
-    
-    async with lock:
-        client = build_client_for(user_id, account_index)
-        await client.connect()
+    async with telegram_session(user_id, account_index, "download_avatar") as client:
         try:
             chat = await client.get_chat(chat_id)
             if not chat or chat.type != ChatType.PRIVATE or not getattr(chat, "photo", None):
@@ -309,71 +313,100 @@ async def ensure_user_avatar_downloaded(
                 file_id = getattr(chat.photo, "big_file_id", None) or getattr(chat.photo, "small_file_id", None)
             if not file_id:
                 return None
-
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            await client.download_media(file_id, file_name=str(dest))
-            return f"/media/avatars/{user_id}/{account_index}/{chat_id}.jpg" if dest.exists() else None
         except RPCError:
             return None
-        finally:
-            try:
-                await client.stop()
-            except Exception:
-                pass
+
+    try:
+        if force:
+            dest.unlink(missing_ok=True)
+        await download_media_to_file(user_id, account_index, file_id, dest, op="download_avatar")
+    except RPCError:
+        return None
+    return f"/media/avatars/{user_id}/{account_index}/{chat_id}.jpg" if dest.exists() else None
 
 def build_client_for(user_id: str, account_index: int) -> Client:
-    sess_dir = Path(SESS_ROOT) / user_id
-    sess_dir.mkdir(parents=True, exist_ok=True)
+    sess_dir = known_dirs.ensure(Path(SESS_ROOT) / user_id)
     session_name = str(account_index)
     return Client(session_name, api_id=API_ID, api_hash=API_HASH, workdir=str(sess_dir))
 
-async def get_client(user_id: str, account_index: int) -> Client:
-    if user_id not in client_pool:
-        client_pool[user_id] = {}
-    if account_index not in client_pool[user_id]:
-        client = build_client_for(user_id, account_index)
-        try:
-            await client.start()
-            client_pool[user_id][account_index] = client
-        except Exception as e:
-            logger.error(f"Failed to start client for {user_id} {account_index}: {e}")
-            raise
-    return client_pool[user_id][account_index]
+# Client pool for persistent clients (LRU + idle eviction)
+client_pool = TelegramClientPool(
+    factory=build_client_for,
+    max_clients=TG_POOL_MAX_CLIENTS,
+    idle_seconds=TG_POOL_IDLE_SECONDS,
+)
+
+# chat_id -> dialog metadata (read markerlar, turi, nomi), update'lar orqali yangilanadi
+dialog_index = DialogIndex()
+client_pool.add_start_hook(dialog_index.attach)
+client_pool.add_stop_hook(dialog_index.detach)
+# O'z profilimiz haqidagi update'lar snapshotni yangilaydi
+client_pool.add_start_hook(profile_store.attach)
+
+@asynccontextmanager
+async def telegram_session(user_id: str, account_index: int, op: str):
+    """
+    Telegramga murojaat qilishning yagona yo'li: (user_id, account_index) uchun
+    pooldagi bitta jonli clientni lease qiladi va operatsiya vaqtini o'lchaydi.
+    """
+    started = time.perf_counter()
+    try:
+        async with client_pool.lease(user_id, account_index) as client:
+            yield client
+    finally:
+        client_pool.record_latency(op, time.perf_counter() - started)
+
+# (user_id, account_index, peer_id) -> pyrogram User; qayta listinglar tarmoqqa chiqmaydi
+peer_cache: TTLCache[Any] = TTLCache(maxsize=50000, ttl=PEER_CACHE_TTL_SECONDS)
+
+# Guruhlar uchun a'zolar/online soni (GetOnlines + TTL kesh)
+group_stats = GroupStatsCache(ttl=GROUP_STATS_TTL_SECONDS, concurrency=GROUP_STATS_CONCURRENCY)
+
+# Avatar/emoji/thumbnaillar listing javobini kutdirmasdan fonda yuklanadi
+media_prefetcher = MediaPrefetcher(concurrency=MEDIA_PREFETCH_CONCURRENCY, max_queue=MEDIA_PREFETCH_QUEUE)
+
+def _prefetch_job(user_id: str, account_index: int, dest: Path, file_id: Optional[str] = None, custom_emoji_id: Optional[int] = None):
+    async def job() -> Optional[Path]:
+        if dest.exists():
+            return dest
+        fid = file_id
+        if custom_emoji_id:
+            async with telegram_session(user_id, account_index, "prefetch_media") as client:
+                stickers = await client.get_custom_emoji_stickers([custom_emoji_id])
+            if not stickers or not stickers[0]:
+                return None
+            fid = stickers[0].file_id
+        return await download_media_to_file(user_id, account_index, fid, dest, op="prefetch_media")
+    return job
+
+def media_url(dest: Path, job) -> str:
+    """
+    Fayl diskda bo'lsa statik /media URL, bo'lmasa yuklashni navbatga qo'yib
+    /media_lazy URL qaytaradi (URL fayl yo'lidan aniqlanadi, so'rov kutilmaydi).
+    """
+    rel = dest.relative_to(MEDIA_ROOT).as_posix()
+    if dest.exists():
+        return f"/media/{rel}"
+    media_prefetcher.enqueue(rel, job)
+    return f"/media_lazy/{rel}"
 
+# Yo'l helperlari syscall qilmaydi: papkalar faqat fayl yozilganda (known_dirs) yaratiladi
 def _avatar_file(user_id: str, account_index: int, chat_id: int) -> Path:
-    d = AVATAR_DIR / user_id / str(account_index)
-    d.mkdir(parents=True, exist_ok=True)
-    return d / f"{chat_id}.jpg"
+    return AVATAR_DIR / user_id / str(account_index) / f"{chat_id}.jpg"
 
 def _message_file(user_id: str, account_index: int, message_id: int, ext: str) -> Path:
-    d = MEDIA_ROOT / "messages" / user_id / str(account_index)
-    d.mkdir(parents=True, exist_ok=True)
-    return d / f"{message_id}.{ext}"
+    return MEDIA_ROOT / "messages" / user_id / str(account_index) / f"{message_id}.{ext}"
 
 def _thumb_file(user_id: str, account_index: int, message_id: int) -> Path:
-    d = MEDIA_ROOT / "thumbs" / user_id / str(account_index)
-    d.mkdir(parents=True, exist_ok=True)
-    return d / f"{message_id}.jpg"
+    return MEDIA_ROOT / "thumbs" / user_id / str(account_index) / f"{message_id}.jpg"
 
-async def download_thumb(client, thumb, dest: Path):
-    try:
-        data = await client.download_media(thumb.file_id, in_memory=True)
-        if data:
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            with open(dest, 'wb') as f:
-                f.write(data.getvalue())
-    except Exception:
-        pass
-
-async def get_thumb_url(msg, media_type: str, user_id: str, account_index: int, message_id: int, client) -> Optional[str]:
+def thumb_media_url(msg, media_type: str, user_id: str, account_index: int, message_id: int) -> Optional[str]:
+    """Thumbnail URL darhol; fayl hali bo'lmasa fonda (blob ombori orqali) yuklanadi."""
     media = getattr(msg, media_type, None)
     if media and hasattr(media, 'thumbs') and media.thumbs:
         thumb = min(media.thumbs, key=lambda t: t.file_size)
         dest = _thumb_file(user_id, account_index, message_id)
-        if not dest.exists():
-            await download_thumb(client, thumb, dest)
-        if dest.exists():
-            return f"/media/thumbs/{user_id}/{account_index}/{message_id}.jpg"
+        return media_url(dest, _prefetch_job(user_id, account_index, dest, file_id=thumb.file_id))
     return None
 
 def get_media_ext(media_type: str, msg) -> str:
@@ -399,20 +432,135 @@ def get_media_ext(media_type: str, msg) -> str:
     else:
         return "file"
 
-async def download_message_media(user_id: str, account_index: int, file_id: str, dest: Path):
-    key = f"{user_id}_{account_index}"
-    lock = download_locks.setdefault(key, asyncio.Lock())
-    async with lock:
-        logger.info(f"Starting download for user {user_id} account {account_index} file {file_id} to {dest}")
-        client = build_client_for(user_id, account_index)
-        await client.connect()
+def _part_path(dest: Path) -> Path:
+    """dest yonidagi noyob vaqtinchalik fayl (parallel yuklashlar bir-birini buzmasligi uchun)."""
+    return dest.with_name(f"{dest.name}.{uuid.uuid4().hex[:8]}.part")
+
+# Barcha foydalanuvchilar uchun umumiy blob ombori: bir xil media bir marta yuklanadi va saqlanadi
+blob_store = BlobStore(MEDIA_ROOT / "blobs", gc_grace_seconds=MEDIA_BLOB_GC_GRACE_SECONDS, dirs=known_dirs)
+
+# media/downloads/{user}/{account} indeksi: file_id -> fayl nomi
+downloads_index = DownloadsIndex(MEDIA_ROOT / "downloads")
+
+# media/ byudjeti: LRU eviction, o'chirilgan referenslarning bloblari GC bilan tozalanadi
+media_cache = MediaCacheManager(
+    MEDIA_ROOT,
+    max_bytes=parse_size(MEDIA_CACHE_MAX_BYTES),
+    quotas=parse_quotas(MEDIA_CACHE_QUOTAS),
+    protected=("avatars/default.jpg",),
+    on_evicted=blob_store.request_gc,
+    on_removed=downloads_index.note_removed,
+)
+
+# (blob kaliti, user_id, account_index) bo'yicha bitta yuklash: bir akkauntning parallel so'rovlari
+# bitta natijani kutadi; boshqa akkauntning xatosi (peer invalid, file reference) bu yerga o'tmaydi
+media_downloads = SingleFlight()
+
+# Akkaunt shu blobni Telegramdan o'zi olgan/tekshirgan: (user_id, account_index, blob_key)
+media_access: TTLCache[bool] = TTLCache(maxsize=100000, ttl=MEDIA_ACCESS_TTL_SECONDS)
+
+def _download_key(user_id: str, account_index: int, file_id: str) -> tuple:
+    return (blob_key(file_id), user_id, account_index)
+
+async def _verify_media_access(user_id: str, account_index: int, file_id: str, op: str) -> None:
+    """
+    Umumiy blobni berishdan oldin shu akkaunt faylga kira olishini Telegramda tekshirish
+    (birinchi chunkdan bitta bayt). Soxta/begona file_id uchun Telegram xatosi ko'tariladi.
+    """
+    key = (user_id, account_index, blob_key(file_id))
+    if media_access.get(key):
+        return
+    async with telegram_session(user_id, account_index, f"{op}_probe") as client:
+        async for _ in iter_telegram_range(client, file_id, 0, 0):
+            break
+    media_access.set(key, True)
+
+async def download_media_to_file(
+    user_id: str,
+    account_index: int,
+    file_id: str,
+    dest: Path,
+    op: str = "download_media",
+) -> Path:
+    """
+    Faylni blob omboridan olish yoki ``stream_media`` orqali chunklab blobga yuklash,
+    so'ng ``dest`` ni blobga hardlink qilish.
+
+    Blob boshqa akkaunt tomonidan yuklangan bo'lsa ham, shu akkaunt unga kira olishi
+    Telegramda tekshiriladi (``_verify_media_access``) - file_id ni soxtalashtirib begona
+    mediani o'qib bo'lmaydi. Xotirada bir vaqtda faqat bitta 1 MiB chunk turadi; akkauntning
+    bir xil media uchun parallel chaqiruvlari bitta yuklashni kutadi; xatoda qisman fayl o'chiriladi.
+    """
+    if dest.exists():
+        return dest
+
+    async def download() -> Path:
+        blob = blob_store.path_for(file_id)
+        if blob.exists():
+            await _verify_media_access(user_id, account_index, file_id, op)
+            if blob_store.link_if_present(file_id, dest):
+                return blob
+        known_dirs.ensure_parent(blob)
+        tmp = _part_path(blob)
         try:
-            await client.download_media(file_id, file_name=str(dest))
-            logger.info(f"Download completed for {file_id} to {dest}")
-        except Exception as e:
-            logger.error(f"Download failed for {file_id}: {e}")
+            async with telegram_session(user_id, account_index, op) as client:
+                with open(tmp, "wb") as f:
+                    async for chunk in client.stream_media(file_id):
+                        f.write(chunk)
+            tmp.replace(blob)
         finally:
-            await client.stop()
+            tmp.unlink(missing_ok=True)
+        media_access.set((user_id, account_index, blob_key(file_id)), True)
+        return blob
+
+    blob = await media_downloads.do(_download_key(user_id, account_index, file_id), download)
+    if not dest.exists():
+        blob_store.link(blob, dest)
+    media_cache.touch_path(dest)
+    downloads_index.note_path(dest)
+    return dest
+
+async def stream_media_bytes(
+    user_id: str,
+    account_index: int,
+    file_id: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    cache_to: Optional[Path] = None,
+):
+    """
+    Media baytlarini Telegramdan to'g'ridan-to'g'ri HTTP javobga uzatish.
+
+    To'liq fayl so'ralganda (start=0, end=None) va ``cache_to`` berilsa chunklar bir vaqtda
+    diskka ham yoziladi va oqim oxirigacha yetsa fayl keshga rename qilinadi.
+    """
+    # Shu fayl allaqachon yuklanayotgan bo'lsa ikkinchi marta diskka yozmaymiz
+    tee = cache_to is not None and start == 0 and end is None \
+        and not media_downloads.in_flight(_download_key(user_id, account_index, file_id))
+    tmp = _part_path(cache_to) if tee else None
+    f = None
+    try:
+        async with telegram_session(user_id, account_index, "stream_media") as client:
+            if tee:
+                known_dirs.ensure_parent(cache_to)
+                f = open(tmp, "wb")
+            async for chunk in iter_telegram_range(client, file_id, start, end):
+                if f is not None:
+                    f.write(chunk)
+                yield chunk
+        if f is not None:
+            f.close()
+            f = None
+            tmp.replace(cache_to)
+            blob_store.adopt(file_id, cache_to)
+            media_access.set((user_id, account_index, blob_key(file_id)), True)
+            downloads_index.note_path(cache_to)
+            media_cache.touch_path(cache_to)
+    finally:
+        if f is not None:
+            f.close()
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
 
 def _status_to_last_seen_and_online(status_obj) -> tuple[Optional[str], bool]:
     """
@@ -448,24 +596,46 @@ def _status_to_last_seen_and_online(status_obj) -> tuple[Optional[str], bool]:
     return last_seen, is_online
 
 
-async def list_private_chats_minimal(user_id: str, account_index: int, limit: int = 10) -> List[Dict[str, Any]]:
-    key = f"{user_id}_{account_index}"
-    lock = session_locks.setdefault(key, asyncio.Lock())
-    
-    async with lock:
-        client = await get_client(user_id, account_index)
-        out: List[Dict[str, Any]] = []
-        async for dialog in client.get_dialogs(limit=limit):
-            chat = await client.get_chat(dialog.chat.id)
-            if not chat or chat.type != ChatType.PRIVATE:
+async def _resolve_users(client, user_id: str, account_index: int, peer_ids: List[int]) -> Dict[int, Any]:
+    """
+    Userlarni peer keshdan olish; keshda yo'qlari bitta batched ``get_users`` bilan olinadi.
+    """
+    found: Dict[int, Any] = {}
+    missing: List[int] = []
+    for peer_id in peer_ids:
+        cached = peer_cache.get((user_id, account_index, peer_id))
+        if cached is None:
+            missing.append(peer_id)
+        else:
+            found[peer_id] = cached
+    if missing:
+        try:
+            users = await client.get_users(missing)
+        except Exception as e:
+            logger.debug(f"Batched get_users failed for {user_id}/{account_index}: {e}")
+            users = []
+        if not isinstance(users, list):
+            users = [users]
+        for u in users:
+            if u is None:
                 continue
+            peer_cache.set((user_id, account_index, u.id), u)
+            found[u.id] = u
+    return found
+
+
+async def list_private_chats_minimal(user_id: str, account_index: int, limit: int = 10) -> List[Dict[str, Any]]:
+    async with telegram_session(user_id, account_index, "list_private_chats") as client:
+        # Chat ma'lumotlari dialoglarning o'zida bor - har bir dialog uchun get_chat shart emas
+        chats = [dialog.chat async for dialog in client.get_dialogs(limit=limit)
+                 if dialog.chat and dialog.chat.type == ChatType.PRIVATE]
 
-            # user obyektini olish (status ko'pincha shu yerda to'liqroq bo'ladi)
-            user_obj = None
-            try:
-                user_obj = await client.get_users(chat.id)
-            except Exception:
-                pass
+        # status/premium/emoji_status faqat User da - sahifa uchun bitta so'rov
+        users = await _resolve_users(client, user_id, account_index, [chat.id for chat in chats])
+
+        out: List[Dict[str, Any]] = []
+        for chat in chats:
+            user_obj = users.get(chat.id)
 
             full_name = " ".join(filter(None, [chat.first_name, chat.last_name])) or None
             username = chat.username
@@ -474,46 +644,22 @@ async def list_private_chats_minimal(user_id: str, account_index: int, limit: in
 
             is_premium = getattr(user_obj, 'is_premium', False) if user_obj else False
 
-            # emoji_status uchun emoji yuklab olish
+            # emoji_status: URL darhol, yuklash fonda
             emoji_url = None
             if user_obj and getattr(user_obj, "emoji_status", None):
                 custom_emoji_id = getattr(user_obj.emoji_status, 'custom_emoji_id', None)
                 if custom_emoji_id:
                     dest = AVATAR_DIR / user_id / str(account_index) / f"{user_obj.id}_emoji.webp"
-                    if not dest.exists():
-                        try:
-                            stickers = await client.get_custom_emoji_stickers([custom_emoji_id])
-                            if stickers and stickers[0]:
-                                sticker = stickers[0]
-                                file_id = sticker.file_id
-                                data = await client.download_media(file_id, in_memory=True)
-                                if data:
-                                    dest.parent.mkdir(parents=True, exist_ok=True)
-                                    with open(dest, 'wb') as f:
-                                        f.write(data.getvalue())
-                        except Exception:
-                            pass
-                    if dest.exists():
-                        emoji_url = f"/media/avatars/{user_id}/{account_index}/{user_obj.id}_emoji.webp"
+                    emoji_url = media_url(dest, _prefetch_job(user_id, account_index, dest, custom_emoji_id=custom_emoji_id))
 
             # avatar
             photo_url = None
             has_photo = bool(getattr(chat, "photo", None))
             if has_photo:
-                try:
+                file_id = getattr(chat.photo, "small_file_id", None) or getattr(chat.photo, "big_file_id", None)
+                if file_id:
                     dest = _avatar_file(user_id, account_index, chat.id)
-                    if not dest.exists():
-                        file_id = getattr(chat.photo, "small_file_id", None) or getattr(chat.photo, "big_file_id", None)
-                        if file_id:
-                            data = await client.download_media(file_id, in_memory=True)
-                            if data:
-                                dest.parent.mkdir(parents=True, exist_ok=True)
-                                with open(dest, 'wb') as f:
-                                    f.write(data.getvalue())
-                    if dest.exists():
-                        photo_url = f"/media/avatars/{user_id}/{account_index}/{chat.id}.jpg"
-                except Exception:
-                    photo_url = None
+                    photo_url = media_url(dest, _prefetch_job(user_id, account_index, dest, file_id=file_id))
 
             if not photo_url:
                 photo_url = DEFAULT_AVATAR_URL
@@ -533,79 +679,117 @@ async def list_private_chats_minimal(user_id: str, account_index: int, limit: in
 
 
 async def list_groups_minimal(user_id: str, account_index: int, limit: int = 10) -> List[Dict[str, Any]]:
-    key = f"{user_id}_{account_index}"
-    lock = session_locks.setdefault(key, asyncio.Lock())
-    
-    async with lock:
-        client = build_client_for(user_id, account_index)
-        await client.connect()
+    async with telegram_session(user_id, account_index, "list_groups") as client:
+        chats = [dialog.chat async for dialog in client.get_dialogs(limit=limit)
+                 if dialog.chat and dialog.chat.type in (ChatType.GROUP, ChatType.SUPERGROUP)]
+
+        # A'zolar/online soni: keshdan yoki semafor ostida parallel
+        stats = await group_stats.get_many(client, user_id, account_index, chats)
+
         out: List[Dict[str, Any]] = []
-        try:
-            async for dialog in client.get_dialogs(limit=limit):
-                chat = await client.get_chat(dialog.chat.id)
-                if not chat or chat.type not in (ChatType.GROUP, ChatType.SUPERGROUP):
-                    continue
-
-                title = chat.title
-                username = chat.username
-
-                # Get member count and online count
-                member_count = 0
-                online_count = 0
-                try:
-                    member_count = await client.get_chat_members_count(chat.id)
-                    # Get online count by checking up to 50 members
-                    count = 0
-                    async for member in client.get_chat_members(chat.id):
-                        if member.user and member.user.status == UserStatus.ONLINE:
-                            online_count += 1
-                        count += 1
-                        if count >= 50:  # Limit to 50 to avoid performance issues
-                            break
-                except Exception:
-                    member_count = 0
-                    online_count = 0
+        for chat in chats:
+            # avatar
+            photo_url = None
+            has_photo = bool(getattr(chat, "photo", None))
+            if has_photo:
+                file_id = getattr(chat.photo, "small_file_id", None) or getattr(chat.photo, "big_file_id", None)
+                if file_id:
+                    dest = _avatar_file(user_id, account_index, chat.id)
+                    photo_url = media_url(dest, _prefetch_job(user_id, account_index, dest, file_id=file_id))
 
-                # avatar
-                photo_url = None
-                has_photo = bool(getattr(chat, "photo", None))
-                if has_photo:
-                    try:
-                        dest = _avatar_file(user_id, account_index, chat.id)
-                        if not dest.exists():
-                            file_id = getattr(chat.photo, "small_file_id", None) or getattr(chat.photo, "big_file_id", None)
-                            if file_id:
-                                data = await client.download_media(file_id, in_memory=True)
-                                if data:
-                                    dest.parent.mkdir(parents=True, exist_ok=True)
-                                    with open(dest, 'wb') as f:
-                                        f.write(data.getvalue())
-                        if dest.exists():
-                            photo_url = f"/media/avatars/{user_id}/{account_index}/{chat.id}.jpg"
-                    except Exception:
-                        photo_url = None
-
-                if not photo_url:
-                    photo_url = DEFAULT_AVATAR_URL
-
-                out.append({
-                    "id": chat.id,
-                    "title": title,
-                    "username": username,
-                    "member_count": member_count,
-                    "online_count": online_count,
-                    "has_photo": has_photo,
-                    "photo_url": photo_url,
-                })
-            return out
-        finally:
-            try:
-                await client.disconnect()
-            except Exception:
-                pass
+            if not photo_url:
+                photo_url = DEFAULT_AVATAR_URL
 
+            out.append({
+                "id": chat.id,
+                "title": chat.title,
+                "username": chat.username,
+                "member_count": stats[chat.id]["member_count"],
+                "online_count": stats[chat.id]["online_count"],
+                "has_photo": has_photo,
+                "photo_url": photo_url,
+            })
+        return out
+
+
+async def _history_page(
+    client: Client,
+    chat_id: int,
+    limit: int,
+    offset: int = 0,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> Tuple[List[Any], bool]:
+    """
+    Xabarlar sahifasi (eng yangisi birinchi) va shu yo'nalishda yana xabar borligi.
 
-async def get_chat_messages(user_id: str, account_index: int, chat_id: int,limit: int = 10,offset: int = 0) -> List[Dict[str, Any]]:
+    before_id/after_id berilsa faqat so'ralgan oyna bitta GetHistory so'rovi bilan olinadi;
+    aks holda eski ``offset`` yo'li (limit + offset xabar o'qib, offset tashlanadi).
+    has_more uchun bitta ortiqcha xabar so'raladi.
+    """
+    if before_id is not None or after_id is not None:
+        if after_id is not None:
+            # offset_id dan boshlab (u ham kiradi) yangiroq tomonga limit + 1 ta xabar
+            offset_id, add_offset, min_id = after_id + 1, -(limit + 1), after_id
+        else:
+            offset_id, add_offset, min_id = before_id, 0, 0
+        r = await client.invoke(
+            raw.functions.messages.GetHistory(
+                peer=await client.resolve_peer(chat_id),
+                offset_id=offset_id,
+                offset_date=0,
+                add_offset=add_offset,
+                limit=limit + 1,
+                max_id=0,
+                min_id=min_id,
+                hash=0,
+            ),
+            sleep_threshold=60,
+        )
+        messages = [
+            msg for msg in await utils.parse_messages(client, r, replies=0)
+            if (after_id is None or msg.id > after_id) and (before_id is None or msg.id < before_id)
+        ]
+        has_more = len(messages) > limit
+        if after_id is not None:
+            # Cursorga eng yaqin (eng eski) limit ta xabar qoladi, ortiqchasi eng yangisi
+            return messages[-limit:], has_more
+        return messages[:limit], has_more
+
+    messages = []
+    skipped = 0
+    async for msg in client.get_chat_history(chat_id, limit=limit + offset + 1):
+        # Offset qo'llash
+        if skipped < offset:
+            skipped += 1
+            continue
+        messages.append(msg)
+    return messages[:limit], len(messages) > limit
+
+
+async def get_chat_messages(
+    user_id: str,
+    account_index: int,
+    chat_id: int,
+    limit: int = 10,
+    offset: int = 0,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Chatdan xabarlar ro'yxati (``get_chat_messages_page`` ning xabarlar qismi)."""
+    messages, _ = await get_chat_messages_page(user_id, account_index, chat_id, limit, offset, before_id, after_id)
+    return messages
+
+
+async def get_chat_messages_page(
+    user_id: str,
+    account_index: int,
+    chat_id: int,
+    limit: int = 10,
+    offset: int = 0,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
     """
     Chatdan xabarlarni olish va har bir xabarning o'qilganligini aniqlash.
 
@@ -614,348 +798,346 @@ async def get_chat_messages(user_id: str, account_index: int, chat_id: int,limit
         account_index: Telegram akkaunti index
         chat_id: Chat ID
         limit: Nechta xabar olish
-        offset: Qayerdan boshlash
+        offset: Qayerdan boshlash (eski usul, before_id/after_id bo'lmasa)
+        before_id: Shu ID dan eski xabarlar (cursor)
+        after_id: Shu ID dan yangi xabarlar (cursor)
 
     Returns:
-        Xabarlar ro'yxati
+        (xabarlar ro'yxati (eng yangisi birinchi), shu yo'nalishda yana xabar bormi)
     """
-    client = await get_client(user_id, account_index)
-
-    try:
-        # Dialogni topish
-        dialog_obj = None
-        async for d in client.get_dialogs():
-            if d.chat.id == chat_id:
-                dialog_obj = d
-                break
-
-        if not dialog_obj:
+    async with telegram_session(user_id, account_index, "get_chat_messages") as client:
+        try:
+            # Dialog metadata (keshdan yoki bitta chat uchun targeted so'rov)
+            dialog_meta = await dialog_index.lookup(client, user_id, account_index, chat_id)
+
+            if not dialog_meta:
+                raise ValueError(
+                    "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
+                    "Ehtimol, noto'g'ri sessiya tanlangan."
+                )
+
+            # O'qilgan xabarlarning maksimal ID lari
+            read_inbox_max_id = dialog_meta["read_inbox_max_id"]
+            read_outbox_max_id = dialog_meta["read_outbox_max_id"]
+
+            # Get account user id for bio fetching
+            me = await client.get_me()
+            account_user_id = me.id
+
+            # Xabarlarni olish
+            messages: List[Dict[str, Any]] = []
+            user_ids_to_fetch = set()
+
+            page, has_more = await _history_page(client, chat_id, limit, offset, before_id, after_id)
+            for msg in page:
+                if msg.from_user:
+                    user_ids_to_fetch.add(msg.from_user.id)
+
+                # isRead mantiq:
+                # - outgoing xabar bo'lsa: karshi tomon o'qiganmi?
+                # - incoming xabar bo'lsa: biz o'qiganmizmi?
+                if msg.outgoing:
+                    is_read = msg.id <= read_outbox_max_id
+                else:
+                    is_read = msg.id <= read_inbox_max_id
+
+                # from_user avatari va emoji statusi: URL darhol, yuklash fonda
+                photo_url = None
+                if msg.from_user and getattr(msg.from_user, "photo", None):
+                    file_id = getattr(msg.from_user.photo, "small_file_id", None) or getattr(msg.from_user.photo, "big_file_id", None)
+                    if file_id:
+                        dest = _avatar_file(user_id, account_index, msg.from_user.id)
+                        photo_url = media_url(dest, _prefetch_job(user_id, account_index, dest, file_id=file_id))
+
+                emoji_url = None
+                if msg.from_user and getattr(msg.from_user, "emoji_status", None):
+                    custom_emoji_id = getattr(msg.from_user.emoji_status, 'custom_emoji_id', None)
+                    if custom_emoji_id:
+                        dest = AVATAR_DIR / user_id / str(account_index) / f"{msg.from_user.id}_emoji.webp"
+                        emoji_url = media_url(dest, _prefetch_job(user_id, account_index, dest, custom_emoji_id=custom_emoji_id))
+
+                # Asosiy xabar ma'lumotlari
+                item = {
+                    "id": msg.id,
+                    "date": msg.date.isoformat() if msg.date else None,
+                    "chat_id": chat_id,
+                    "chat_type": dialog_meta["type"],
+                    "is_read": is_read,
+                    "is_outgoing": msg.outgoing,
+                    "from_user": {
+                        "id": msg.from_user.id,
+                        "first_name": msg.from_user.first_name,
+                        "last_name": msg.from_user.last_name,
+                        "username": msg.from_user.username,
+                        "phone_number": getattr(msg.from_user, 'phone_number', None),
+                        "photo_url": photo_url,
+                        "status": str(msg.from_user.status) if msg.from_user.status else None,
+                        "is_premium": getattr(msg.from_user, 'is_premium', False),
+                        "emoji_url": emoji_url,
+                    } if msg.from_user else None,
+                    "text": msg.text,
+                    "caption": msg.caption,
+                    "media_type": None,
+                    "file_id": None,
+                    "file_name": None,
+                    "mime_type": None,
+                    "thumb_url": None,
+                }
+
+                # Media turlarini aniqlash
+                if msg.photo:
+                    item["media_type"] = "photo"
+                    item["file_id"] = msg.photo.file_id
+                    item["file_size"] = format_file_size(msg.photo.file_size)
+
+                elif msg.video:
+                    item["media_type"] = "video"
+                    item["file_name"] = msg.video.file_name
+                    item["mime_type"] = msg.video.mime_type
+                    item["file_id"] = msg.video.file_id
+                    item["file_size"] = format_file_size(msg.video.file_size)
+
+                elif msg.audio:
+                    item["media_type"] = "audio"
+                    item["file_name"] = msg.audio.file_name
+                    item["mime_type"] = msg.audio.mime_type
+                    item["file_id"] = msg.audio.file_id
+                    item["file_size"] = format_file_size(msg.audio.file_size)
+
+                elif msg.document:
+                    item["media_type"] = "document"
+                    item["file_name"] = msg.document.file_name
+                    item["mime_type"] = msg.document.mime_type
+                    item["file_id"] = msg.document.file_id
+                    item["file_size"] = format_file_size(msg.document.file_size)
+
+                elif msg.voice:
+                    item["media_type"] = "voice"
+                    item["mime_type"] = msg.voice.mime_type
+                    item["file_id"] = msg.voice.file_id
+                    item["file_size"] = format_file_size(msg.voice.file_size)
+                    item["duration_seconds"] = msg.voice.duration
+                    minutes = msg.voice.duration // 60
+                    seconds = msg.voice.duration % 60
+                    item["duration_formatted"] = f"{minutes}:{seconds:02d}"
+                    item["waveform"] = list(msg.voice.waveform)
+
+                elif msg.sticker:
+                    item["media_type"] = "sticker"
+                    item["file_id"] = msg.sticker.file_id
+                    item["file_size"] = format_file_size(msg.sticker.file_size)
+
+                elif msg.animation:
+                    item["media_type"] = "animation"
+                    item["file_id"] = msg.animation.file_id
+                    item["file_size"] = format_file_size(msg.animation.file_size)
+
+                elif msg.video_note:
+                    item["media_type"] = "video_note"
+                    item["file_id"] = msg.video_note.file_id
+                    item["file_size"] = format_file_size(msg.video_note.file_size)
+                    item["duration_seconds"] = msg.video_note.duration
+                    minutes = msg.video_note.duration // 60
+                    seconds = msg.video_note.duration % 60
+                    item["duration_formatted"] = f"{minutes}:{seconds:02d}"
+
+                elif msg.location:
+                    item["media_type"] = "location"
+                    item["latitude"] = msg.location.latitude
+                    item["longitude"] = msg.location.longitude
+
+                elif msg.contact:
+                    item["media_type"] = "contact"
+
+                elif msg.poll:
+                    item["media_type"] = "poll"
+
+                elif msg.venue:
+                    item["media_type"] = "venue"
+
+                elif msg.game:
+                    item["media_type"] = "game"
+
+                # Get thumbnail if available
+                thumb_url = thumb_media_url(msg, item["media_type"], user_id, account_index, msg.id) if item["media_type"] in ["photo", "video", "document", "animation", "sticker", "video_note"] else None
+                item["thumb_url"] = thumb_url
+
+                # Check if file is downloaded (indeksdan, papkani skanerlamasdan)
+                item["file_url"] = None
+                if item["file_id"]:
+                    filename = downloads_index.lookup(user_id, account_index, item["file_id"])
+                    if filename:
+                        item["file_url"] = f"/media/downloads/{user_id}/{account_index}/{filename}"
+
+                messages.append(item)
+
+            return messages, has_more
+
+        except PeerIdInvalid:
             raise ValueError(
-                "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
-                "Ehtimol, noto'g'ri sessiya tanlangan."
+                "Telegram ushbu chatni tanimaydi. "
+                "Chat ID noto'g'ri yoki sessiya mos emas."
             )
 
-        chat = dialog_obj.chat
-
-        # O'qilgan xabarlarning maksimal ID lari
-        read_inbox_max_id = getattr(dialog_obj, 'read_inbox_max_id', 0)
-        read_outbox_max_id = getattr(dialog_obj, 'read_outbox_max_id', 0)
+        except Exception as e:
+            raise Exception(f"Xabarlarni olishda xatolik: {str(e)}")
+
+
+EXPORT_FORMATS = {"json": "json", "ndjson": "ndjson"}
+EXPORT_CHUNK_MESSAGES = 200  # shuncha xabar bitta chunk bo'lib yoziladi/yuboriladi
+
+
+def _export_record(msg) -> Dict[str, Any]:
+    """Eksport uchun soddalashtirilgan xabar: {id, from, text, type}."""
+    # Xabar matnini olish (text yoki caption)
+    message_text = msg.text or msg.caption or ""
+
+    # Xabar turini aniqlash
+    message_type = "text"
+    if msg.photo:
+        message_type = "photo"
+    elif msg.video:
+        message_type = "video"
+    elif msg.audio:
+        message_type = "audio"
+    elif msg.voice:
+        message_type = "voice"
+    elif msg.document:
+        message_type = "document"
+    elif msg.sticker:
+        message_type = "sticker"
+    elif msg.animation:
+        message_type = "animation"
+    elif msg.video_note:
+        message_type = "video_note"
+    elif msg.location:
+        message_type = "location"
+    elif msg.contact:
+        message_type = "contact"
+    elif msg.poll:
+        message_type = "poll"
+    elif msg.venue:
+        message_type = "venue"
+    elif msg.game:
+        message_type = "game"
+
+    # Xabarni kim yozganini aniqlash
+    if msg.outgoing:
+        from_name = "me"
+    elif msg.from_user:
+        from_name = " ".join(filter(None, [msg.from_user.first_name, msg.from_user.last_name])) or msg.from_user.username or "Unknown"
+    else:
+        from_name = "Unknown"
 
-        # Get account user id for bio fetching
-        me = await client.get_me()
-        account_user_id = me.id
+    return {
+        "id": msg.id,
+        "from": from_name,
+        "text": message_text,
+        "type": message_type,
+    }
 
-        # Xabarlarni olish
-        messages: List[Dict[str, Any]] = []
-        need = limit + offset
-        skipped = 0
-        user_ids_to_fetch = set()
 
-        async for msg in client.get_chat_history(chat.id, limit=need):
-            # Offset qo'llash
-            if skipped < offset:
-                skipped += 1
-                continue
+def _export_line(record: Dict[str, Any], fmt: str, first: bool) -> str:
+    line = json.dumps(record, ensure_ascii=False)
+    if fmt == "json":
+        return ("\n  " if first else ",\n  ") + line
+    return line + "\n"
 
-            if msg.from_user:
-                user_ids_to_fetch.add(msg.from_user.id)
 
-            # isRead mantiq:
-            # - outgoing xabar bo'lsa: karshi tomon o'qiganmi?
-            # - incoming xabar bo'lsa: biz o'qiganmizmi?
-            if msg.outgoing:
-                is_read = msg.id <= read_outbox_max_id
-            else:
-                is_read = msg.id <= read_inbox_max_id
+def _export_tail(fmt: str, total: int) -> str:
+    if fmt == "json":
+        return "\n]\n" if total else "]\n"
+    return ""
 
-            # from_user uchun avatar yuklab olish
-            photo_url = None
-            if msg.from_user and getattr(msg.from_user, "photo", None):
-                dest = _avatar_file(user_id, account_index, msg.from_user.id)
-                if not dest.exists():
-                    file_id = getattr(msg.from_user.photo, "small_file_id", None) or getattr(msg.from_user.photo, "big_file_id", None)
-                    if file_id:
-                        try:
-                            data = await client.download_media(file_id, in_memory=True)
-                            if data:
-                                dest.parent.mkdir(parents=True, exist_ok=True)
-                                with open(dest, 'wb') as f:
-                                    f.write(data.getvalue())
-                        except Exception:
-                            pass
-                if dest.exists():
-                    photo_url = f"/media/avatars/{user_id}/{account_index}/{msg.from_user.id}.jpg"
 
-            # emoji_status uchun emoji yuklab olish
-            emoji_url = None
-            if msg.from_user and getattr(msg.from_user, "emoji_status", None):
-                custom_emoji_id = getattr(msg.from_user.emoji_status, 'custom_emoji_id', None)
-                if custom_emoji_id:
-                    dest = AVATAR_DIR / user_id / str(account_index) / f"{msg.from_user.id}_emoji.webp"
-                    if not dest.exists():
-                        try:
-                            stickers = await client.get_custom_emoji_stickers([custom_emoji_id])
-                            if stickers and stickers[0]:
-                                sticker = stickers[0]
-                                file_id = sticker.file_id
-                                data = await client.download_media(file_id, in_memory=True)
-                                if data:
-                                    dest.parent.mkdir(parents=True, exist_ok=True)
-                                    with open(dest, 'wb') as f:
-                                        f.write(data.getvalue())
-                        except Exception:
-                            pass
-                    if dest.exists():
-                        emoji_url = f"/media/avatars/{user_id}/{account_index}/{msg.from_user.id}_emoji.webp"
-
-            # Asosiy xabar ma'lumotlari
-            item = {
-                "id": msg.id,
-                "date": msg.date.isoformat() if msg.date else None,
-                "chat_id": chat.id,
-                "chat_type": chat.type.value if hasattr(chat.type, 'value') else str(chat.type),
-                "is_read": is_read,
-                "is_outgoing": msg.outgoing,
-                "from_user": {
-                    "id": msg.from_user.id,
-                    "first_name": msg.from_user.first_name,
-                    "last_name": msg.from_user.last_name,
-                    "username": msg.from_user.username,
-                    "phone_number": getattr(msg.from_user, 'phone_number', None),
-                    "photo_url": photo_url,
-                    "status": str(msg.from_user.status) if msg.from_user.status else None,
-                    "is_premium": getattr(msg.from_user, 'is_premium', False),
-                    "emoji_url": emoji_url,
-                } if msg.from_user else None,
-                "text": msg.text,
-                "caption": msg.caption,
-                "media_type": None,
-                "file_id": None,
-                "file_name": None,
-                "mime_type": None,
-                "thumb_url": None,
-            }
-
-            # Media turlarini aniqlash
-            if msg.photo:
-                item["media_type"] = "photo"
-                item["file_id"] = msg.photo.file_id
-                item["file_size"] = format_file_size(msg.photo.file_size)
-
-            elif msg.video:
-                item["media_type"] = "video"
-                item["file_name"] = msg.video.file_name
-                item["mime_type"] = msg.video.mime_type
-                item["file_id"] = msg.video.file_id
-                item["file_size"] = format_file_size(msg.video.file_size)
-
-            elif msg.audio:
-                item["media_type"] = "audio"
-                item["file_name"] = msg.audio.file_name
-                item["mime_type"] = msg.audio.mime_type
-                item["file_id"] = msg.audio.file_id
-                item["file_size"] = format_file_size(msg.audio.file_size)
-
-            elif msg.document:
-                item["media_type"] = "document"
-                item["file_name"] = msg.document.file_name
-                item["mime_type"] = msg.document.mime_type
-                item["file_id"] = msg.document.file_id
-                item["file_size"] = format_file_size(msg.document.file_size)
-
-            elif msg.voice:
-                item["media_type"] = "voice"
-                item["mime_type"] = msg.voice.mime_type
-                item["file_id"] = msg.voice.file_id
-                item["file_size"] = format_file_size(msg.voice.file_size)
-                item["duration_seconds"] = msg.voice.duration
-                minutes = msg.voice.duration // 60
-                seconds = msg.voice.duration % 60
-                item["duration_formatted"] = f"{minutes}:{seconds:02d}"
-                item["waveform"] = list(msg.voice.waveform)
-
-            elif msg.sticker:
-                item["media_type"] = "sticker"
-                item["file_id"] = msg.sticker.file_id
-                item["file_size"] = format_file_size(msg.sticker.file_size)
-
-            elif msg.animation:
-                item["media_type"] = "animation"
-                item["file_id"] = msg.animation.file_id
-                item["file_size"] = format_file_size(msg.animation.file_size)
-
-            elif msg.video_note:
-                item["media_type"] = "video_note"
-                item["file_id"] = msg.video_note.file_id
-                item["file_size"] = format_file_size(msg.video_note.file_size)
-                item["duration_seconds"] = msg.video_note.duration
-                minutes = msg.video_note.duration // 60
-                seconds = msg.video_note.duration % 60
-                item["duration_formatted"] = f"{minutes}:{seconds:02d}"
-
-            elif msg.location:
-                item["media_type"] = "location"
-                item["latitude"] = msg.location.latitude
-                item["longitude"] = msg.location.longitude
-
-            elif msg.contact:
-                item["media_type"] = "contact"
-
-            elif msg.poll:
-                item["media_type"] = "poll"
-
-            elif msg.venue:
-                item["media_type"] = "venue"
-
-            elif msg.game:
-                item["media_type"] = "game"
-
-            # Get thumbnail if available
-            thumb_url = await get_thumb_url(msg, item["media_type"], user_id, account_index, msg.id, client) if item["media_type"] in ["photo", "video", "document", "animation", "sticker", "video_note"] else None
-            item["thumb_url"] = thumb_url
-
-            # Check if file is downloaded
-            item["file_url"] = None
-            if item["file_id"]:
-                downloads_dir = MEDIA_ROOT / "downloads" / user_id / str(account_index)
-                if downloads_dir.exists():
-                    import os
-                    for filename in os.listdir(str(downloads_dir)):
-                        if filename.startswith(item["file_id"] + "."):
-                            item["file_url"] = f"/media/downloads/{user_id}/{account_index}/{filename}"
-                            break
-
-            messages.append(item)
+async def stream_chat_export(
+    user_id: str,
+    account_index: int,
+    chat_id: int,
+    fmt: str = "json",
+    counters: Optional[Dict[str, int]] = None,
+):
+    """
+    Chat tarixini kelish tartibida matn chunklari sifatida beradi (xotirada to'planmaydi).
 
-            # Limit yetganda to'xtatish
-            if len(messages) >= limit:
-                break
+    ``fmt="json"`` - oqimli JSON massiv, ``fmt="ndjson"`` - har qatorda bitta xabar.
+    Birinchi chunk chat tekshiruvidan keyin beriladi, shuning uchun ``ValueError``
+    birinchi ``__anext__`` da chiqadi. ``counters["total_messages"]`` yozilgan xabarlar soni.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Noma'lum eksport formati: {fmt}")
+    counters = counters if counters is not None else {}
+    counters["total_messages"] = 0
 
+    async with telegram_session(user_id, account_index, "export_chat") as client:
+        try:
+            # Chat mavjudligini tekshirish (dialog indeksi orqali)
+            dialog_meta = await dialog_index.lookup(client, user_id, account_index, chat_id)
+        except PeerIdInvalid:
+            dialog_meta = None
+        if not dialog_meta:
+            raise ValueError(
+                "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
+                "Ehtimol, noto'g'ri sessiya tanlangan."
+            )
 
-        return messages
+        yield "[" if fmt == "json" else ""
 
-    except PeerIdInvalid:
-        raise ValueError(
-            "Telegram ushbu chatni tanimaydi. "
-            "Chat ID noto'g'ri yoki sessiya mos emas."
-        )
+        chunk: List[str] = []
+        async for msg in client.get_chat_history(chat_id, limit=None):
+            chunk.append(_export_line(_export_record(msg), fmt, first=counters["total_messages"] == 0))
+            counters["total_messages"] += 1
+            if len(chunk) >= EXPORT_CHUNK_MESSAGES:
+                yield "".join(chunk)
+                chunk = []
 
-    except Exception as e:
-        raise Exception(f"Xabarlarni olishda xatolik: {str(e)}")
+        chunk.append(_export_tail(fmt, counters["total_messages"]))
+        if any(chunk):
+            yield "".join(chunk)
 
 
-async def export_chat_messages(user_id: str, account_index: int, chat_id: int) -> Dict[str, Any]:
+async def export_chat_messages(user_id: str, account_index: int, chat_id: int, fmt: str = "json") -> Dict[str, Any]:
     """
-    Chatdan barcha xabarlarni eksport qilish (boshidan oxirigacha).
+    Chatdan barcha xabarlarni diskka oqimli eksport qilish (boshidan oxirigacha).
 
     Args:
         user_id: Foydalanuvchi ID
         account_index: Telegram akkaunti index
         chat_id: Chat ID
+        fmt: "json" (massiv) yoki "ndjson"
 
     Returns:
-        Eksport ma'lumotlari va soddalashtirilgan xabarlar ro'yxati JSON formatida:
-        [
-          { "from": "Ali", "text": "Salom", "type": "text" },
-          { "from": "me", "text": "Salom 👋", "type": "text" }
-        ]
+        Fayl URLi va xabarlar soni. Fayldagi har bir xabar:
+        { "id": 123, "from": "Ali", "text": "Salom", "type": "text" }
     """
-    client = await get_client(user_id, account_index)
+    export_dir = MEDIA_ROOT / "exports" / user_id / str(account_index)
+    timestamp = int(time.time())
+    filename = f"chat_{chat_id}_{timestamp}.{EXPORT_FORMATS.get(fmt, 'json')}"
+    filepath = export_dir / filename
+    # Tugallanmagan eksport /media orqali berilmasligi uchun avval .part ga yoziladi
+    tmp_path = export_dir / f"{filename}.part"
+    counters: Dict[str, int] = {}
 
     try:
-        # Dialogni topish
-        dialog_obj = None
-        async for d in client.get_dialogs():
-            if d.chat.id == chat_id:
-                dialog_obj = d
-                break
-
-        if not dialog_obj:
-            raise ValueError(
-                "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
-                "Ehtimol, noto'g'ri sessiya tanlangan."
-            )
-
-        chat = dialog_obj.chat
-
-        # Get account user id
-        me = await client.get_me()
-        account_user_id = me.id
-
-        # Xabarlarni olish (barchasi, limit yo'q)
-        messages: List[Dict[str, str]] = []
-
-        async for msg in client.get_chat_history(chat.id, limit=None):
-            # Xabar matnini olish (text yoki caption)
-            message_text = msg.text or msg.caption or ""
-            
-            # Xabar turini aniqlash
-            message_type = "text"
-            if msg.photo:
-                message_type = "photo"
-            elif msg.video:
-                message_type = "video"
-            elif msg.audio:
-                message_type = "audio"
-            elif msg.voice:
-                message_type = "voice"
-            elif msg.document:
-                message_type = "document"
-            elif msg.sticker:
-                message_type = "sticker"
-            elif msg.animation:
-                message_type = "animation"
-            elif msg.video_note:
-                message_type = "video_note"
-            elif msg.location:
-                message_type = "location"
-            elif msg.contact:
-                message_type = "contact"
-            elif msg.poll:
-                message_type = "poll"
-            elif msg.venue:
-                message_type = "venue"
-            elif msg.game:
-                message_type = "game"
-            
-            # Xabarni kim yozganini aniqlash
-            if msg.outgoing:
-                from_name = "me"
-            elif msg.from_user:
-                from_name = " ".join(filter(None, [msg.from_user.first_name, msg.from_user.last_name])) or msg.from_user.username or "Unknown"
-            else:
-                from_name = "Unknown"
-            
-            # Soddalashtirilgan format
-            messages.append({
-                "from": from_name,
-                "text": message_text,
-                "type": message_type
-            })
+        known_dirs.ensure(export_dir)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            async for chunk in stream_chat_export(user_id, account_index, chat_id, fmt, counters):
+                f.write(chunk)
+        tmp_path.replace(filepath)
 
-        # Export qilingan ma'lumotlarni diskka saqlash
-        export_dir = MEDIA_ROOT / "exports" / user_id / str(account_index)
-        export_dir.mkdir(parents=True, exist_ok=True)
-        
-        # JSON faylni diskka saqlash
-        import time
-        timestamp = int(time.time())
-        filename = f"chat_{chat_id}_{timestamp}.json"
-        filepath = export_dir / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
-        
-        # Fayl URLini va soddalashtirilgan xabarlarni qaytarish
         return {
             "ok": True,
             "file_url": f"/media/exports/{user_id}/{account_index}/{filename}",
             "file_path": str(filepath),
-            "total_messages": len(messages),
+            "total_messages": counters["total_messages"],
             "filename": filename,
-            "messages": messages
+            "format": fmt,
+            "size": filepath.stat().st_size,
         }
 
+    except ValueError:
+        raise
+
     except PeerIdInvalid:
         raise ValueError(
             "Telegram ushbu chatni tanimaydi. "
@@ -963,4 +1145,138 @@ async def export_chat_messages(user_id: str, account_index: int, chat_id: int) -
         )
 
     except Exception as e:
-        raise Exception(f"Chat eksport qilishda xatolik: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Chat eksport qilishda xatolik: {str(e)}")
+
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+# Inkremental eksport: (user, account, chat) bo'yicha high_water va segmentlar
+export_store = IncrementalExportStore(MEDIA_ROOT / "exports", dirs=known_dirs)
+
+
+async def export_chat_incremental(user_id: str, account_index: int, chat_id: int) -> Dict[str, Any]:
+    """
+    Faqat oldingi eksportdan keyingi (id > high_water) xabarlarni olib yangi segment qo'shish.
+
+    ``get_chat_history`` yangisidan eskisiga qarab yuradi, shuning uchun high_water ga
+    yetganda to'xtaymiz - narx yangi xabarlar soniga bog'liq, chat hajmiga emas.
+    """
+    async with export_store.lock(user_id, account_index, chat_id):
+        high_water = export_store.manifest(user_id, account_index, chat_id)["high_water"]
+        part = export_store.segment_part(user_id, account_index, chat_id)
+        count = 0
+        min_id = max_id = None
+
+        try:
+            async with telegram_session(user_id, account_index, "export_incremental") as client:
+                dialog_meta = await dialog_index.lookup(client, user_id, account_index, chat_id)
+                if not dialog_meta:
+                    raise ValueError(
+                        "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
+                        "Ehtimol, noto'g'ri sessiya tanlangan."
+                    )
+                with open(part, "w", encoding="utf-8") as f:
+                    async for msg in client.get_chat_history(chat_id):
+                        if msg.id <= high_water:
+                            break
+                        f.write(_export_line(_export_record(msg), "ndjson", first=count == 0))
+                        count += 1
+                        max_id = max_id or msg.id
+                        min_id = msg.id
+        except PeerIdInvalid:
+            part.unlink(missing_ok=True)
+            raise ValueError(
+                "Telegram ushbu chatni tanimaydi. "
+                "Chat ID noto'g'ri yoki sessiya mos emas."
+            )
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+
+        manifest = export_store.commit_segment(user_id, account_index, chat_id, part, count, min_id, max_id)
+        segment_url = None
+        if count:
+            segment_url = export_store.url_for(part.with_name(f"seg_{max_id}.ndjson"), MEDIA_ROOT)
+        return {
+            "ok": True,
+            "mode": "incremental",
+            "new_messages": count,
+            "total_messages": manifest["total_messages"],
+            "high_water": manifest["high_water"],
+            "segments": len(manifest["segments"]),
+            "segment_url": segment_url,
+        }
+
+
+async def build_merged_export(user_id: str, account_index: int, chat_id: int, fmt: str = "json") -> Dict[str, Any]:
+    """Inkremental segmentlardan bitta to'liq eksport faylini yig'ish (fayl ishi threadda)."""
+    async with export_store.lock(user_id, account_index, chat_id):
+        path, manifest = await asyncio.to_thread(export_store.build_merged, user_id, account_index, chat_id, fmt)
+    return {
+        "ok": True,
+        "file_url": export_store.url_for(path, MEDIA_ROOT),
+        "total_messages": manifest["total_messages"],
+        "high_water": manifest["high_water"],
+        "segments": len(manifest["segments"]),
+        "format": fmt,
+        "size": path.stat().st_size,
+    }
+
+
+async def run_export_job(job: ExportJob, save) -> None:
+    """
+    Export job workeri: xabarlarni .part faylga yozadi va har EXPORT_CHECKPOINT_MESSAGES
+    xabarda (last_message_id, bytes_written) checkpointini saqlaydi. Checkpoint bo'lsa
+    fayl o'sha joyigacha qirqiladi va tarix ``offset_id`` dan davom ettiriladi.
+    """
+    export_dir = known_dirs.ensure(MEDIA_ROOT / "exports" / job.user_id / str(job.account_index))
+    filepath = export_dir / job.filename
+    tmp_path = export_dir / f"{job.filename}.part"
+
+    resume = bool(job.last_message_id) and tmp_path.exists() and tmp_path.stat().st_size >= job.bytes_written
+    if resume:
+        job.processed = job.checkpoint_processed
+    else:
+        job.processed = job.checkpoint_processed = job.bytes_written = 0
+        job.last_message_id = None
+
+    try:
+        async with telegram_session(job.user_id, job.account_index, "export_job") as client:
+            dialog_meta = await dialog_index.lookup(client, job.user_id, job.account_index, job.chat_id)
+            if not dialog_meta:
+                raise ValueError(
+                    "Chat topilmadi yoki ushbu akkaunt uchun mavjud emas. "
+                    "Ehtimol, noto'g'ri sessiya tanlangan."
+                )
+
+            with open(tmp_path, "r+b" if resume else "wb") as f:
+                if resume:
+                    # Oxirgi checkpointdan keyin yozilgan qismni tashlab yuboramiz
+                    f.truncate(job.bytes_written)
+                    f.seek(job.bytes_written)
+                elif job.format == "json":
+                    f.write(b"[")
+
+                async for msg in client.get_chat_history(job.chat_id, offset_id=job.last_message_id or 0):
+                    f.write(_export_line(_export_record(msg), job.format, first=job.processed == 0).encode("utf-8"))
+                    job.processed += 1
+                    if job.processed % EXPORT_CHECKPOINT_MESSAGES == 0:
+                        f.flush()
+                        job.last_message_id = msg.id
+                        job.checkpoint_processed = job.processed
+                        job.bytes_written = f.tell()
+                        await save()
+
+                f.write(_export_tail(job.format, job.processed).encode("utf-8"))
+    except asyncio.CancelledError:
+        # Foydalanuvchi bekor qilgan bo'lsa qisman fayl kerak emas; shutdownda esa davom etish uchun qoladi
+        if job.status == "cancelled":
+            tmp_path.unlink(missing_ok=True)
+        raise
+
+    tmp_path.replace(filepath)
+    job.file_url = f"/media/exports/{job.user_id}/{job.account_index}/{job.filename}"
+
+
+export_jobs = ExportJobRunner(MEDIA_ROOT / "exports", run_export_job, per_account=EXPORT_JOBS_PER_ACCOUNT, dirs=known_dirs)
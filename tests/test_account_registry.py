@@ -0,0 +1,67 @@
+import asyncio
+import time
+from src.services.ttl_cache import TTLCache
+from src.services.account_registry import AccountRegistry
+
+
+class TestTTLCache:
+    """Test bounded LRU + TTL cache"""
+
+    def test_lru_eviction(self):
+        """Oldest untouched key is evicted when maxsize is exceeded"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired_entries_are_dropped(self):
+        """Entries older than ttl are treated as misses"""
+        cache = TTLCache(maxsize=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert len(cache) == 0
+
+
+class TestAccountRegistry:
+    """Test cached account validation"""
+
+    def test_lookup_is_cached_until_invalidated(self):
+        """Loader runs once per user until login/logout invalidates it"""
+        calls = []
+
+        async def loader(user_id):
+            calls.append(user_id)
+            return [{"index": "1", "telegram_id": 10}]
+
+        async def scenario():
+            registry = AccountRegistry(loader, ttl=60)
+            assert (await registry.get_account("u1", 1))["telegram_id"] == 10
+            assert await registry.get_account("u1", 2) is None
+            assert calls == ["u1"]
+            registry.invalidate("u1")
+            await registry.get_account("u1", 1)
+            assert calls == ["u1", "u1"]
+
+        asyncio.run(scenario())
+
+    def test_concurrent_misses_share_one_load(self):
+        """Parallel validations for one user trigger a single loader call"""
+        calls = []
+
+        async def loader(user_id):
+            calls.append(user_id)
+            await asyncio.sleep(0.01)
+            return [{"index": "1", "telegram_id": 10}]
+
+        async def scenario():
+            registry = AccountRegistry(loader, ttl=60)
+            await asyncio.gather(*[registry.get_account("u1", 1) for _ in range(5)])
+            assert calls == ["u1"]
+
+        asyncio.run(scenario())
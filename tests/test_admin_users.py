@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.routers.telegram import get_users_with_telegrams
+from src.services import telegram_service
+from src.services.account_registry import AccountRegistry
+from src.services.profile_store import ProfileSnapshotStore
+
+
+def fake_users(n):
+    return [SimpleNamespace(id=f"user-{i}", email=f"u{i}@example.com", phone=None) for i in range(n)]
+
+
+class TestAdminUsersWithTelegrams:
+    """Test paginated admin listing with bounded Telegram work"""
+
+    def test_paginates_and_limits_concurrency(self, tmp_path):
+        """Supabase is asked for one page; profile loads share a global limit and are cached"""
+        users = fake_users(5)
+        for u in users:
+            d = tmp_path / u.id
+            d.mkdir()
+            for idx in (1, 2, 3):
+                (d / f"{idx}.session").touch()
+
+        pages = []
+
+        def list_users(page=None, per_page=None):
+            pages.append((page, per_page))
+            return users[(page - 1) * per_page: page * per_page]
+
+        active = 0
+        peak = 0
+        calls = 0
+
+        async def profile_from_session(user_id, account_index):
+            nonlocal active, peak, calls
+            active += 1
+            calls += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return {"index": str(account_index), "telegram_id": account_index}
+
+        async def main():
+            return [
+                await get_users_with_telegrams(page=1, per_page=4),
+                await get_users_with_telegrams(page=2, per_page=4),
+                await get_users_with_telegrams(page=1, per_page=4),
+            ]
+
+        registry = AccountRegistry(telegram_service.list_user_telegram_profiles, ttl=60)
+        store = ProfileSnapshotStore(tmp_path, telegram_service.load_profile)
+        with patch("src.config.supabase_service.auth.admin.list_users", side_effect=list_users), \
+             patch.object(telegram_service, "SESS_ROOT", tmp_path), \
+             patch.object(telegram_service, "profile_from_session", profile_from_session), \
+             patch.object(telegram_service, "profile_semaphore", asyncio.Semaphore(2)), \
+             patch.object(telegram_service, "account_registry", registry), \
+             patch.object(telegram_service, "profile_store", store), \
+             patch("src.routers.telegram.account_registry", registry):
+            first, last, again = asyncio.run(main())
+
+        assert pages == [(1, 4), (2, 4), (1, 4)]
+        assert [u["id"] for u in first["users"]] == ["user-0", "user-1", "user-2", "user-3"]
+        assert first["next_page"] == 2 and last["next_page"] is None
+        assert len(first["users"][0]["telegram_accounts"]) == 3
+        assert peak == 2
+        assert calls == 15  # third request is served from the registry cache
+        assert again["users"] == first["users"]
@@ -0,0 +1,96 @@
+import time
+import jwt
+from collections import deque
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+from src.middleware import audit_logging
+from src.middleware.audit_logging import AuditLoggingMiddleware
+from src.services import supabase_service
+from src.services.supabase_gateway import supabase_gateway
+from src.services.ttl_cache import TTLCache
+
+SECRET = "test-secret"
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(AuditLoggingMiddleware)
+
+    @app.post("/auth/logout")
+    async def logout():
+        return {"ok": True}
+
+    @app.post("/start_login")
+    async def start_login(authorization: str = Header(..., alias="Authorization")):
+        user = await supabase_gateway.get_user_from_token(authorization)
+        return {"user_id": user.id}
+
+    @app.get("/me/chats/{chat_id}/messages")
+    async def messages(chat_id: int):
+        return {"ok": True}
+
+    return app
+
+
+def bearer(sub="user-1"):
+    token = jwt.encode({"sub": sub, "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestAuditMiddleware:
+    """Test audit middleware does no Supabase work on the request path"""
+
+    def setup_method(self):
+        self.logs = deque(maxlen=100)
+        self.patches = [
+            patch.object(audit_logging, "audit_logs_memory", self.logs),
+            patch.object(supabase_service, "user_cache", TTLCache(maxsize=100, ttl=60)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_unaudited_route_skips_token_lookup(self):
+        """Polling endpoints never touch Supabase or the audit log"""
+        with patch("src.config.supabase.auth.get_user", side_effect=AssertionError("network")):
+            response = TestClient(make_app()).get("/me/chats/1/messages", headers={"Authorization": "Bearer x"})
+        assert response.status_code == 200
+        assert len(self.logs) == 0
+
+    def test_user_resolved_from_local_jwt(self):
+        """Audited route gets user_id from the verified token without a network call"""
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", SECRET), \
+             patch("src.config.supabase.auth.get_user", side_effect=AssertionError("network")):
+            response = TestClient(make_app()).post("/auth/logout", headers=bearer("user-7"))
+        assert response.status_code == 200
+        assert [(e["action"], e["user_id"]) for e in self.logs] == [("logout", "user-7")]
+
+    def test_remote_lookup_happens_after_response(self):
+        """Without local verification the user is resolved in the background"""
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", None), \
+             patch("src.config.supabase.auth.get_user", return_value=SimpleNamespace(user=SimpleNamespace(id="user-9"))), \
+             TestClient(make_app()) as client:
+            response = client.post("/auth/logout", headers={"Authorization": "Bearer opaque"})
+            assert response.status_code == 200
+            deadline = time.time() + 2
+            while not self.logs and time.time() < deadline:
+                time.sleep(0.01)
+        assert [(e["action"], e["user_id"]) for e in self.logs] == [("logout", "user-9")]
+
+    def test_handler_lookup_is_reused(self):
+        """When the handler already resolved the token remotely, the middleware reads it from the cache"""
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", None), \
+             patch("src.config.supabase.auth.get_user",
+                   return_value=SimpleNamespace(user=SimpleNamespace(id="user-9"))) as get_user, \
+             patch.object(AuditLoggingMiddleware, "_resolve_and_store", side_effect=AssertionError("remote")) as resolve, \
+             TestClient(make_app()) as client:
+            response = client.post("/start_login", headers={"Authorization": "Bearer opaque"})
+        assert response.json() == {"user_id": "user-9"}
+        assert get_user.call_count == 1
+        assert resolve.call_count == 0
+        assert [(e["action"], e["user_id"]) for e in self.logs] == [("file_upload", "user-9")]
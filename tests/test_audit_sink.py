@@ -0,0 +1,108 @@
+import asyncio
+from postgrest.exceptions import APIError
+from src.services.audit_sink import AuditSink, audit_row, is_row_rejection
+
+
+def entry(i=0, **kw):
+    return {"action": "login", "route": "/auth/login", "http_method": "POST", "status": 200, "n": i, **kw}
+
+
+class TestAuditSink:
+    """Test batched, bounded audit log persistence"""
+
+    def test_batches_by_size(self):
+        """A full batch wakes the worker; the remainder is written in a smaller batch"""
+        batches = []
+
+        async def writer(batch):
+            batches.append([e["n"] for e in batch])
+
+        async def main():
+            sink = AuditSink(writer, batch_size=3, flush_interval=10)
+            sink.start()
+            for i in range(7):
+                sink.submit(entry(i))
+            await asyncio.sleep(0.05)
+            await sink.close()
+            return sink.stats()
+
+        stats = asyncio.run(main())
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+        assert stats["written"] == 7 and stats["batches"] == 3 and stats["queued"] == 0
+
+    def test_flushes_partial_batch_on_interval(self):
+        """Entries are written after flush_interval even if the batch is not full"""
+        written = []
+
+        async def writer(batch):
+            written.extend(batch)
+
+        async def main():
+            sink = AuditSink(writer, batch_size=100, flush_interval=0.05)
+            sink.start()
+            sink.submit(entry(1))
+            sink.submit(entry(2))
+            await asyncio.sleep(0.2)
+            assert len(written) == 2
+            await sink.close()
+
+        asyncio.run(main())
+
+    def test_backpressure_drops_and_retries_fail(self):
+        """A full queue drops new entries; a failing writer is retried then counted as failed"""
+        calls = []
+
+        async def writer(batch):
+            calls.append(len(batch))
+            raise RuntimeError("db down")
+
+        async def main():
+            sink = AuditSink(writer, batch_size=10, max_queue=2, max_retries=2, retry_delay=0)
+            assert sink.submit(entry(1)) and sink.submit(entry(2))
+            assert not sink.submit(entry(3))
+            await sink.flush()
+            return sink.stats()
+
+        stats = asyncio.run(main())
+        assert stats["dropped"] == 1
+        # transport xatosi: paket bo'linmaydi, butunligicha qayta yuboriladi
+        assert calls == [2, 2, 2]
+        assert stats["retries"] == 2 and stats["failed"] == 2 and stats["written"] == 0
+
+    def test_bad_row_does_not_drop_batch(self):
+        """A failing bulk insert falls back to single rows so only the bad row is lost"""
+        calls = []
+
+        async def writer(batch):
+            calls.append(len(batch))
+            if any(e.get("bad") for e in batch):
+                raise APIError({"code": "23503", "message": "violates foreign key constraint"})
+
+        async def main():
+            sink = AuditSink(writer, batch_size=10, max_retries=1, retry_delay=0)
+            for i in range(5):
+                sink.submit(entry(i, bad=(i == 2)))
+            await sink.flush()
+            return sink.stats()
+
+        stats = asyncio.run(main())
+        assert calls == [5, 1, 1, 1, 1, 1, 1]
+        assert stats["written"] == 4 and stats["failed"] == 1
+        assert stats["split_batches"] == 1 and stats["retries"] == 1
+
+    def test_row_rejections_are_classified(self):
+        """Only constraint/4xx errors split a batch; outages keep it whole"""
+        assert is_row_rejection(APIError({"code": "23514", "message": "check"}))
+        assert is_row_rejection(APIError({"code": "22P02", "message": "invalid uuid"}))
+        assert is_row_rejection(APIError({"code": "400", "message": "bad request"}))
+        assert not is_row_rejection(APIError({"code": "503", "message": "unavailable"}))
+        assert not is_row_rejection(APIError({"code": "429", "message": "slow down"}))
+        assert not is_row_rejection(TimeoutError("read timeout"))
+
+    def test_audit_row_matches_table_types(self):
+        """Values that would break uuid/inet columns are stored as NULL"""
+        row = audit_row(entry(user_id="not-a-uuid", ip_address="testclient", timestamp="2026-01-01T00:00:00Z"))
+        assert row["user_id"] is None and row["ip_address"] is None
+        assert "n" not in row and "id" not in row
+        row = audit_row(entry(user_id="0b6f1f9e-8a3c-4c43-9d6b-2f1c1d2e3f40", ip_address="10.0.0.1"))
+        assert row["user_id"] == "0b6f1f9e-8a3c-4c43-9d6b-2f1c1d2e3f40" and row["ip_address"] == "10.0.0.1"
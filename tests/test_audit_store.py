@@ -0,0 +1,78 @@
+import random
+from datetime import datetime, timedelta
+from src.services.audit_store import AuditStore
+
+BASE = datetime(2026, 1, 1)
+
+
+def ts(seconds):
+    return (BASE + timedelta(seconds=seconds)).isoformat() + "Z"
+
+
+def legacy_query(entries, user_id=None, action=None, start=None, end=None, limit=100, offset=0):
+    logs = list(entries)
+    if user_id:
+        logs = [e for e in logs if e.get("user_id") == user_id]
+    if action:
+        logs = [e for e in logs if e.get("action") == action]
+    if start:
+        logs = [e for e in logs if e.get("timestamp", "") >= start]
+    if end:
+        logs = [e for e in logs if e.get("timestamp", "") <= end]
+    logs.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
+    return len(logs), logs[offset:offset + limit]
+
+
+class TestAuditStore:
+    """Test indexed in-memory audit log store"""
+
+    def test_matches_legacy_filtering(self):
+        """Every filter combination returns the same page as the list-based query"""
+        rnd = random.Random(7)
+        store = AuditStore(maxlen=500)
+        kept = []
+        for i in range(800):
+            e = {"timestamp": ts(i), "user_id": rnd.choice(["u1", "u2", "u3", None]),
+                 "action": rnd.choice(["login", "logout", "create"]), "n": i}
+            store.append(e)
+            kept.append(e)
+        kept = kept[-500:]
+        assert len(store) == 500
+        assert list(store) == kept
+
+        for user_id in (None, "u1", "u9"):
+            for action in (None, "login"):
+                for start, end in ((None, None), (ts(400), None), (None, ts(650)), (ts(500), ts(520))):
+                    for limit, offset in ((100, 0), (7, 13), (50, 490)):
+                        expected = legacy_query(kept, user_id, action, start, end, limit, offset)
+                        assert store.query(user_id, action, start, end, limit, offset) == expected
+
+    def test_out_of_order_entry_is_placed_by_timestamp(self):
+        """Entries stored late (background user lookup) still sort by their timestamp"""
+        store = AuditStore(maxlen=10)
+        store.append({"timestamp": ts(1), "user_id": "u1", "action": "login"})
+        store.append({"timestamp": ts(3), "user_id": "u1", "action": "login"})
+        store.append({"timestamp": ts(2), "user_id": "u2", "action": "logout"})
+        total, logs = store.query()
+        assert total == 3
+        assert [e["timestamp"] for e in logs] == [ts(3), ts(2), ts(1)]
+
+    def test_eviction_keeps_indexes_consistent(self):
+        """Evicted entries disappear from the user/action indexes"""
+        store = AuditStore(maxlen=2)
+        store.append({"timestamp": ts(1), "user_id": "u1", "action": "login"})
+        store.append({"timestamp": ts(2), "user_id": "u2", "action": "logout"})
+        store.append({"timestamp": ts(3), "user_id": "u2", "action": "logout"})
+        assert store.query(user_id="u1") == (0, [])
+        assert store.query(action="logout")[0] == 2
+        assert store.stats()["users"] == 1
+
+    def test_long_running_store_compacts(self):
+        """After many evictions the store still answers like a bounded deque"""
+        store = AuditStore(maxlen=100)
+        entries = [{"timestamp": ts(i), "user_id": f"u{i % 3}", "action": "login"} for i in range(5000)]
+        for e in entries:
+            store.append(e)
+        assert list(store) == entries[-100:]
+        assert store.query(user_id="u1", limit=5) == legacy_query(entries[-100:], user_id="u1", limit=5)
+        assert len(store._order.keys) < 2000
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+from pyrogram.errors import PeerIdInvalid
+from pyrogram.file_id import FileId, FileType, ThumbnailSource
+from src.services import telegram_service
+from src.services.blob_store import BlobStore, blob_key
+from src.services.ttl_cache import TTLCache
+
+
+def chat_photo_id(source, reference=b"r"):
+    return FileId(
+        file_type=FileType.CHAT_PHOTO, dc_id=2, media_id=77, access_hash=0, file_reference=reference,
+        volume_id=0, local_id=0, thumbnail_source=source, chat_id=5, chat_access_hash=0,
+    ).encode()
+
+
+class TestBlobStore:
+    """Test content-addressed media blobs"""
+
+    def test_same_media_is_downloaded_once_across_accounts(self, tmp_path):
+        """Second account only probes access, then links the existing blob"""
+        streams = []
+
+        class FakeClient:
+            async def stream_media(self, file_id, limit=0, offset=0):
+                streams.append(limit)
+                yield b"photo-bytes"
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield FakeClient()
+
+        store = BlobStore(tmp_path / "blobs")
+        a = tmp_path / "downloads" / "u1" / "1" / "p.jpg"
+        b = tmp_path / "downloads" / "u2" / "3" / "p.jpg"
+        c = tmp_path / "downloads" / "u2" / "3" / "p2.jpg"
+        with patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "blob_store", store), \
+                patch.object(telegram_service, "media_access", TTLCache(maxsize=10, ttl=60)):
+            asyncio.run(telegram_service.download_media_to_file("u1", 1, chat_photo_id(ThumbnailSource.CHAT_PHOTO_SMALL, b"x"), a))
+            asyncio.run(telegram_service.download_media_to_file("u2", 3, chat_photo_id(ThumbnailSource.CHAT_PHOTO_SMALL, b"y"), b))
+            asyncio.run(telegram_service.download_media_to_file("u2", 3, chat_photo_id(ThumbnailSource.CHAT_PHOTO_SMALL, b"z"), c))
+        # to'liq yuklash (limit=0), keyin u2 uchun bitta chunkli tekshiruv; qayta tekshirilmaydi
+        assert streams == [0, 1]
+        assert b.read_bytes() == b"photo-bytes"
+        assert os.path.samefile(a, b) and os.path.samefile(a, c)
+        assert store.stats()["hits"] == 2
+
+    def test_forged_file_id_is_not_served_from_blob(self, tmp_path):
+        """An account Telegram refuses gets the error, not another account's blob"""
+        class FakeClient:
+            def __init__(self, user_id):
+                self.user_id = user_id
+
+            async def stream_media(self, file_id, limit=0, offset=0):
+                if self.user_id == "intruder":
+                    raise PeerIdInvalid()
+                yield b"secret"
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield FakeClient(user_id)
+
+        store = BlobStore(tmp_path / "blobs")
+        owner = tmp_path / "downloads" / "owner" / "1" / "p.jpg"
+        stolen = tmp_path / "downloads" / "intruder" / "1" / "p.jpg"
+        file_id = chat_photo_id(ThumbnailSource.CHAT_PHOTO_BIG)
+        with patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "blob_store", store), \
+                patch.object(telegram_service, "media_access", TTLCache(maxsize=10, ttl=60)):
+            asyncio.run(telegram_service.download_media_to_file("owner", 1, file_id, owner))
+            with pytest.raises(PeerIdInvalid):
+                asyncio.run(telegram_service.download_media_to_file("intruder", 1, file_id, stolen))
+        assert owner.read_bytes() == b"secret"
+        assert not stolen.exists()
+
+    def test_size_variants_get_separate_blobs(self):
+        """Small and big chat photos do not share a blob"""
+        small = chat_photo_id(ThumbnailSource.CHAT_PHOTO_SMALL)
+        big = chat_photo_id(ThumbnailSource.CHAT_PHOTO_BIG)
+        assert blob_key(small) != blob_key(big)
+
+    def test_gc_removes_only_unreferenced_blobs(self, tmp_path):
+        """Blobs without user references are collected after the grace period"""
+        store = BlobStore(tmp_path / "blobs", gc_grace_seconds=0)
+        kept_ref = tmp_path / "u" / "kept.jpg"
+        orphan_ref = tmp_path / "u" / "orphan.jpg"
+        for name, ref in (("kept", kept_ref), ("orphan", orphan_ref)):
+            ref.parent.mkdir(parents=True, exist_ok=True)
+            ref.write_bytes(name.encode())
+            store.adopt(name, ref)
+        orphan_ref.unlink()
+
+        result = store.gc()
+        assert result["removed"] == 1
+        assert store.path_for("kept").exists()
+        assert not store.path_for("orphan").exists()
+        assert kept_ref.read_bytes() == b"kept"
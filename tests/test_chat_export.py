@@ -0,0 +1,71 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.services import telegram_service
+
+
+def message(msg_id, text):
+    return SimpleNamespace(
+        id=msg_id, text=text, caption=None, outgoing=msg_id % 2 == 0,
+        from_user=SimpleNamespace(first_name="Ali", last_name=None, username=None),
+        photo=None, video=None, audio=None, voice=None, document=None, sticker=None, animation=None,
+        video_note=None, location=None, contact=None, poll=None, venue=None, game=None,
+    )
+
+
+class FakeClient:
+    def __init__(self, count):
+        self.count = count
+
+    async def get_chat_history(self, chat_id, limit=None):
+        for i in range(self.count, 0, -1):
+            yield message(i, f"msg {i}")
+
+
+def run_export(tmp_path, count, fmt, meta={"chat_id": 1}):
+    client = FakeClient(count)
+
+    @asynccontextmanager
+    async def fake_session(user_id, account_index, op):
+        yield client
+
+    async def fake_lookup(client, user_id, account_index, chat_id):
+        return meta
+
+    with patch.object(telegram_service, "telegram_session", fake_session), \
+            patch.object(telegram_service.dialog_index, "lookup", fake_lookup), \
+            patch.object(telegram_service, "MEDIA_ROOT", tmp_path):
+        return asyncio.run(telegram_service.export_chat_messages("u1", 1, 1, fmt=fmt))
+
+
+class TestChatExport:
+    """Test streaming chat export"""
+
+    def test_json_export_is_valid_array(self, tmp_path):
+        """Streamed JSON array parses and the response holds only counts"""
+        result = run_export(tmp_path, 450, "json")
+        assert "messages" not in result
+        assert result["total_messages"] == 450
+        data = json.loads(open(result["file_path"], encoding="utf-8").read())
+        assert len(data) == 450
+        assert data[0] == {"id": 450, "from": "me", "text": "msg 450", "type": "text"}
+        assert not list(tmp_path.rglob("*.part"))
+
+    def test_ndjson_export_one_message_per_line(self, tmp_path):
+        """NDJSON export writes one record per line"""
+        result = run_export(tmp_path, 3, "ndjson")
+        lines = open(result["file_path"], encoding="utf-8").read().splitlines()
+        assert [json.loads(l)["id"] for l in lines] == [3, 2, 1]
+        assert result["filename"].endswith(".ndjson")
+
+    def test_empty_chat_and_missing_chat(self, tmp_path):
+        """Empty chat gives [] and unknown chat raises ValueError"""
+        result = run_export(tmp_path, 0, "json")
+        assert json.loads(open(result["file_path"], encoding="utf-8").read()) == []
+        try:
+            run_export(tmp_path, 1, "json", meta=None)
+            assert False, "ValueError expected"
+        except ValueError:
+            pass
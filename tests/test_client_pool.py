@@ -0,0 +1,109 @@
+import asyncio
+from src.services.client_pool import TelegramClientPool
+
+
+class FakeClient:
+    def __init__(self, name):
+        self.name = name
+        self.is_connected = False
+        self.stop_calls = 0
+
+    async def start(self):
+        self.is_connected = True
+
+    async def stop(self):
+        self.stop_calls += 1
+        self.is_connected = False
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory(user_id, account_index):
+        client = FakeClient(f"{user_id}:{account_index}")
+        created.append(client)
+        return client
+
+    return TelegramClientPool(factory=factory, **kwargs), created
+
+
+class TestTelegramClientPool:
+    """Test client pool lifecycle"""
+
+    def test_reuses_started_client(self):
+        """Second lookup for same account is a hit"""
+        async def scenario():
+            pool, created = make_pool(max_clients=2)
+            first = await pool.get("u1", 1)
+            second = await pool.get("u1", 1)
+            assert first is second
+            assert len(created) == 1
+            stats = pool.stats()
+            assert stats["hits"] == 1
+            assert stats["misses"] == 1
+            assert stats["hit_rate"] == 0.5
+
+        asyncio.run(scenario())
+
+    def test_evicts_least_recently_used_when_full(self):
+        """Pool stops the LRU client when capacity is reached"""
+        async def scenario():
+            pool, created = make_pool(max_clients=2)
+            a = await pool.get("u1", 1)
+            b = await pool.get("u1", 2)
+            await pool.get("u1", 1)  # a becomes most recently used
+            await pool.get("u2", 1)
+            assert b.stop_calls == 1
+            assert a.stop_calls == 0
+            assert pool.peek("u1", 2) is None
+            assert pool.stats()["evictions"] == 1
+
+        asyncio.run(scenario())
+
+    def test_leased_client_is_not_evicted(self):
+        """A client in use blocks eviction until the lease is released"""
+        async def scenario():
+            pool, created = make_pool(max_clients=1)
+            async with pool.lease("u1", 1) as leased:
+                waiter = asyncio.create_task(pool.get("u1", 2))
+                await asyncio.sleep(0.01)
+                assert not waiter.done()
+                assert leased.stop_calls == 0
+            other = await asyncio.wait_for(waiter, 1)
+            assert leased.stop_calls == 1
+            assert pool.peek("u1", 2) is other
+
+        asyncio.run(scenario())
+
+    def test_idle_clients_are_stopped(self):
+        """Sweeper evicts clients idle longer than idle_seconds"""
+        async def scenario():
+            pool, created = make_pool(max_clients=5, idle_seconds=0)
+            client = await pool.get("u1", 1)
+            assert await pool.evict_idle() == 1
+            assert client.stop_calls == 1
+            assert pool.stats()["size"] == 0
+            assert pool.stats()["idle_evictions"] == 1
+
+        asyncio.run(scenario())
+
+    def test_discard_stops_client(self):
+        """discard removes the client and stops it"""
+        async def scenario():
+            pool, created = make_pool()
+            client = await pool.get("u1", 1)
+            assert await pool.discard("u1", 1) is True
+            assert client.stop_calls == 1
+            assert await pool.discard("u1", 1) is False
+
+        asyncio.run(scenario())
+
+    def test_operation_latency_is_recorded(self):
+        """record_latency aggregates per-operation timings"""
+        pool, created = make_pool()
+        pool.record_latency("get_me", 0.010)
+        pool.record_latency("get_me", 0.030)
+        ops = pool.stats()["operations"]
+        assert ops["get_me"]["count"] == 2
+        assert ops["get_me"]["avg_ms"] == 20.0
+        assert ops["get_me"]["max_ms"] == 30.0
@@ -0,0 +1,83 @@
+import asyncio
+from pyrogram import raw
+from src.services.dialog_cache import DialogIndex
+
+
+class FakeClient:
+    def __init__(self, dialog):
+        self.dialog = dialog
+        self.invocations = 0
+        self.handlers = []
+
+    async def resolve_peer(self, chat_id):
+        return raw.types.InputPeerUser(user_id=chat_id, access_hash=0)
+
+    async def invoke(self, query):
+        self.invocations += 1
+        return raw.types.messages.PeerDialogs(
+            dialogs=[self.dialog],
+            messages=[],
+            chats=[],
+            users=[raw.types.User(id=42, first_name="Ali", access_hash=0, restriction_reason=[])],
+            state=raw.types.updates.State(pts=0, qts=0, date=0, seq=0, unread_count=0),
+        )
+
+    def add_handler(self, handler, group=0):
+        self.handlers.append(handler)
+
+
+def make_dialog(inbox=5, outbox=7):
+    return raw.types.Dialog(
+        peer=raw.types.PeerUser(user_id=42),
+        top_message=10,
+        read_inbox_max_id=inbox,
+        read_outbox_max_id=outbox,
+        unread_count=3,
+        unread_mentions_count=0,
+        unread_reactions_count=0,
+        notify_settings=raw.types.PeerNotifySettings(),
+    )
+
+
+class TestDialogIndex:
+    """Test per-account dialog metadata cache"""
+
+    def test_miss_fetches_single_peer_dialog_once(self):
+        """A miss issues one GetPeerDialogs, the next lookup is local"""
+        async def scenario():
+            index = DialogIndex()
+            client = FakeClient(make_dialog())
+            meta = await index.lookup(client, "u1", 1, 42)
+            assert meta["read_inbox_max_id"] == 5
+            assert meta["read_outbox_max_id"] == 7
+            assert meta["type"] == "private"
+            assert meta["title"] == "Ali"
+            await index.lookup(client, "u1", 1, 42)
+            assert client.invocations == 1
+            assert index.stats()["hits"] == 1
+
+        asyncio.run(scenario())
+
+    def test_read_updates_refresh_markers(self):
+        """Raw read updates move the cached markers forward"""
+        async def scenario():
+            index = DialogIndex()
+            client = FakeClient(make_dialog())
+            await index.lookup(client, "u1", 1, 42)
+            await index.attach(client, "u1", 1)
+            callback = client.handlers[0].callback
+            await callback(client, raw.types.UpdateReadHistoryOutbox(
+                peer=raw.types.PeerUser(user_id=42), max_id=9, pts=1, pts_count=1), {}, {})
+            assert index.get("u1", 1, 42)["read_outbox_max_id"] == 9
+
+        asyncio.run(scenario())
+
+    def test_detach_drops_account(self):
+        """Stopping the client forgets its dialogs"""
+        async def scenario():
+            index = DialogIndex()
+            await index.lookup(FakeClient(make_dialog()), "u1", 1, 42)
+            await index.detach("u1", 1)
+            assert index.get("u1", 1, 42) is None
+
+        asyncio.run(scenario())
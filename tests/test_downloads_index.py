@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+from src.services import telegram_service
+from src.services.downloads_index import DownloadsIndex
+from src.services.media_cache import MediaCacheManager
+from src.services.profile_store import ProfileSnapshotStore
+
+
+class TestDownloadsIndex:
+    """Test in-memory index of downloaded media files"""
+
+    def test_scans_account_once_and_skips_temp_files(self, tmp_path):
+        """Directory is listed once per account; .part/.link files are ignored"""
+        d = tmp_path / "downloads" / "u1" / "0"
+        d.mkdir(parents=True)
+        (d / "AAA.jpg").write_bytes(b"x")
+        (d / "BBB.mp4.123.part").write_bytes(b"x")
+        (d / "CCC.pdf.1.2.link").write_bytes(b"x")
+        index = DownloadsIndex(tmp_path / "downloads")
+
+        assert index.lookup("u1", 0, "AAA") == "AAA.jpg"
+        assert index.lookup("u1", 0, "BBB") is None
+        assert index.lookup("u1", 0, "CCC") is None
+        assert index.lookup("u1", 1, "AAA") is None
+        (d / "DDD.png").write_bytes(b"x")
+        assert index.lookup("u1", 0, "DDD") is None  # no rescan
+        assert index.stats()["scans"] == 2
+
+    def test_note_path_and_removed(self, tmp_path):
+        """Downloads add entries, removals drop them; paths outside downloads are ignored"""
+        root = tmp_path / "downloads"
+        index = DownloadsIndex(root)
+        index.note_path(root / "u1" / "0" / "AAA.jpg")
+        index.note_path(tmp_path / "avatars" / "u1" / "0" / "5.jpg")
+        index.note_path(root / "u1" / "0" / "BBB.jpg.1.part")
+        assert index.lookup("u1", 0, "AAA") == "AAA.jpg"
+        assert index.stats()["files"] == 1
+
+        index.note_removed(root / "u1" / "0" / "AAA.jpg")
+        assert index.lookup("u1", 0, "AAA") is None
+
+    def test_cache_eviction_updates_index(self, tmp_path):
+        """Files evicted by the media cache disappear from the index"""
+        d = tmp_path / "downloads" / "u1" / "0"
+        d.mkdir(parents=True)
+        (d / "AAA.jpg").write_bytes(b"x" * 1000)
+        index = DownloadsIndex(tmp_path / "downloads")
+        assert index.lookup("u1", 0, "AAA") == "AAA.jpg"
+
+        cache = MediaCacheManager(tmp_path, quotas={"downloads": 100}, on_removed=index.note_removed)
+        cache.sweep()
+        assert not (d / "AAA.jpg").exists()
+        assert index.lookup("u1", 0, "AAA") is None
+
+    def test_logout_forgets_account_index(self, tmp_path):
+        """Logging out drops the account's file_id -> file mappings"""
+        sessions = tmp_path / "sessions" / "u1"
+        sessions.mkdir(parents=True)
+        (sessions / "1.session").touch()
+        index = DownloadsIndex(tmp_path / "downloads")
+        index.add("u1", 1, "AAA.jpg")
+        index.add("u1", 2, "BBB.jpg")
+
+        class FakeClient:
+            async def log_out(self):
+                pass
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield FakeClient()
+
+        with patch.object(telegram_service, "SESS_ROOT", tmp_path / "sessions"), \
+                patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "downloads_index", index), \
+                patch.object(telegram_service, "profile_store", ProfileSnapshotStore(tmp_path / "sessions", None)):
+            result = asyncio.run(telegram_service.logout_one("u1", "1"))
+        assert result["status"] == "logged_out"
+        assert index.stats()["accounts"] == 1
+        assert index.lookup("u1", 2, "BBB") == "BBB.jpg"
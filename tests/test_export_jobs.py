@@ -0,0 +1,135 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+from src.services import telegram_service
+from src.services.export_jobs import ExportJob, ExportJobRunner
+from tests.test_chat_export import message
+
+
+class FlakyClient:
+    def __init__(self, count, fail_after=None):
+        self.count = count
+        self.fail_after = fail_after
+        self.offsets = []
+
+    async def get_chat_history(self, chat_id, offset_id=0):
+        self.offsets.append(offset_id)
+        sent = 0
+        for i in range(self.count, 0, -1):
+            if offset_id and i >= offset_id:
+                continue
+            if self.fail_after is not None and sent >= self.fail_after:
+                raise ConnectionError("network lost")
+            sent += 1
+            yield message(i, f"msg {i}")
+
+
+def run_job(tmp_path, job, client):
+    @asynccontextmanager
+    async def fake_session(user_id, account_index, op):
+        yield client
+
+    async def fake_lookup(client, user_id, account_index, chat_id):
+        return {"chat_id": chat_id}
+
+    async def save():
+        pass
+
+    with patch.object(telegram_service, "telegram_session", fake_session), \
+            patch.object(telegram_service.dialog_index, "lookup", fake_lookup), \
+            patch.object(telegram_service, "MEDIA_ROOT", tmp_path), \
+            patch.object(telegram_service, "EXPORT_CHECKPOINT_MESSAGES", 3):
+        asyncio.run(telegram_service.run_export_job(job, save))
+
+
+class TestExportJobRunner:
+    """Test background export job runner"""
+
+    def test_per_account_concurrency_and_persistence(self, tmp_path):
+        """Jobs of one account run one at a time and state is saved to disk"""
+        async def scenario():
+            running = 0
+            peak = 0
+
+            async def worker(job, save):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                job.processed = 5
+                running -= 1
+
+            runner = ExportJobRunner(tmp_path, worker, per_account=1)
+            jobs = [runner.submit("u1", 1, chat_id) for chat_id in (1, 2, 3)]
+            while any(j.status != "completed" for j in jobs):
+                await asyncio.sleep(0.01)
+            assert peak == 1
+            saved = json.loads((tmp_path / "u1" / "1" / "jobs" / f"{jobs[0].job_id}.json").read_text())
+            assert saved["status"] == "completed"
+            assert saved["processed"] == 5
+
+        asyncio.run(scenario())
+
+    def test_cancel_stops_running_job(self, tmp_path):
+        """cancel marks the job cancelled and stops the worker"""
+        async def scenario():
+            async def worker(job, save):
+                await asyncio.sleep(10)
+
+            runner = ExportJobRunner(tmp_path, worker)
+            job = runner.submit("u1", 1, 7)
+            await asyncio.sleep(0.01)
+            assert job.status == "running"
+            await runner.cancel("u1", job.job_id)
+            assert job.status == "cancelled"
+            assert runner.get("u2", job.job_id) is None
+
+        asyncio.run(scenario())
+
+    def test_unfinished_jobs_resume_after_restart(self, tmp_path):
+        """Jobs left running on shutdown are restarted by resume_pending"""
+        async def scenario():
+            async def slow(job, save):
+                await asyncio.sleep(10)
+
+            first = ExportJobRunner(tmp_path, slow)
+            job = first.submit("u1", 1, 7)
+            await asyncio.sleep(0.01)
+            await first.close()
+
+            seen = []
+
+            async def worker(job, save):
+                seen.append(job.job_id)
+
+            second = ExportJobRunner(tmp_path, worker)
+            assert second.resume_pending() == 1
+            await asyncio.sleep(0.01)
+            assert seen == [job.job_id]
+            assert second.get("u1", job.job_id).status == "completed"
+
+        asyncio.run(scenario())
+
+
+class TestRunExportJob:
+    """Test export worker checkpoints"""
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        """A failed run continues from the last checkpoint without duplicates"""
+        job = ExportJob(job_id="abc", user_id="u1", account_index=1, chat_id=5, format="json", filename="chat_5.json")
+        try:
+            run_job(tmp_path, job, FlakyClient(10, fail_after=5))
+            assert False, "ConnectionError expected"
+        except ConnectionError:
+            pass
+        assert job.last_message_id == 8
+        assert job.checkpoint_processed == 3
+
+        client = FlakyClient(10)
+        run_job(tmp_path, job, client)
+        assert client.offsets == [8]
+        data = json.loads((tmp_path / "exports" / "u1" / "1" / "chat_5.json").read_text(encoding="utf-8"))
+        assert [m["id"] for m in data] == list(range(10, 0, -1))
+        assert job.processed == 10
+        assert job.file_url == "/media/exports/u1/1/chat_5.json"
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from pyrogram import raw
+from pyrogram.enums import UserStatus
+from pyrogram.errors import ChatAdminRequired
+from src.services.group_stats import GroupStatsCache
+
+
+class FakeClient:
+    def __init__(self, delay=0.0, onlines_error=False):
+        self.delay = delay
+        self.onlines_error = onlines_error
+        self.invokes = 0
+        self.member_scans = 0
+
+    async def resolve_peer(self, chat_id):
+        return chat_id
+
+    async def invoke(self, query):
+        self.invokes += 1
+        await asyncio.sleep(self.delay)
+        if self.onlines_error:
+            raise ChatAdminRequired()
+        assert isinstance(query, raw.functions.messages.GetOnlines)
+        return raw.types.ChatOnlines(onlines=7)
+
+    async def get_chat_members_count(self, chat_id):
+        return 500
+
+    async def get_chat_members(self, chat_id):
+        self.member_scans += 1
+        for status in (UserStatus.ONLINE, UserStatus.RECENTLY, UserStatus.ONLINE):
+            yield SimpleNamespace(user=SimpleNamespace(status=status))
+
+
+def chat(chat_id, members_count=None):
+    return SimpleNamespace(id=chat_id, members_count=members_count)
+
+
+class TestGroupStatsCache:
+    """Test group member/online counts"""
+
+    def test_uses_get_onlines_and_caches(self):
+        """Online count comes from GetOnlines and is cached per chat"""
+        async def scenario():
+            stats = GroupStatsCache(ttl=60)
+            client = FakeClient()
+            first = await stats.get(client, "u1", 1, chat(-1, members_count=12))
+            second = await stats.get(client, "u1", 1, chat(-1, members_count=12))
+            assert first == {"member_count": 12, "online_count": 7}
+            assert second == first
+            assert client.invokes == 1
+            assert client.member_scans == 0
+
+        asyncio.run(scenario())
+
+    def test_page_is_computed_concurrently(self):
+        """A page of groups takes about one call, not the sum"""
+        async def scenario():
+            stats = GroupStatsCache(concurrency=20)
+            client = FakeClient(delay=0.05)
+            started = time.perf_counter()
+            result = await stats.get_many(client, "u1", 1, [chat(-i) for i in range(1, 21)])
+            elapsed = time.perf_counter() - started
+            assert len(result) == 20
+            assert result[-3]["member_count"] == 500
+            assert elapsed < 0.5
+
+        asyncio.run(scenario())
+
+    def test_falls_back_to_member_scan(self):
+        """When GetOnlines is refused the bounded member scan is used"""
+        async def scenario():
+            stats = GroupStatsCache()
+            client = FakeClient(onlines_error=True)
+            result = await stats.get(client, "u1", 1, chat(-5))
+            assert result == {"member_count": 500, "online_count": 2}
+            assert stats.stats()["fallbacks"] == 1
+
+        asyncio.run(scenario())
+
+    def test_failures_cached_only_briefly(self):
+        """A failed lookup returns zeros but is retried after failure_ttl, not the full TTL"""
+        class FailingClient(FakeClient):
+            fail = True
+
+            async def get_chat_members_count(self, chat_id):
+                if self.fail:
+                    raise TimeoutError("flood")
+                return 500
+
+        async def scenario():
+            stats = GroupStatsCache(ttl=60, failure_ttl=0.05)
+            client = FailingClient()
+            first = await stats.get(client, "u1", 1, chat(-2))
+            again = await stats.get(client, "u1", 1, chat(-2))
+            client.fail = False
+            await asyncio.sleep(0.06)
+            recovered = await stats.get(client, "u1", 1, chat(-2))
+            assert first == again == {"member_count": 0, "online_count": 0}
+            assert recovered == {"member_count": 500, "online_count": 7}
+            assert stats.stats()["failures"] == 1
+
+        asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+from src.services import telegram_service
+from src.services.export_store import IncrementalExportStore
+from tests.test_chat_export import message
+
+
+class GrowingClient:
+    def __init__(self, count):
+        self.count = count
+        self.yielded = 0
+
+    async def get_chat_history(self, chat_id, limit=0):
+        for i in range(self.count, 0, -1):
+            self.yielded += 1
+            yield message(i, f"msg {i}")
+
+
+def run(tmp_path, client, coro_factory):
+    @asynccontextmanager
+    async def fake_session(user_id, account_index, op):
+        yield client
+
+    async def fake_lookup(client, user_id, account_index, chat_id):
+        return {"chat_id": chat_id}
+
+    store = IncrementalExportStore(tmp_path / "exports")
+    with patch.object(telegram_service, "telegram_session", fake_session), \
+            patch.object(telegram_service.dialog_index, "lookup", fake_lookup), \
+            patch.object(telegram_service, "MEDIA_ROOT", tmp_path), \
+            patch.object(telegram_service, "export_store", store):
+        return asyncio.run(coro_factory())
+
+
+class TestIncrementalExport:
+    """Test incremental chat export"""
+
+    def test_only_new_messages_are_fetched(self, tmp_path):
+        """Second export reads only messages above the high-water mark"""
+        client = GrowingClient(5)
+        first = run(tmp_path, client, lambda: telegram_service.export_chat_incremental("u1", 1, 9))
+        assert first["new_messages"] == 5
+        assert first["high_water"] == 5
+
+        client.count = 8
+        client.yielded = 0
+        second = run(tmp_path, client, lambda: telegram_service.export_chat_incremental("u1", 1, 9))
+        assert second["new_messages"] == 3
+        assert second["total_messages"] == 8
+        assert second["segments"] == 2
+        assert client.yielded == 4  # 3 new + the boundary message
+
+        third = run(tmp_path, client, lambda: telegram_service.export_chat_incremental("u1", 1, 9))
+        assert third["new_messages"] == 0
+        assert third["segments"] == 2
+
+    def test_merged_view_combines_segments(self, tmp_path):
+        """Merged export lists all segments newest first"""
+        client = GrowingClient(3)
+        run(tmp_path, client, lambda: telegram_service.export_chat_incremental("u1", 1, 9))
+        client.count = 6
+        run(tmp_path, client, lambda: telegram_service.export_chat_incremental("u1", 1, 9))
+        merged = run(tmp_path, client, lambda: telegram_service.build_merged_export("u1", 1, 9, "json"))
+        assert merged["file_url"] == "/media/exports/u1/1/incremental/9/merged.json"
+        data = json.loads((tmp_path / "exports/u1/1/incremental/9/merged.json").read_text(encoding="utf-8"))
+        assert [m["id"] for m in data] == [6, 5, 4, 3, 2, 1]
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import threading
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.services.media_cache import MediaCacheManager, TrackedStaticFiles, parse_quotas, parse_size
+
+
+def make_file(root, rel, size, age):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    ts = time.time() - age
+    os.utime(path, (ts, ts))
+    return path
+
+
+class TestMediaCacheManager:
+    """Test media disk budget and LRU eviction"""
+
+    def test_parse_sizes(self):
+        """Human readable sizes and quota strings"""
+        assert parse_size("512MB") == 512 * 1024 ** 2
+        assert parse_size("2G") == 2 * 1024 ** 3
+        assert parse_size("100") == 100
+        assert parse_quotas("downloads=1KB, thumbs=2KB") == {"downloads": 1024, "thumbs": 2048}
+
+    def test_category_quota_evicts_least_recently_used(self, tmp_path):
+        """Oldest files in an over-quota category are removed first"""
+        old = make_file(tmp_path, "thumbs/u/1/1.jpg", 400, age=300)
+        mid = make_file(tmp_path, "thumbs/u/1/2.jpg", 400, age=200)
+        new = make_file(tmp_path, "thumbs/u/1/3.jpg", 400, age=100)
+        avatar = make_file(tmp_path, "avatars/u/1/9.jpg", 5000, age=1000)
+        cache = MediaCacheManager(tmp_path, quotas={"thumbs": 1000})
+        cache.touch("thumbs/u/1/1.jpg")  # recently served
+
+        result = cache.sweep()
+        assert result["evicted"] == 1
+        assert not mid.exists()
+        assert old.exists() and new.exists()
+        assert avatar.exists()
+        assert cache.stats()["usage"]["thumbs"] == {"bytes": 800, "files": 2}
+
+    def test_global_budget_and_protected_files(self, tmp_path):
+        """Total budget evicts across categories but never touches protected paths"""
+        default = make_file(tmp_path, "avatars/default.jpg", 1000, age=5000)
+        part = make_file(tmp_path, "downloads/u/1/big.mp4.abc.part", 1000, age=5000)
+        job = make_file(tmp_path, "exports/u/1/jobs/j.json", 1000, age=5000)
+        old = make_file(tmp_path, "downloads/u/1/a.mp4", 1000, age=400)
+        new = make_file(tmp_path, "exports/u/1/chat.json", 1000, age=10)
+        cache = MediaCacheManager(tmp_path, max_bytes=1500, protected=("avatars/default.jpg",))
+
+        cache.sweep()
+        assert not old.exists()
+        assert new.exists() and default.exists() and part.exists() and job.exists()
+        assert cache.stats()["evictions_by_category"] == {"downloads": 1}
+
+    def test_hardlinked_media_counted_once(self, tmp_path):
+        """Links to one blob count once; unreferenced blobs count toward the total"""
+        blob = make_file(tmp_path, "blobs/aa/bb/shared", 1000, age=100)
+        for rel in ("downloads/u/1/a.mp4", "downloads/u/2/a.mp4", "thumbs/u/1/a.jpg"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            os.link(blob, tmp_path / rel)
+        make_file(tmp_path, "blobs/cc/dd/orphan", 300, age=100)
+        cache = MediaCacheManager(tmp_path, max_bytes=5000)
+
+        cache.sweep()
+        stats = cache.stats()
+        assert stats["usage"]["downloads"] == {"bytes": 1000, "files": 1}
+        assert stats["usage"]["thumbs"] == {"bytes": 1000, "files": 1}
+        assert stats["usage"]["blobs"] == {"bytes": 300, "files": 1}
+        assert stats["total_bytes"] == 1300
+
+    def test_global_budget_evicts_every_link_of_lru_media(self, tmp_path):
+        """Shared media is evicted as a unit, so the sweep frees real bytes and stops there"""
+        old = make_file(tmp_path, "blobs/aa/bb/old", 1000, age=500)
+        links = [tmp_path / "downloads/u/1/old.mp4", tmp_path / "downloads/u/2/old.mp4"]
+        for link in links:
+            link.parent.mkdir(parents=True, exist_ok=True)
+            os.link(old, link)
+        new = make_file(tmp_path, "downloads/u/1/new.mp4", 1000, age=10)
+        removed = []
+        cache = MediaCacheManager(tmp_path, max_bytes=1500, on_removed=removed.append)
+
+        cache.sweep()
+        assert not any(link.exists() for link in links)
+        assert new.exists()
+        assert sorted(removed) == sorted(links)
+        assert cache.stats()["usage"]["downloads"] == {"bytes": 1000, "files": 1}
+
+    def test_threaded_sweep_runs_callbacks_on_loop(self, tmp_path):
+        """run_sweep scans in a thread but hands on_removed/on_evicted back to the event loop"""
+        make_file(tmp_path, "thumbs/u/1/1.jpg", 400, age=300)
+        make_file(tmp_path, "thumbs/u/1/2.jpg", 400, age=100)
+        threads = []
+        cache = MediaCacheManager(
+            tmp_path,
+            quotas={"thumbs": 500},
+            on_removed=lambda path: threads.append(("removed", threading.get_ident())),
+            on_evicted=lambda: threads.append(("evicted", threading.get_ident())),
+        )
+
+        async def main():
+            await cache.run_sweep()
+            await asyncio.sleep(0)
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(main())
+        assert threads == [("removed", loop_thread), ("evicted", loop_thread)]
+
+    def test_static_files_record_access(self, tmp_path):
+        """Serving a file through /media updates its access time"""
+        make_file(tmp_path, "thumbs/u/1/5.jpg", 10, age=100)
+        cache = MediaCacheManager(tmp_path)
+        app = FastAPI()
+        app.mount("/media", TrackedStaticFiles(directory=str(tmp_path), cache=cache), name="media")
+        client = TestClient(app)
+        assert client.get("/media/thumbs/u/1/5.jpg").status_code == 200
+        assert client.get("/media/thumbs/u/1/missing.jpg").status_code == 404
+        assert cache.stats()["tracked_files"] == 1
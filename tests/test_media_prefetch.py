@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, RedirectResponse
+
+from src.routers import telegram as telegram_router
+from src.services.media_prefetch import MediaPrefetcher
+
+
+class TestMediaPrefetcher:
+    """Test background media prefetch queue"""
+
+    def test_duplicate_keys_are_enqueued_once(self):
+        """Same key is queued only once while pending"""
+        async def scenario():
+            calls = []
+
+            async def job():
+                calls.append(1)
+                return "ok"
+
+            prefetcher = MediaPrefetcher(concurrency=2)
+            assert prefetcher.enqueue("avatars/u/1/5.jpg", job) is True
+            assert prefetcher.enqueue("avatars/u/1/5.jpg", job) is False
+            await asyncio.sleep(0.01)
+            assert calls == [1]
+            assert prefetcher.stats()["completed"] == 1
+            await prefetcher.close()
+
+        asyncio.run(scenario())
+
+    def test_concurrency_is_bounded(self):
+        """No more than `concurrency` jobs run at once"""
+        async def scenario():
+            running = 0
+            peak = 0
+
+            async def job():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                return True
+
+            prefetcher = MediaPrefetcher(concurrency=3)
+            for i in range(10):
+                prefetcher.enqueue(f"thumbs/u/1/{i}.jpg", job)
+            while prefetcher.stats()["completed"] < 10:
+                await asyncio.sleep(0.01)
+            assert peak == 3
+            await prefetcher.close()
+
+        asyncio.run(scenario())
+
+    def test_fetch_now_runs_dropped_job(self):
+        """Lazy fetch runs a registered job even if the queue was full"""
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def slow():
+                await gate.wait()
+                return "slow"
+
+            async def fast():
+                return "fast"
+
+            prefetcher = MediaPrefetcher(concurrency=1, max_queue=1)
+            prefetcher.enqueue("a", slow)
+            await asyncio.sleep(0.01)  # worker picks up "a"
+            prefetcher.enqueue("b", slow)  # fills the queue
+            assert prefetcher.enqueue("c", fast) is False
+            assert prefetcher.stats()["dropped"] == 1
+            assert await prefetcher.fetch_now("c") == "fast"
+            assert await prefetcher.fetch_now("unknown") is None
+            gate.set()
+            await prefetcher.close()
+
+        asyncio.run(scenario())
+
+
+class TestLazyMediaEndpoint:
+    """Test /media_lazy ownership checks and avatar fallback"""
+
+    def call(self, tmp_path, rel_path, job=None):
+        async def get_user(authorization):
+            return SimpleNamespace(id="u1")
+
+        async def scenario():
+            prefetcher = MediaPrefetcher()
+            if job is not None:
+                prefetcher.enqueue(rel_path, job)
+            with patch.object(telegram_router, "MEDIA_ROOT", tmp_path), \
+                    patch.object(telegram_router, "media_prefetcher", prefetcher), \
+                    patch.object(telegram_router.supabase_gateway, "get_user_from_token", get_user):
+                try:
+                    return await telegram_router.lazy_media(rel_path, authorization="Bearer ok")
+                finally:
+                    await prefetcher.close()
+
+        return asyncio.run(scenario())
+
+    def test_other_users_media_is_not_served(self, tmp_path):
+        """A path under another user's directory is 404 even if the file exists"""
+        dest = tmp_path / "avatars" / "u2" / "1" / "5.jpg"
+        dest.parent.mkdir(parents=True)
+        dest.write_bytes(b"x")
+        with pytest.raises(HTTPException) as e:
+            self.call(tmp_path, "avatars/u2/1/5.jpg")
+        assert e.value.status_code == 404
+
+    def test_failed_avatar_falls_back_to_default(self, tmp_path):
+        """Avatar whose download fails redirects to the default avatar"""
+        async def job():
+            raise RuntimeError("boom")
+
+        response = self.call(tmp_path, "avatars/u1/1/5.jpg", job)
+        assert isinstance(response, RedirectResponse)
+        assert response.headers["location"] == telegram_router.DEFAULT_AVATAR_URL
+
+    def test_fetched_file_is_served(self, tmp_path):
+        """Registered job writes the file and the endpoint serves it"""
+        dest = tmp_path / "thumbs" / "u1" / "1" / "7.jpg"
+
+        async def job():
+            dest.parent.mkdir(parents=True)
+            dest.write_bytes(b"x")
+            return dest
+
+        response = self.call(tmp_path, "thumbs/u1/1/7.jpg", job)
+        assert isinstance(response, FileResponse)
@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import pytest
+from src.services import telegram_service
+from src.services.blob_store import BlobStore
+from src.services.media_stream import TG_CHUNK_SIZE, parse_range, iter_telegram_range, iter_file_range
+
+DATA = bytes(range(256)) * (TG_CHUNK_SIZE * 3 // 256 + 10)
+
+
+class FakeClient:
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.calls = []
+
+    async def stream_media(self, file_id, limit=0, offset=0):
+        self.calls.append((limit, offset))
+        chunks = [DATA[i:i + TG_CHUNK_SIZE] for i in range(0, len(DATA), TG_CHUNK_SIZE)]
+        chunks = chunks[offset:offset + limit] if limit else chunks[offset:]
+        for n, chunk in enumerate(chunks):
+            if self.fail_at is not None and n == self.fail_at:
+                raise ConnectionError("dropped")
+            yield chunk
+
+
+async def collect(agen):
+    return b"".join([c async for c in agen])
+
+
+class TestMediaStream:
+    """Test chunked media streaming helpers"""
+
+    def test_parse_range(self):
+        """Range header parsing"""
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-", 1000) == (900, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=0-5000", 1000) == (0, 999)
+        assert parse_range("bytes=0-99", None) is None
+        assert parse_range("bytes=0-1,5-9", 1000) is None
+        with pytest.raises(ValueError):
+            parse_range("bytes=1000-", 1000)
+
+    def test_telegram_range_reads_only_needed_chunks(self):
+        """A range inside the second chunk skips the first one"""
+        client = FakeClient()
+        start, end = TG_CHUNK_SIZE + 10, TG_CHUNK_SIZE + 5000
+        data = asyncio.run(collect(iter_telegram_range(client, "fid", start, end)))
+        assert data == DATA[start:end + 1]
+        assert client.calls == [(1, 1)]
+
+    def test_file_range(self, tmp_path):
+        """Cached file range is read in blocks"""
+        path = tmp_path / "f.bin"
+        path.write_bytes(DATA)
+        assert b"".join(iter_file_range(path, 5, 300000)) == DATA[5:300001]
+
+    def test_download_is_atomic(self, tmp_path):
+        """Failed downloads leave neither the file nor a .part behind"""
+        client = FakeClient()
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield client
+
+        dest = tmp_path / "downloads" / "x.mp4"
+        with patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "blob_store", BlobStore(tmp_path / "blobs")):
+            asyncio.run(telegram_service.download_media_to_file("u1", 1, "fid", dest))
+            assert dest.read_bytes() == DATA
+
+            client.fail_at = 1
+            broken = tmp_path / "downloads" / "y.mp4"
+            with pytest.raises(ConnectionError):
+                asyncio.run(telegram_service.download_media_to_file("u1", 1, "other-fid", broken))
+            assert not broken.exists()
+            assert sorted(p.name for p in dest.parent.iterdir()) == ["x.mp4"]
+            assert not list((tmp_path / "blobs").rglob("*.part"))
+
+    def test_stream_caches_full_response(self, tmp_path):
+        """A full streamed response is also written to the cache"""
+        client = FakeClient()
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield client
+
+        dest = tmp_path / "z.mp4"
+        with patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "blob_store", BlobStore(tmp_path / "blobs")):
+            data = asyncio.run(collect(telegram_service.stream_media_bytes("u1", 1, "fid", cache_to=dest)))
+        assert data == DATA
+        assert dest.read_bytes() == DATA
@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.services import telegram_service
+
+
+class FakeClient:
+    """GetHistory ni Telegram kabi bajaradi: xabarlar id bo'yicha kamayish tartibida"""
+
+    def __init__(self, ids=range(1, 101)):
+        self.ids = sorted(ids, reverse=True)
+        self.queries = []
+        self.history_calls = []
+
+    async def resolve_peer(self, chat_id):
+        return chat_id
+
+    async def invoke(self, query, sleep_threshold=None):
+        self.queries.append(query)
+        start = 0
+        if query.offset_id:
+            start = next((i for i, m in enumerate(self.ids) if m < query.offset_id), len(self.ids))
+        start = max(0, start + query.add_offset)
+        window = self.ids[start:start + query.limit]
+        return [m for m in window if m > query.min_id and (not query.max_id or m < query.max_id)]
+
+    async def get_chat_history(self, chat_id, limit=0):
+        self.history_calls.append(limit)
+        for i in self.ids[:limit]:
+            yield SimpleNamespace(id=i)
+
+
+async def fake_parse(client, r, replies=0):
+    return [SimpleNamespace(id=i) for i in r]
+
+
+def page(client, limit, **kwargs):
+    with patch.object(telegram_service.utils, "parse_messages", fake_parse):
+        messages, has_more = asyncio.run(telegram_service._history_page(client, 1, limit, **kwargs))
+    return [m.id for m in messages], has_more
+
+
+class TestHistoryPage:
+    """Test cursor-based message windows"""
+
+    def test_before_id_fetches_only_requested_window(self):
+        """before_id issues one GetHistory below the cursor"""
+        client = FakeClient()
+        ids, has_more = page(client, 3, before_id=11)
+        query = client.queries[0]
+        assert query.offset_id == 11
+        assert query.add_offset == 0
+        assert ids == [10, 9, 8]
+        assert has_more is True
+        assert client.history_calls == []
+
+    def test_after_id_returns_full_page_of_newer_messages(self):
+        """after_id returns the `limit` messages right after the cursor, newest first"""
+        client = FakeClient()
+        ids, has_more = page(client, 3, after_id=10)
+        query = client.queries[0]
+        assert query.offset_id == 11
+        assert query.min_id == 10
+        assert ids == [13, 12, 11]
+        assert has_more is True
+
+    def test_after_id_walks_to_newest_message(self):
+        """Following the after_id cursor reaches the newest message and then stops"""
+        client = FakeClient(range(1, 8))
+        ids, has_more = page(client, 3, after_id=1)
+        assert (ids, has_more) == ([4, 3, 2], True)
+        ids, has_more = page(client, 3, after_id=max(ids))
+        assert (ids, has_more) == ([7, 6, 5], False)
+        ids, has_more = page(client, 3, after_id=7)
+        assert (ids, has_more) == ([], False)
+
+    def test_before_id_reaches_oldest_message(self):
+        """has_more is False once the oldest message is in the page"""
+        client = FakeClient(range(1, 8))
+        assert page(client, 3, before_id=4) == ([3, 2, 1], False)
+
+    def test_offset_compatibility_path(self):
+        """Without a cursor the legacy offset skip is kept"""
+        client = FakeClient()
+        ids, has_more = page(client, 2, offset=3)
+        assert client.history_calls == [6]
+        assert ids == [97, 96]
+        assert has_more is True
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+from src.services import telegram_service
+from src.services.paths import KnownDirs
+
+
+class TestKnownDirs:
+    """Test directory creation only on write"""
+
+    def test_ensure_creates_once(self, tmp_path):
+        """Second ensure for the same (or a parent) directory skips mkdir"""
+        dirs = KnownDirs()
+        d = tmp_path / "a" / "b"
+        dirs.ensure(d)
+        assert d.is_dir()
+        dirs.ensure(d)
+        dirs.ensure_parent(tmp_path / "a" / "file.txt")
+        assert dirs.stats()["mkdirs"] == 1
+        assert dirs.stats()["hits"] == 2
+
+    def test_forget_after_rmtree(self, tmp_path):
+        """Forgotten directories (and their children) are recreated on next write"""
+        dirs = KnownDirs()
+        d = tmp_path / "a" / "b"
+        dirs.ensure(d)
+        dirs.forget(tmp_path / "a")
+        dirs.ensure(d)
+        assert dirs.stats()["mkdirs"] == 2
+
+    def test_path_helpers_do_not_create_directories(self, tmp_path):
+        """Computing media/session paths touches nothing on disk"""
+        with patch.multiple(telegram_service, MEDIA_ROOT=tmp_path, AVATAR_DIR=tmp_path / "avatars",
+                            SESS_ROOT=tmp_path / "sessions"):
+            telegram_service._avatar_file("u1", 1, 5)
+            telegram_service._thumb_file("u1", 1, 5)
+            telegram_service._message_file("u1", 1, 5, "jpg")
+            telegram_service.pending_path("u1")
+            assert telegram_service.next_index("u1") == 1
+            assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,62 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+from pyrogram.enums import ChatType, UserStatus
+from src.services import telegram_service
+
+
+class FakeClient:
+    def __init__(self, dialogs):
+        self.dialogs = dialogs
+        self.get_users_calls = []
+        self.get_chat_calls = 0
+
+    async def get_dialogs(self, limit=0):
+        for d in self.dialogs[:limit]:
+            yield d
+
+    async def get_chat(self, chat_id):
+        self.get_chat_calls += 1
+
+    async def get_users(self, ids):
+        self.get_users_calls.append(list(ids))
+        return [SimpleNamespace(id=i, status=UserStatus.ONLINE, is_premium=False, emoji_status=None) for i in ids]
+
+
+def dialog(chat_id, chat_type=ChatType.PRIVATE):
+    return SimpleNamespace(chat=SimpleNamespace(
+        id=chat_id, type=chat_type, first_name=f"U{chat_id}", last_name=None, username=None, photo=None,
+    ))
+
+
+def run_listing(client, limit=10):
+    @asynccontextmanager
+    async def fake_session(user_id, account_index, op):
+        yield client
+
+    with patch.object(telegram_service, "telegram_session", fake_session):
+        return asyncio.run(telegram_service.list_private_chats_minimal("u-test", 1, limit=limit))
+
+
+class TestListPrivateChats:
+    """Test private chat listing round-trips"""
+
+    def setup_method(self):
+        telegram_service.peer_cache.clear()
+
+    def test_one_batched_user_lookup_per_page(self):
+        """Chats come from dialogs, users from a single get_users call"""
+        client = FakeClient([dialog(1), dialog(2), dialog(-100, ChatType.SUPERGROUP), dialog(3)])
+        chats = run_listing(client)
+        assert [c["id"] for c in chats] == [1, 2, 3]
+        assert client.get_chat_calls == 0
+        assert client.get_users_calls == [[1, 2, 3]]
+        assert chats[0]["is_online"] is True
+
+    def test_peer_cache_skips_network_on_repeat(self):
+        """Second listing resolves users from the peer cache"""
+        client = FakeClient([dialog(1), dialog(2)])
+        run_listing(client)
+        run_listing(client)
+        assert client.get_users_calls == [[1, 2]]
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+import threading
+from unittest.mock import patch
+from pyrogram import raw
+from src.services import telegram_service
+from src.services.account_registry import AccountRegistry
+from src.services.profile_store import ProfileSnapshotStore
+
+
+def make_loader(calls, result=None):
+    async def loader(user_id, account_index):
+        calls.append((user_id, account_index))
+        await asyncio.sleep(0)
+        if result is not None:
+            return dict(result)
+        return {"index": str(account_index), "telegram_id": 1000 + account_index,
+                "full_name": "Ali", "username": "ali", "phone_number": "998"}
+    return loader
+
+
+class TestProfileSnapshotStore:
+    """Test on-disk profile snapshots served without touching Telegram"""
+
+    def test_snapshot_written_once_and_served_from_disk(self, tmp_path):
+        """First listing loads from Telegram; later ones (even after restart) read the snapshot"""
+        calls = []
+
+        async def main():
+            store = ProfileSnapshotStore(tmp_path, make_loader(calls))
+            first = await store.profiles("u1", [1, 2])
+            restarted = ProfileSnapshotStore(tmp_path, make_loader(calls))
+            second = await restarted.profiles("u1", [1, 2])
+            return first, second, restarted.stats()
+
+        first, second, stats = asyncio.run(main())
+        assert calls == [("u1", 1), ("u1", 2)]
+        assert (tmp_path / "u1" / "1.profile.json").exists()
+        assert [p["telegram_id"] for p in second] == [1001, 1002]
+        assert all(p["stale"] is False and p["snapshot_at"] for p in first + second)
+        assert stats["hits"] == 2 and stats["loads"] == 0
+
+    def test_stale_snapshot_served_and_refreshed_in_background(self, tmp_path):
+        """A stale snapshot is returned immediately and reloaded once in the background"""
+        (tmp_path / "u1").mkdir()
+        old = {"index": "1", "telegram_id": 1001, "username": "old", "snapshot_at": time.time() - 100}
+        (tmp_path / "u1" / "1.profile.json").write_text(json.dumps(old))
+        calls = []
+
+        async def main():
+            store = ProfileSnapshotStore(tmp_path, make_loader(calls), max_age=10)
+            served = await asyncio.gather(store.profiles("u1", [1]), store.profiles("u1", [1]))
+            await asyncio.sleep(0.01)
+            return served, store.get("u1", 1)
+
+        served, fresh = asyncio.run(main())
+        assert [s[0]["username"] for s in served] == ["old", "old"]
+        assert served[0][0]["stale"] is True
+        assert calls == [("u1", 1)]
+        assert fresh["username"] == "ali" and fresh["stale"] is False
+
+    def test_sweep_scans_disk_off_the_event_loop(self, tmp_path):
+        """Periodic sweep reads snapshots in a worker thread, drops orphans and refreshes stale ones"""
+        (tmp_path / "u1").mkdir()
+        old = {"index": "1", "telegram_id": 1001, "snapshot_at": time.time() - 100}
+        for index in (1, 2):
+            (tmp_path / "u1" / f"{index}.profile.json").write_text(json.dumps(old))
+        (tmp_path / "u1" / "1.session").touch()
+        calls = []
+
+        async def main():
+            store = ProfileSnapshotStore(tmp_path, make_loader(calls), max_age=10)
+            loop_thread = threading.get_ident()
+            readers = []
+            read = store._read
+
+            def recording_read(path):
+                readers.append(threading.get_ident())
+                return read(path)
+
+            with patch.object(store, "_read", side_effect=recording_read):
+                scheduled = await store.refresh_stale()
+            await asyncio.sleep(0.01)
+            return scheduled, readers, loop_thread, store.get("u1", 1)
+
+        scheduled, readers, loop_thread, fresh = asyncio.run(main())
+        assert scheduled == 1
+        assert readers and loop_thread not in readers
+        assert calls == [("u1", 1)]
+        assert fresh["stale"] is False
+        assert not (tmp_path / "u1" / "2.profile.json").exists()
+
+    def test_failures_keep_snapshot_and_invalid_session_deletes_it(self, tmp_path):
+        """Temporary errors keep the old snapshot; a revoked session drops it"""
+        async def main():
+            store = ProfileSnapshotStore(tmp_path, make_loader([]))
+            await store.profiles("u1", [1])
+            store._loader = make_loader([], {"index": "1", "telegram_id": None, "invalid": False})
+            kept = await store.load("u1", 1)
+            store._loader = make_loader([], {"index": "1", "telegram_id": None, "invalid": True})
+            dropped = await store.load("u1", 1)
+            return kept, dropped, store.get("u1", 1)
+
+        kept, dropped, after = asyncio.run(main())
+        assert kept["telegram_id"] == 1001
+        assert dropped["invalid"] is True and after is None
+        assert not (tmp_path / "u1" / "1.profile.json").exists()
+
+    def test_own_user_updates_patch_snapshot(self, tmp_path):
+        """Name/phone updates for our own user are written without a get_me call"""
+        calls = []
+
+        async def main():
+            store = ProfileSnapshotStore(tmp_path, make_loader(calls))
+            await store.load("u1", 1)
+            store.apply_update("u1", 1, raw.types.UpdateUserName(
+                user_id=1001, first_name="Vali", last_name="Karimov",
+                usernames=[raw.types.Username(username="vali", active=True)],
+            ))
+            store.apply_update("u1", 1, raw.types.UpdateUserPhone(user_id=1001, phone="99890"))
+            store.apply_update("u1", 1, raw.types.UpdateUserPhone(user_id=555, phone="other"))
+            return ProfileSnapshotStore(tmp_path, make_loader(calls)).get("u1", 1)
+
+        snap = asyncio.run(main())
+        assert calls == [("u1", 1)]
+        assert snap["full_name"] == "Vali Karimov"
+        assert snap["username"] == "vali" and snap["profile_url"] == "https://t.me/vali"
+        assert snap["phone_number"] == "99890"
+
+    def test_list_profiles_served_from_snapshots(self, tmp_path):
+        """/me/telegrams listing calls get_me only for accounts without a snapshot"""
+        (tmp_path / "u1").mkdir()
+        for idx in (1, 2):
+            (tmp_path / "u1" / f"{idx}.session").touch()
+        calls = []
+
+        async def profile_from_session(user_id, account_index):
+            calls.append(account_index)
+            return {"index": str(account_index), "telegram_id": account_index}
+
+        async def main():
+            first = await telegram_service.list_user_telegram_profiles("u1")
+            (tmp_path / "u1" / "3.session").touch()
+            second = await telegram_service.list_user_telegram_profiles("u1")
+            return first, second
+
+        registry = AccountRegistry(telegram_service.list_user_telegram_profiles, ttl=60)
+        store = ProfileSnapshotStore(tmp_path, telegram_service.load_profile)
+        with patch.object(telegram_service, "SESS_ROOT", tmp_path), \
+             patch.object(telegram_service, "profile_from_session", profile_from_session), \
+             patch.object(telegram_service, "profile_semaphore", asyncio.Semaphore(2)), \
+             patch.object(telegram_service, "account_registry", registry), \
+             patch.object(telegram_service, "profile_store", store):
+            first, second = asyncio.run(main())
+
+        assert sorted(calls) == [1, 2, 3]
+        assert [p["index"] for p in first] == ["1", "2"]
+        assert [p["index"] for p in second] == ["1", "2", "3"]
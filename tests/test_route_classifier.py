@@ -0,0 +1,38 @@
+from fastapi import FastAPI
+from src.main import app
+from src.middleware.route_classifier import AUDITED_ROUTES, RouteClassifier
+
+
+class TestRouteClassifier:
+    """Test precompiled audit route classification"""
+
+    def test_matches_app_routes(self):
+        """Audited routes are classified; everything else is skipped"""
+        classifier = RouteClassifier.from_routes(app.routes)
+        assert classifier.classify("POST", "/auth/login") == "login"
+        assert classifier.classify("PATCH", "/admin/users/abc") == "update"
+        assert classifier.classify("DELETE", "/admin/users/abc") == "delete"
+        assert classifier.classify("POST", "/start_login") == "file_upload"
+        assert classifier.classify("DELETE", "/admin/users/abc/telegrams/1") is None
+        assert classifier.classify("POST", "/admin/users/abc/set-admin") is None
+        assert classifier.classify("GET", "/me/chats/1/messages") is None
+        assert classifier.classify("GET", "/auth/login") is None
+
+    def test_rules_without_route_still_compile(self):
+        """Rules whose route is not mounted fall back to the template pattern"""
+        classifier = RouteClassifier.from_routes(FastAPI().routes)
+        assert classifier.classify("POST", "/me/telegrams") == "file_upload"
+        assert classifier.classify("DELETE", "/admin/users/u1") == "delete"
+        assert classifier.methods == frozenset(m for m, _ in AUDITED_ROUTES)
+
+    def test_uses_route_converters(self):
+        """Parametrised routes reuse the route's own compiled path_regex"""
+        demo = FastAPI()
+
+        @demo.delete("/items/{item_id:int}")
+        async def delete_item(item_id: int):
+            return {}
+
+        classifier = RouteClassifier.from_routes(demo.routes, {("DELETE", "/items/{item_id:int}"): "delete"})
+        assert classifier.classify("DELETE", "/items/5") == "delete"
+        assert classifier.classify("DELETE", "/items/abc") is None
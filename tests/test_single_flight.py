@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import pytest
+from pyrogram.file_id import FileId, FileType
+from src.services import telegram_service
+from src.services.blob_store import BlobStore
+from src.services.single_flight import SingleFlight, file_unique_key
+
+
+class TestSingleFlight:
+    """Test single-flight deduplication"""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Parallel callers for one key await a single execution"""
+        async def scenario():
+            sf = SingleFlight()
+            calls = 0
+
+            async def work():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.01)
+                return "done"
+
+            results = await asyncio.gather(*(sf.do("k", work) for _ in range(5)))
+            assert results == ["done"] * 5
+            assert calls == 1
+            assert sf.stats()["shared"] == 4
+            assert not sf.in_flight("k")
+
+        asyncio.run(scenario())
+
+    def test_failure_is_shared_and_key_released(self):
+        """All waiters see the error and the next call runs again"""
+        async def scenario():
+            sf = SingleFlight()
+
+            async def boom():
+                await asyncio.sleep(0.01)
+                raise ConnectionError("lost")
+
+            results = await asyncio.gather(*(sf.do("k", boom) for _ in range(3)), return_exceptions=True)
+            assert all(isinstance(r, ConnectionError) for r in results)
+
+            async def ok():
+                return 1
+
+            assert await sf.do("k", ok) == 1
+
+        asyncio.run(scenario())
+
+    def test_cancelled_leader_hands_over(self):
+        """If the leader is cancelled a waiter performs the work"""
+        async def scenario():
+            sf = SingleFlight()
+            runs = []
+
+            async def work():
+                runs.append(1)
+                await asyncio.sleep(0.05)
+                return len(runs)
+
+            leader = asyncio.create_task(sf.do("k", work))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(sf.do("k", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            assert await follower == 2
+
+        asyncio.run(scenario())
+
+    def test_file_unique_key_ignores_file_reference(self):
+        """Same media with different file references maps to one key"""
+        a = FileId(file_type=FileType.VIDEO, dc_id=2, media_id=42, access_hash=1, file_reference=b"a").encode()
+        b = FileId(file_type=FileType.VIDEO, dc_id=2, media_id=42, access_hash=1, file_reference=b"b").encode()
+        assert a != b
+        assert file_unique_key(a) == file_unique_key(b)
+        assert file_unique_key("not-a-file-id") == "not-a-file-id"
+
+
+class TestDeduplicatedDownload:
+    """Test download_media_to_file dedup"""
+
+    def test_same_file_downloads_once(self, tmp_path):
+        """Two requests for the same file stream it from Telegram once"""
+        streams = []
+
+        class FakeClient:
+            async def stream_media(self, file_id, limit=0, offset=0):
+                streams.append(file_id)
+                for _ in range(3):
+                    await asyncio.sleep(0.01)
+                    yield b"x" * 10
+
+        @asynccontextmanager
+        async def fake_session(user_id, account_index, op):
+            yield FakeClient()
+
+        dest = tmp_path / "v.mp4"
+
+        async def scenario():
+            return await asyncio.gather(*(
+                telegram_service.download_media_to_file("u1", 1, "fid", dest) for _ in range(4)
+            ))
+
+        with patch.object(telegram_service, "telegram_session", fake_session), \
+                patch.object(telegram_service, "blob_store", BlobStore(tmp_path / "blobs")):
+            results = asyncio.run(scenario())
+        assert results == [dest] * 4
+        assert streams == ["fid"]
+        assert dest.read_bytes() == b"x" * 30
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["blobs", "v.mp4"]
@@ -0,0 +1,143 @@
+import time
+import asyncio
+import threading
+import jwt
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.services import supabase_service
+from src.services.supabase_gateway import SupabaseGateway
+from src.services.ttl_cache import TTLCache
+
+
+class TestSupabaseGateway:
+    """Test async gateway over the synchronous Supabase client"""
+
+    def test_blocking_call_does_not_stall_event_loop(self):
+        """Other coroutines keep running while Supabase is slow"""
+        def slow_get_user(token):
+            time.sleep(0.2)
+            return SimpleNamespace(user=SimpleNamespace(id="u1"))
+
+        async def main():
+            gateway = SupabaseGateway(max_workers=2)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                for _ in range(10):
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            res, _ = await asyncio.gather(gateway.get_user("tok"), ticker())
+            await gateway.close()
+            return res, ticks, gateway.stats()
+
+        with patch("src.config.supabase.auth.get_user", side_effect=slow_get_user):
+            res, ticks, stats = asyncio.run(main())
+        assert res.user.id == "u1"
+        assert ticks == 10
+        assert stats["ops"]["auth.get_user"]["count"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_pool_bounds_concurrent_calls(self):
+        """No more than max_workers calls reach Supabase at once"""
+        lock = threading.Lock()
+        active = 0
+        peak = 0
+
+        def list_users():
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.05)
+            with lock:
+                active -= 1
+            return []
+
+        async def main():
+            gateway = SupabaseGateway(max_workers=2)
+            await asyncio.gather(*[gateway.list_users() for _ in range(6)])
+            await gateway.close()
+            return gateway.stats()
+
+        with patch("src.config.supabase_service.auth.admin.list_users", side_effect=list_users):
+            stats = asyncio.run(main())
+        assert peak == 2
+        assert stats["calls"] == 6 and stats["peak_in_flight"] == 6
+
+    def test_cached_token_skips_thread_pool(self):
+        """Cache hits are answered on the event loop"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set(supabase_service._token_key("tok"), SimpleNamespace(id="u1"))
+
+        async def main():
+            gateway = SupabaseGateway(max_workers=1)
+            user = await gateway.get_user_from_token("Bearer tok")
+            return user, gateway.stats()
+
+        with patch.object(supabase_service, "user_cache", cache), \
+             patch("src.config.supabase.auth.get_user", side_effect=AssertionError("network")):
+            user, stats = asyncio.run(main())
+        assert user.id == "u1"
+        assert stats["calls"] == 0
+
+    def test_remote_result_cached_on_event_loop_thread(self):
+        """The Supabase call runs in the pool, but the token cache is only written on the loop"""
+        writers = []
+
+        class RecordingCache(TTLCache):
+            def set(self, key, value, ttl=None):
+                writers.append(threading.get_ident())
+                super().set(key, value, ttl)
+
+        cache = RecordingCache(maxsize=10, ttl=60)
+        callers = []
+
+        def get_user(token):
+            callers.append(threading.get_ident())
+            return SimpleNamespace(user=SimpleNamespace(id="u1"))
+
+        async def main():
+            gateway = SupabaseGateway(max_workers=2)
+            first = await gateway.get_user_from_token("Bearer remote-tok")
+            second = await gateway.get_user_from_token("Bearer remote-tok")
+            await gateway.close()
+            return first, second, gateway.stats()
+
+        with patch.object(supabase_service, "user_cache", cache), \
+             patch.object(supabase_service, "SUPABASE_JWT_SECRET", None), \
+             patch("src.config.supabase.auth.get_user", side_effect=get_user):
+            first, second, stats = asyncio.run(main())
+        assert first.id == second.id == "u1"
+        assert stats["calls"] == 1
+        assert callers[0] != threading.get_ident()
+        assert writers == [threading.get_ident()]
+
+    def test_fresh_lookup_bypasses_local_verification(self):
+        """A locally verified token never hits Supabase; fresh=True always does and refreshes the cache"""
+        token = jwt.encode({"sub": "u1", "exp": int(time.time()) + 3600, "app_metadata": {"role": "user"}},
+                           "secret", algorithm="HS256")
+        cache = TTLCache(maxsize=10, ttl=60)
+        calls = []
+
+        def get_user(t):
+            calls.append(t)
+            return SimpleNamespace(user=SimpleNamespace(id="u1", app_metadata={"role": "admin"}))
+
+        async def main():
+            gateway = SupabaseGateway(max_workers=1)
+            local = await gateway.get_user_from_token(f"Bearer {token}")
+            fresh = await gateway.get_user_from_token(f"Bearer {token}", fresh=True)
+            cached = await gateway.get_user_from_token(f"Bearer {token}")
+            await gateway.close()
+            return local, fresh, cached
+
+        with patch.object(supabase_service, "user_cache", cache), \
+             patch.object(supabase_service, "SUPABASE_JWT_SECRET", "secret"), \
+             patch("src.config.supabase.auth.get_user", side_effect=get_user):
+            local, fresh, cached = asyncio.run(main())
+        assert local.app_metadata == {"role": "user"}
+        assert calls == [token]
+        assert fresh.app_metadata == {"role": "admin"}
+        assert cached is fresh
@@ -0,0 +1,75 @@
+import time
+import jwt
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.services import supabase_service
+from src.services.ttl_cache import TTLCache
+
+SECRET = "test-secret"
+
+
+def make_token(sub="user-1", exp_in=3600, secret=SECRET, **claims):
+    payload = {"sub": sub, "exp": int(time.time()) + exp_in, "aud": "authenticated", "email": "a@b.c", **claims}
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+@pytest.fixture
+def fresh_cache():
+    cache = TTLCache(maxsize=2, ttl=300)
+    with patch.object(supabase_service, "user_cache", cache), \
+         patch.dict(supabase_service.auth_metrics, {k: 0 for k in supabase_service.auth_metrics}):
+        yield cache
+
+
+class TestTokenCache:
+    """Test bounded token cache and local JWT verification"""
+
+    def test_local_verification_skips_supabase(self, fresh_cache):
+        """Valid HS256 tokens are resolved from claims and cached under a hash"""
+        token = make_token(app_metadata={"plan": "pro"})
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", SECRET), \
+             patch("src.config.supabase.auth.get_user", side_effect=AssertionError("network")):
+            user = supabase_service.get_user_from_token(f"Bearer {token}")
+            again = supabase_service.get_user_from_token(f"Bearer {token}")
+        assert user.id == "user-1" and user.email == "a@b.c"
+        assert user.app_metadata == {"plan": "pro"}
+        assert again is user
+        assert token not in fresh_cache._data
+        stats = supabase_service.token_cache_stats()
+        assert stats["local_verified"] == 1 and stats["hits"] == 1 and stats["remote_calls"] == 0
+
+    def test_rejects_expired_and_forged_tokens(self, fresh_cache):
+        """Bad signature or past exp fail without a network call"""
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", SECRET), \
+             patch("src.config.supabase.auth.get_user", side_effect=AssertionError("network")):
+            with pytest.raises(ValueError, match="muddati"):
+                supabase_service.get_user_from_token(f"Bearer {make_token(exp_in=-10)}")
+            with pytest.raises(ValueError, match="yaroqsiz"):
+                supabase_service.get_user_from_token(f"Bearer {make_token(secret='other-secret')}")
+        assert supabase_service.auth_metrics["rejected"] == 2
+        assert len(fresh_cache) == 0
+
+    def test_remote_fallback_is_bounded_and_fresh_bypasses_cache(self, fresh_cache):
+        """Without a secret Supabase is asked once per token; LRU keeps at most maxsize tokens"""
+        calls = []
+
+        def get_user(token):
+            calls.append(token)
+            return SimpleNamespace(user=SimpleNamespace(id=f"id-{len(calls)}"))
+
+        with patch.object(supabase_service, "SUPABASE_JWT_SECRET", None), \
+             patch("src.config.supabase.auth.get_user", side_effect=get_user):
+            for t in ("t1", "t2", "t1", "t3"):
+                supabase_service.get_user_from_token(f"Bearer {t}")
+            assert calls == ["t1", "t2", "t3"]
+            assert len(fresh_cache) == 2 and fresh_cache.evictions == 1
+
+            user = supabase_service.get_user_from_token("Bearer t3", fresh=True)
+            assert calls[-1] == "t3" and user.id == "id-4"
+
+    def test_cache_ttl_capped_by_exp(self):
+        """Cached entries never outlive the token"""
+        assert supabase_service._cache_ttl({"exp": time.time() + 30}) <= 30
+        assert supabase_service._cache_ttl({"exp": time.time() - 5}) == 0
+        assert supabase_service._cache_ttl(None) == supabase_service.AUTH_TOKEN_CACHE_TTL_SECONDS